@@ -0,0 +1,67 @@
+"""Telegram admin."""
+
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.translation import gettext_lazy as _
+from django_telegram_app.admin import TelegramSettingsAdmin as BaseTelegramSettingsAdmin
+
+from apps.telegram import dashboard, export
+from apps.telegram.models import TelegramSettings
+
+
+@admin.register(TelegramSettings)
+class TelegramSettingsAdmin(BaseTelegramSettingsAdmin):
+    """Represent the TelegramSettings admin, with a fleet dashboard and actions to export the history of users."""
+
+    list_display = ("chat_id", "timezone", "is_initialized", "consumed_today_ml", "daily_goal_ml", "updated_at")
+    actions = ["export_consumption_csv", "export_consumption_ndjson", "export_messages_ndjson"]
+
+    def get_urls(self):
+        """Add the url of the fleet dashboard before the urls of the change views."""
+        dashboard_url = path(
+            "dashboard/",
+            self.admin_site.admin_view(self.dashboard_view),
+            name=f"{self.opts.app_label}_{self.opts.model_name}_dashboard",
+        )
+        return [dashboard_url, *super().get_urls()]
+
+    def dashboard_view(self, request):
+        """Show the aggregated statistics of all users, see `apps.telegram.dashboard`."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            "title": _("Fleet dashboard"),
+            "opts": self.opts,
+            "stats": dashboard.get_fleet_stats(),
+        }
+        return TemplateResponse(request, "admin/telegram/telegramsettings/dashboard.html", context)
+
+    @admin.action(description=_("Export the consumption history of the selected users (CSV, gzip)"))
+    def export_consumption_csv(self, request, queryset):
+        """Stream the consumption events of the selected users as a gzip-compressed CSV file."""
+        return self._stream_export(request, "consumption", "csv", queryset)
+
+    @admin.action(description=_("Export the consumption history of the selected users (NDJSON, gzip)"))
+    def export_consumption_ndjson(self, request, queryset):
+        """Stream the consumption events of the selected users as a gzip-compressed NDJSON file."""
+        return self._stream_export(request, "consumption", "ndjson", queryset)
+
+    @admin.action(description=_("Export the message log of the selected users (NDJSON, gzip)"))
+    def export_messages_ndjson(self, request, queryset):
+        """Stream the logged telegram updates of the selected users as a gzip-compressed NDJSON file."""
+        return self._stream_export(request, "messages", "ndjson", queryset)
+
+    def _stream_export(self, request, dataset: str, format_: str, queryset):
+        """Stream the export of the dataset of the selected users as a gzip-compressed file."""
+        chat_ids = self._get_chat_ids(queryset)
+        asynchronous = isinstance(request, ASGIRequest)
+        return export.streaming_response(dataset, format_, chat_ids, gzip=True, asynchronous=asynchronous)
+
+    @staticmethod
+    def _get_chat_ids(queryset) -> list[int]:
+        """Return the chat ids of the selected users, the export is read page by page after the action returns."""
+        return list(queryset.values_list("chat_id", flat=True))
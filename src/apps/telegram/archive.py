@@ -0,0 +1,250 @@
+"""Retention of the message log: old telegram updates are moved to compressed archive segments.
+
+The raw json of every update is logged in `Message` and kept forever by django-telegram-app, so the database keeps
+growing and json queries on the log get slower every day. `compact_messages` moves the updates that are older than the
+retention window to one segment per (utc) day of the updates, and deletes them from the database block by block.
+
+A segment `<yyyy-mm-dd>.ndjson.gz` is a series of independent gzip members of at most `BLOCK_SIZE` updates, as NDJSON
+rows like the ones of `export.message_rows`. It can be read as a whole with `gzip` or `zcat`. Its index
+`<yyyy-mm-dd>.index.ndjson` has one line per member with the first and the last id of its updates and its offset and
+length in the segment, so an update is found by decompressing a single member.
+
+A block is written and synced to disk before its updates are deleted. The updates of blocks that were archived by an
+interrupted run are deleted by the next run, they are never archived twice.
+"""
+
+import gzip
+import json
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict, dataclass
+from datetime import UTC, date, datetime
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django_telegram_app.models import Message
+
+from apps.telegram.export import PAGE_SIZE, iter_pages
+
+BLOCK_SIZE = 500
+# The pages freed per step of the incremental vacuum, every step is a short write transaction
+VACUUM_PAGES = 1_000
+# The keys of the updates that have a date, the date of a callback query is the date of the message of its button
+DATE_PATHS = (
+    ("message", "date"),
+    ("edited_message", "edit_date"),
+    ("channel_post", "date"),
+    ("edited_channel_post", "edit_date"),
+    ("callback_query", "message", "date"),
+)
+
+
+@dataclass(frozen=True)
+class Block:
+    """Represent a gzip member of a segment, as recorded in the index of the segment."""
+
+    first_id: int
+    last_id: int
+    offset: int
+    length: int
+
+
+@dataclass(frozen=True)
+class CompactionResult:
+    """Represent the outcome of a compaction."""
+
+    archived: int
+    deleted: int
+    days: list[date]
+
+
+def get_update_date(raw_message: dict) -> date | None:
+    """Return the (utc) date of a telegram update, or None if the update has no date."""
+    for path in DATE_PATHS:
+        value = raw_message
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if isinstance(value, int):
+            return datetime.fromtimestamp(value, UTC).date()
+    return None
+
+
+class MessageArchive:
+    """Represent a directory of archive segments of the message log."""
+
+    def __init__(self, directory: Path):
+        """Initialize the archive, the directory is created when the first block is written."""
+        self.directory = Path(directory)
+
+    def get_segment_path(self, day: date) -> Path:
+        """Return the path of the segment of the day."""
+        return self.directory / f"{day.isoformat()}.ndjson.gz"
+
+    def get_index_path(self, day: date) -> Path:
+        """Return the path of the index of the segment of the day."""
+        return self.directory / f"{day.isoformat()}.index.ndjson"
+
+    def get_days(self) -> list[date]:
+        """Return the days that have a segment, oldest first."""
+        if not self.directory.is_dir():
+            return []
+        return sorted(date.fromisoformat(path.name.split(".")[0]) for path in self.directory.glob("*.index.ndjson"))
+
+    def iter_blocks(self, day: date) -> Iterator[Block]:
+        """Yield the blocks of the segment of the day, in the order they were written."""
+        if not self.get_index_path(day).exists():
+            return
+        with self.get_index_path(day).open() as index:
+            for line in index:
+                yield Block(**json.loads(line))
+
+    def get_archived_through(self) -> int:
+        """Return the id of the last archived update, or 0 if nothing is archived yet."""
+        days = self.get_days()
+        return max((block.last_id for block in self.iter_blocks(days[-1])), default=0) if days else 0
+
+    def write_block(self, day: date, rows: list[dict]) -> Block:
+        """Append the rows to the segment of the day as a gzip member and record it in the index.
+
+        Both files are synced to disk before returning, so the archived updates can be deleted safely.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segment_path = self.get_segment_path(day)
+        if segment_path.exists():
+            # Drop the tail of a block of an interrupted run that did not make it to the index
+            indexed_size = max((block.offset + block.length for block in self.iter_blocks(day)), default=0)
+            if segment_path.stat().st_size > indexed_size:
+                os.truncate(segment_path, indexed_size)
+        content = "".join(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n" for row in rows)
+        member = gzip.compress(content.encode(), mtime=0)
+        with segment_path.open("ab") as segment:
+            block = Block(rows[0]["id"], rows[-1]["id"], segment.tell(), len(member))
+            segment.write(member)
+            _sync(segment)
+        with self.get_index_path(day).open("a") as index:
+            index.write(json.dumps(asdict(block)) + "\n")
+            _sync(index)
+        return block
+
+    def read_block(self, day: date, block: Block) -> list[dict]:
+        """Return the rows of a block of the segment of the day."""
+        with self.get_segment_path(day).open("rb") as segment:
+            segment.seek(block.offset)
+            member = segment.read(block.length)
+        return [json.loads(line) for line in gzip.decompress(member).splitlines()]
+
+    def iter_rows(self, day: date) -> Iterator[dict]:
+        """Yield the rows of the segment of the day."""
+        with gzip.open(self.get_segment_path(day), "rt") as segment:
+            for line in segment:
+                yield json.loads(line)
+
+    def find(self, message_id: int) -> dict | None:
+        """Return the archived row of the update with the given id, or None if it is not archived."""
+        for day in reversed(self.get_days()):
+            blocks = list(self.iter_blocks(day))
+            if not blocks or message_id < blocks[0].first_id:
+                continue
+            for block in blocks:
+                if block.first_id <= message_id <= block.last_id:
+                    return next((row for row in self.read_block(day, block) if row["id"] == message_id), None)
+            return None
+        return None
+
+
+def compact_messages(
+    archive: MessageArchive, before: date, block_size: int = BLOCK_SIZE, page_size: int = PAGE_SIZE
+) -> CompactionResult:
+    """Archive the updates of the days before the given (utc) date and delete them, block by block.
+
+    The updates are read in the order they were logged. An update without a date (or with an earlier date than the
+    update before it, e.g. a button of an old message) gets the date of the update before it, so every day is a range
+    of ids and the compaction stops at the first update of `before`.
+    """
+    archived_through = archive.get_archived_through()
+    deleted = _delete(Message.objects.filter(pk__lte=archived_through))
+    archived = 0
+    days = []
+    block: list[dict] = []
+    block_day = None
+
+    def flush():
+        nonlocal archived, deleted
+        written = archive.write_block(block_day, block)
+        archived += len(block)
+        deleted += _delete(Message.objects.filter(pk__gte=written.first_id, pk__lte=written.last_id))
+        if not days or days[-1] != block_day:
+            days.append(block_day)
+        block.clear()
+
+    rows = iter_pages(Message.objects.filter(pk__gt=archived_through).values("pk", "raw_message", "error"), page_size)
+    for day, row in _date_rows({"id": row.pop("pk"), **row} for row in rows):
+        if day >= before:
+            break
+        if block and (day != block_day or len(block) >= block_size):
+            flush()
+        block.append(row)
+        block_day = day
+    if block:
+        flush()
+    return CompactionResult(archived, deleted, days)
+
+
+def incremental_vacuum(pages: int = VACUUM_PAGES) -> int | None:
+    """Return the free pages of the database to the file system, `pages` at a time.
+
+    Returns the number of freed pages, or None if the database does not use incremental vacuuming (see the
+    `--full-vacuum` option of `compactmessages`). Must run outside of a transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:  # INCREMENTAL
+            return None
+        freed = 0
+        while True:
+            cursor.execute("PRAGMA freelist_count")
+            free = cursor.fetchone()[0]
+            if not free:
+                return freed
+            # The pragma frees a page per step, which only a script runs to completion
+            cursor.executescript(f"PRAGMA incremental_vacuum({pages})")
+            freed += min(free, pages)
+
+
+def full_vacuum():
+    """Rebuild the database with incremental vacuuming enabled. Blocks all other connections while it runs."""
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+
+
+def _date_rows(rows: Iterable[dict]) -> Iterator[tuple[date, dict]]:
+    """Yield the rows with the date of their update, never earlier than the date of the row before it.
+
+    Rows without a date before the first dated row get the date of that row, nothing is yielded if no row has a date.
+    """
+    current = None
+    pending = []
+    for row in rows:
+        day = get_update_date(row["raw_message"])
+        if day is None and current is None:
+            pending.append(row)
+            continue
+        current = day if current is None else max(current, day or current)
+        for pending_row in pending:
+            yield current, pending_row
+        pending.clear()
+        yield current, row
+
+
+def _delete(queryset) -> int:
+    """Delete the rows of the queryset in a transaction of their own and return the number of deleted rows."""
+    with transaction.atomic():
+        deleted, _ = queryset.delete()
+    return deleted
+
+
+def _sync(file):
+    file.flush()
+    os.fsync(file.fileno())
@@ -0,0 +1,97 @@
+"""Fleet dashboard of the admin: the health of the user base at a glance.
+
+Every number is computed by the database with `aggregate` and `annotate` queries, no settings row is loaded in Python
+(e.g. to convert its next reminder to the user's timezone), so the cost of the page does not depend on the number of
+users. The result is cached for `ADMIN["DASHBOARD_CACHE_SECONDS"]`, so reloading the page costs a cache lookup.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from django.db.models.lookups import LessThan
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from apps.telegram.models import TelegramSettings
+
+CACHE_KEY = "telegram:fleet-dashboard"
+DUE_WITHIN = timedelta(hours=1)
+
+
+def _below_goal(numerator: int, denominator: int) -> Q:
+    """Return a filter on the users that consumed less than `numerator / denominator` of their goal today."""
+    return Q(LessThan(F("consumed_today_ml") * denominator, F("daily_goal_ml") * numerator))
+
+
+# The buckets of today's consumption relative to the daily goal, every bucket excludes the buckets before it
+GOAL_BUCKETS = (
+    ("nothing", _("Nothing yet"), Q(consumed_today_ml__lte=0)),
+    ("quarter", _("Less than 25%"), _below_goal(1, 4)),
+    ("half", _("25% to 50%"), _below_goal(1, 2)),
+    ("three_quarters", _("50% to 75%"), _below_goal(3, 4)),
+    ("almost", _("75% to 100%"), _below_goal(1, 1)),
+    ("reached", _("Goal reached"), Q()),
+)
+
+
+@dataclass(frozen=True)
+class FleetStats:
+    """Represent the aggregated statistics of all users."""
+
+    computed_at: datetime
+    users: int
+    initialized: int
+    due_within_hour: int
+    # (name, users) per bucket of GOAL_BUCKETS, of the initialized users. The labels are translated when rendered, the
+    # cached statistics are shared by the admins of all languages
+    goal_attainment: list[tuple[str, int]]
+    # (timezone, users, initialized users) ordered by users, most users first
+    timezones: list[tuple[str, int, int]]
+
+    def get_goal_attainment_rows(self) -> list[tuple[str, int, int]]:
+        """Return the label, the number of users and the percentage of the initialized users of every bucket."""
+        labels = {name: label for name, label, _condition in GOAL_BUCKETS}
+        return [
+            (str(labels[name]), users, round(users * 100 / self.initialized) if self.initialized else 0)
+            for name, users in self.goal_attainment
+        ]
+
+
+def compute_fleet_stats(now: datetime | None = None) -> FleetStats:
+    """Compute the statistics of all users in three queries."""
+    now = now or timezone.now()
+    initialized = Q(is_initialized=True)
+    buckets = {}
+    previous = []
+    for name, _label, condition in GOAL_BUCKETS:
+        buckets[name] = Count("pk", filter=initialized & condition & ~Q(*previous, _connector=Q.OR))
+        previous.append(condition)
+    totals = TelegramSettings.objects.aggregate(
+        users=Count("pk"), initialized=Count("pk", filter=initialized), **buckets
+    )
+
+    # The reminder times are stored in utc, like `timezone.now()`
+    due_within_hour = TelegramSettings.objects.planned_between(now.time(), (now + DUE_WITHIN).time()).count()
+
+    timezones = (
+        TelegramSettings.objects.values("timezone")
+        .annotate(users=Count("pk"), initialized=Count("pk", filter=initialized))
+        .order_by("-users", "timezone")
+        .values_list("timezone", "users", "initialized")
+    )
+    return FleetStats(
+        computed_at=now,
+        users=totals["users"],
+        initialized=totals["initialized"],
+        due_within_hour=due_within_hour,
+        goal_attainment=[(name, totals[name]) for name, _label, _condition in GOAL_BUCKETS],
+        timezones=list(timezones),
+    )
+
+
+def get_fleet_stats() -> FleetStats:
+    """Return the cached statistics of all users, computing them when the cache has expired."""
+    return cache.get_or_set(CACHE_KEY, compute_fleet_stats, settings.ADMIN["DASHBOARD_CACHE_SECONDS"])
@@ -0,0 +1,168 @@
+"""Streaming exports of the consumption history and the message log.
+
+The rows are read in pages of `PAGE_SIZE` ordered by primary key, every page with its own short query that continues
+after the last key of the previous page. Unlike a single cursor over the whole table, no read transaction is held
+open for the duration of the export, so writers are never blocked for long and the WAL can be checkpointed while a
+multi-GB export is being downloaded. Memory use is bounded by a page, whatever the size of the export.
+
+The rows are rendered as CSV or NDJSON, optionally gzip-compressed, and yielded as chunks of bytes that can be written
+to a file or streamed with a `StreamingHttpResponse`. Served over ASGI, the response streams an asynchronous iterator
+that reads every chunk in a worker thread: the ASGI handler would load a synchronous iterator into a list first.
+"""
+
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from datetime import date, datetime
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q, QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django_telegram_app.models import Message
+
+from apps.telegram.models import ConsumptionEvent
+
+PAGE_SIZE = 2_000
+FORMATS = ("csv", "ndjson")
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Rows buffered before a chunk of bytes is yielded
+ROWS_PER_CHUNK = 500
+
+
+def iter_pages(queryset: QuerySet, page_size: int = PAGE_SIZE) -> Iterator[dict]:
+    """Yield the values of the rows of the queryset, reading them in pages ordered by primary key."""
+    last_pk = None
+    while True:
+        page = queryset.order_by("pk")
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        rows = list(page[:page_size])
+        if not rows:
+            return
+        last_pk = rows[-1]["pk"]
+        yield from rows
+        if len(rows) < page_size:
+            return
+
+
+def consumption_rows(chat_ids: Iterable[int] | None = None, page_size: int = PAGE_SIZE) -> Iterator[dict]:
+    """Yield the consumption events, of the given chats or of all chats."""
+    events = ConsumptionEvent.objects.all()
+    if chat_ids is not None:
+        events = events.filter(telegram_settings__chat_id__in=list(chat_ids))
+    values = events.values(
+        "pk", "amount_ml", "source", "local_date", "created_at", chat_id=F("telegram_settings__chat_id")
+    )
+    for row in iter_pages(values, page_size):
+        yield {"id": row.pop("pk"), **row}
+
+
+def message_rows(chat_ids: Iterable[int] | None = None, page_size: int = PAGE_SIZE) -> Iterator[dict]:
+    """Yield the logged telegram updates, of the given chats or of all chats."""
+    messages = Message.objects.all()
+    if chat_ids is not None:
+        chat_ids = list(chat_ids)
+        messages = messages.filter(
+            Q(raw_message__message__chat__id__in=chat_ids)
+            | Q(raw_message__callback_query__message__chat__id__in=chat_ids)
+        )
+    for row in iter_pages(messages.values("pk", "raw_message", "error"), page_size):
+        yield {"id": row.pop("pk"), **row}
+
+
+DATASETS: dict[str, Callable[..., Iterator[dict]]] = {"consumption": consumption_rows, "messages": message_rows}
+
+
+def render(rows: Iterable[dict], format_: str) -> Iterator[bytes]:
+    """Yield the rows rendered in the given format, in chunks of `ROWS_PER_CHUNK` rows.
+
+    CSV has a header with the keys of the first row, nested values (e.g. the raw telegram update) are JSON-encoded.
+    """
+    if format_ not in FORMATS:
+        raise ValueError(f"Unknown export format '{format_}', expected one of {', '.join(FORMATS)}.")
+    buffer = io.StringIO()
+    writer = None
+    for index, row in enumerate(rows, start=1):
+        if format_ == "ndjson":
+            buffer.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            buffer.write("\n")
+        else:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow({key: _to_csv_value(value) for key, value in row.items()})
+        if not index % ROWS_PER_CHUNK:
+            yield _drain(buffer)
+    if buffer.tell():
+        yield _drain(buffer)
+
+
+def compress(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Yield the chunks compressed as a single gzip stream."""
+    compressor = zlib.compressobj(wbits=31)  # 16 + MAX_WBITS: gzip header and trailer
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
+
+
+def export(dataset: str, format_: str, chat_ids: Iterable[int] | None = None, gzip: bool = False) -> Iterator[bytes]:
+    """Yield the export of the dataset in the given format, optionally gzip-compressed."""
+    chunks = render(DATASETS[dataset](chat_ids), format_)
+    return compress(chunks) if gzip else chunks
+
+
+def get_filename(dataset: str, format_: str, gzip: bool = False) -> str:
+    """Return the name of the export file of the dataset."""
+    return f"{dataset}-{timezone.localdate().isoformat()}.{format_}{'.gz' if gzip else ''}"
+
+
+async def aexport(
+    dataset: str, format_: str, chat_ids: Iterable[int] | None = None, gzip: bool = False
+) -> AsyncIterator[bytes]:
+    """Yield the export like `export` does, every chunk is read and rendered in a worker thread."""
+    chunks = export(dataset, format_, chat_ids, gzip=gzip)
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def streaming_response(
+    dataset: str,
+    format_: str,
+    chat_ids: Iterable[int] | None = None,
+    gzip: bool = False,
+    asynchronous: bool = False,
+) -> StreamingHttpResponse:
+    """Return a response that streams the export as a file download.
+
+    Set `asynchronous` when the response is served over ASGI, so the export is streamed instead of loaded in memory.
+    """
+    content_type = "application/gzip" if gzip else CONTENT_TYPES[format_]
+    content = (aexport if asynchronous else export)(dataset, format_, chat_ids, gzip=gzip)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{get_filename(dataset, format_, gzip)}"'
+    return response
+
+
+def _to_csv_value(value):
+    if isinstance(value, dict | list):
+        return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+    if isinstance(value, datetime | date):
+        return value.isoformat()
+    return value
+
+
+def _drain(buffer: io.StringIO) -> bytes:
+    """Return the content of the buffer encoded as utf-8 and empty it."""
+    content = buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    return content
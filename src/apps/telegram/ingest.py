@@ -0,0 +1,153 @@
+"""Background handling of incoming webhook updates.
+
+The asynchronous webhook only validates an update and stores it in the inbox (`InboxUpdate`), so Telegram gets its
+response right away, no matter how slow handling the update (database writes, outgoing messages) is. A pool of
+consumers, running in the event loop of the ASGI server, hands the updates to `process_update` in worker threads.
+
+Updates of the same chat always go to the same consumer, so they are handled one at a time and in order.
+An update is leased to the process that received it and deleted from the inbox when it is handled. The updates that
+are still pending when a process stops (or that did not fit in the queue of their consumer) are recovered by the
+ingester of any process once their lease expires, so an acknowledged update is handled at least once.
+"""
+
+import asyncio
+import functools
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django_telegram_app import models
+from django_telegram_app.bot import bot
+from django_telegram_app.bot.base import TelegramUpdate
+
+from apps.telegram.models import InboxUpdate
+
+# A received update is handled by another process if it is not handled within this time
+LEASE = timedelta(minutes=5)
+RECOVERY_INTERVAL = timedelta(minutes=1)
+
+
+def receive_update(update: dict) -> InboxUpdate:
+    """Store an update in the inbox, leased to this process."""
+    return InboxUpdate.objects.create(raw_update=update, available_at=timezone.now() + LEASE)
+
+
+def process_update(inbox_update: InboxUpdate):
+    """Handle an update of the inbox and log it, like the synchronous webhook of django_telegram_app does."""
+    close_old_connections()
+    message = models.Message(raw_message=inbox_update.raw_update)
+    try:
+        bot.handle_update(inbox_update.raw_update)
+    except Exception as exc:  # noqa: BLE001
+        message.error = str(exc)
+        logging.exception("Error handling Telegram update")
+    finally:
+        with transaction.atomic():
+            message.save()
+            InboxUpdate.objects.filter(pk=inbox_update.pk).delete()
+        close_old_connections()
+
+
+def claim_updates(limit: int) -> list[InboxUpdate]:
+    """Claim the updates of the inbox whose lease expired."""
+    close_old_connections()
+    try:
+        return InboxUpdate.objects.claim(limit, LEASE)
+    finally:
+        close_old_connections()
+
+
+class UpdateIngester:
+    """Queue updates and handle them with a fixed number of background consumers."""
+
+    def __init__(self, consumers: int = 4, max_pending: int = 1000, recover_periodically: bool = True):
+        """Initialize the ingester, the consumers are started when the first update is submitted.
+
+        With `recover_periodically`, the updates whose lease expired are recovered every `RECOVERY_INTERVAL`, starting
+        one interval after the consumers, otherwise only when `recover` is called.
+        """
+        self.consumers = consumers
+        self.max_pending = max_pending
+        self.recover_periodically = recover_periodically
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+
+    async def submit(self, update: dict) -> bool:
+        """Store an update in the inbox and enqueue it.
+
+        Returns False if its consumer has too many pending updates, the update is then recovered when its lease
+        expires. Must be called from the event loop.
+        """
+        self._ensure_started()
+        inbox_update = await sync_to_async(receive_update, thread_sensitive=False)(update)
+        queue = self._queues[self._get_partition(update)]
+        try:
+            queue.put_nowait(inbox_update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def recover(self) -> int:
+        """Enqueue the updates of the inbox whose lease expired, return the number of enqueued updates."""
+        self._ensure_started()
+        inbox_updates = await sync_to_async(claim_updates, thread_sensitive=False)(self.max_pending)
+        for inbox_update in inbox_updates:
+            await self._queues[self._get_partition(inbox_update.raw_update)].put(inbox_update)
+        return len(inbox_updates)
+
+    async def join(self):
+        """Wait until all enqueued updates have been handled."""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    def _ensure_started(self):
+        """Start the consumers in the running event loop, if they are not running there yet."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._queues = [asyncio.Queue(maxsize=self.max_pending) for _ in range(self.consumers)]
+        self._tasks = [loop.create_task(self._consume(queue)) for queue in self._queues]
+        if self.recover_periodically:
+            self._tasks.append(loop.create_task(self._recover_periodically()))
+
+    def _get_partition(self, update: dict) -> int:
+        """Return the index of the consumer of the update's chat."""
+        try:
+            key = TelegramUpdate(update).chat_id
+        except (ValueError, KeyError, TypeError):
+            key = update.get("update_id", 0)
+        return hash(key) % self.consumers
+
+    async def _recover_periodically(self):
+        """Recover the updates whose lease expired, e.g. the pending updates of a process that stopped."""
+        while True:
+            await asyncio.sleep(RECOVERY_INTERVAL.total_seconds())
+            try:
+                await self.recover()
+            except Exception:  # noqa: BLE001
+                logging.exception("Error recovering Telegram updates")
+
+    @staticmethod
+    async def _consume(queue: asyncio.Queue):
+        """Handle the updates of the queue, one at a time."""
+        handle = sync_to_async(process_update, thread_sensitive=False)
+        while True:
+            inbox_update = await queue.get()
+            try:
+                await handle(inbox_update)
+            except Exception:  # noqa: BLE001
+                logging.exception("Error processing Telegram update")
+            finally:
+                queue.task_done()
+
+
+@functools.cache
+def get_ingester() -> UpdateIngester:
+    """Return the ingester of this process."""
+    return UpdateIngester(
+        consumers=settings.WEBHOOK_INGESTION["CONSUMERS"], max_pending=settings.WEBHOOK_INGESTION["MAX_PENDING"]
+    )
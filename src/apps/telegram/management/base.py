@@ -0,0 +1,173 @@
+"""Base command module for the telegram management commands."""
+
+import logging
+from collections.abc import Callable
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import QuerySet
+from django_telegram_app.bot.base import BaseBotCommand
+from django_telegram_app.models import AbstractTelegramSettings
+
+from apps.telegram import metrics
+from apps.telegram.models import TelegramSettings
+from apps.telegram.sharding import ShardLeaser, parse_shard
+from apps.telegram.writebehind import CHUNK_SIZE, WriteBehindBuffer
+
+
+class TelegramManagementCommand(BaseCommand):
+    """Base class to start a telegram bot command for a selection of telegram settings.
+
+    The upstream base command only supports keyword filters. Subclasses of this class can override `get_queryset`
+    instead, which allows Q-objects, expressions and combined querysets so the selection can use an index.
+
+    The messages sent while handling the selection are queued in the outbox, the outbox worker delivers them.
+
+    These commands are started by cron, so they boot with `h2oh.settings_cron` and skip the system checks (which are
+    run by `migrate` on deployment). Unlike the upstream base command, the bot (and the http client it imports) is
+    only imported when there is an update to handle.
+
+    The selection can be split over several workers with `--shard i/N` or `--lease-shards`, see `apps.telegram.sharding`.
+
+    The selection is handled in chunks of `--chunk-size` settings, one transaction per chunk. The updates of the
+    settings are written at the end of a chunk, with a query per set of updated fields, see `apps.telegram.writebehind`.
+    An error while handling a user is logged and only discards the messages and the updates of that user.
+    A chunk holds the write lock of the database until it commits, see `apps.telegram.writebehind` for the trade-off.
+    """
+
+    command: type[BaseBotCommand] | None = None
+    requires_system_checks = []
+    # The shard being processed and the number of shards, or None to process all chats
+    shard: tuple[int, int] | None = None
+    chunk_size = CHUNK_SIZE
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            default=False,
+            help="Force the command to run, regardless of the should_run outcome.",
+        )
+        sharding = parser.add_mutually_exclusive_group()
+        sharding.add_argument(
+            "--shard",
+            type=parse_shard,
+            help="Only process the chats of shard i out of N shards, in the format i/N (e.g. 0/4).",
+        )
+        sharding.add_argument(
+            "--lease-shards",
+            action="store_true",
+            default=False,
+            help="Claim shards through leases in the database until every shard is leased by a worker.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help=f"The number of telegram settings handled per transaction. Default is {CHUNK_SIZE}.",
+        )
+
+    def handle(self, *_args, **options):
+        """Start the configured telegram command for every telegram setting returned by `get_queryset`."""
+        if not self.command:
+            raise ValueError("The attribute `command` must be set.")
+        command_text = self.command.get_command_string()
+
+        if not options["force"] and not self.should_run():
+            self.stdout.write(self.style.NOTICE(f"Command '{command_text}' skipped as `should_run` returned False."))
+            return
+
+        self.chunk_size = options["chunk_size"]
+        handled = 0
+        with metrics.observe_tick(self.command.get_name()):
+            if options["lease_shards"]:
+                leaser = ShardLeaser(self.command.get_name())
+                for shard in leaser:
+                    self.shard = (shard, leaser.count)
+                    handled += self.handle_selection(command_text, keep_alive=leaser.keep_alive)
+            else:
+                self.shard = options["shard"]
+                handled = self.handle_selection(command_text)
+
+        if not handled:
+            self.stdout.write(self.style.NOTICE("No Telegram-settings found for the given filter. Nothing to do."))
+
+    def handle_selection(self, command_text: str, keep_alive: Callable[[], bool] | None = None) -> int:
+        """Start the command for the telegram settings returned by `get_queryset` and return how many were handled.
+
+        Args:
+            command_text: The command to start.
+            keep_alive: An optional callable that renews the lease of the shard, the remaining settings are skipped
+                when it returns False because another worker took over the shard.
+        """
+        handled = 0
+        selection = iter(self.get_queryset())
+        lease_lost = False
+        while not lease_lost and (chunk := list(islice(selection, self.chunk_size))):
+            write_behind = WriteBehindBuffer()
+            with transaction.atomic():
+                for telegram_settings in chunk:
+                    if keep_alive is not None and not keep_alive():
+                        self.stdout.write(
+                            self.style.WARNING(f"Lost the lease of shard {self.shard}, stopped processing it.")
+                        )
+                        lease_lost = True
+                        break
+                    telegram_settings.write_behind = write_behind
+                    try:
+                        # A savepoint per user, so an error only rolls back the messages queued for this user
+                        with transaction.atomic():
+                            self.handle_command(telegram_settings, command_text)
+                    except Exception:
+                        write_behind.discard(telegram_settings)
+                        logging.exception(f"Error starting the {self.command.get_name()} for {telegram_settings}")
+                        continue
+                    self.stdout.write(self.style.SUCCESS(f"Started {self.command.get_name()} for {telegram_settings}."))
+                    handled += 1
+                write_behind.flush()
+        return handled
+
+    def should_run(self) -> bool:
+        """Determine if the command should run."""
+        return True
+
+    def get_telegram_settings_filter(self) -> dict:
+        """Return the keyword filter of the telegram settings, by default all telegram settings are selected."""
+        return {}
+
+    def get_base_queryset(self) -> QuerySet[TelegramSettings]:
+        """Return the telegram settings of the shard being processed, or all telegram settings."""
+        if self.shard is None:
+            return TelegramSettings.objects.all()
+        return TelegramSettings.objects.in_shard(*self.shard)
+
+    def get_queryset(self) -> QuerySet[TelegramSettings]:
+        """Return the telegram settings to start the command for.
+
+        By default, the keyword filter returned by `get_telegram_settings_filter` is applied.
+        Subclasses should build their selection from `get_base_queryset`, so it is limited to the current shard.
+        """
+        return self.get_base_queryset().filter(**self.get_telegram_settings_filter())
+
+    def handle_command(self, telegram_settings: AbstractTelegramSettings, command_text: str):
+        """Construct a (localized) telegram update and handle it."""
+        from django_telegram_app.bot.bot import handle_update
+
+        assert isinstance(telegram_settings, TelegramSettings)
+        update = self.create_update(telegram_settings, command_text)
+        handle_update(update=update, telegram_settings=telegram_settings)
+
+    def create_update(self, telegram_settings: TelegramSettings, command_text: str) -> dict:
+        """Create a fake update for the given telegram settings and command text.
+
+        If the language of the user is known, it is added to the update so the command is localized.
+        """
+        update = {"message": {"chat": {"id": telegram_settings.chat_id}, "text": command_text}}
+        if telegram_settings.language_code:
+            update["message"]["from"] = {
+                "id": telegram_settings.chat_id,
+                "language_code": telegram_settings.language_code,
+            }
+        return update
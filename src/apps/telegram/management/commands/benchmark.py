@@ -0,0 +1,44 @@
+"""Benchmark command."""
+
+import json
+import pkgutil
+from importlib import import_module
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+import benchmarks
+
+
+def find_benchmarks():
+    """Return the names of all the benchmarks in the benchmarks package."""
+    modules = pkgutil.iter_modules(benchmarks.__path__)
+    return [name for _, name, is_pkg in modules if not is_pkg and not name.startswith("_")]
+
+
+class Command(BaseCommand):
+    """Run a benchmark against a throwaway database."""
+
+    help = "Run a benchmark against a throwaway database and print the results as json."
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument("name", choices=find_benchmarks(), help="The name of the benchmark to run.")
+        parser.add_argument("--output", type=Path, help="Also write the results to this json file.")
+
+    def handle(self, *_args, **options):
+        """Create a test database, run the benchmark in it and report the results."""
+        benchmark = import_module(f"benchmarks.{options['name']}")
+        old_database_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = benchmark.run(self.stdout)
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+        output = json.dumps(results, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            options["output"].write_text(f"{output}\n")
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
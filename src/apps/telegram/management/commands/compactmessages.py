@@ -0,0 +1,72 @@
+"""Compact messages command."""
+
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.telegram import archive
+
+
+class Command(BaseCommand):
+    """Move the logged telegram updates older than the retention window to the archive."""
+
+    help = (
+        "Move the logged telegram updates older than the retention window to compressed segments of the archive, one "
+        "per day, delete them from the database in batches and return the freed pages with an incremental vacuum."
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.MESSAGE_ARCHIVE["RETENTION_DAYS"],
+            help="Keep the updates of this many (utc) days in the database, today included. Default is %(default)s.",
+        )
+        parser.add_argument(
+            "--directory",
+            type=Path,
+            default=settings.MESSAGE_ARCHIVE["DIRECTORY"],
+            help="The directory of the archive. Default is %(default)s.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=archive.BLOCK_SIZE,
+            help="The updates per archived block, which are deleted together. Default is %(default)s.",
+        )
+        parser.add_argument(
+            "--full-vacuum",
+            action="store_true",
+            help=(
+                "Rebuild the database with a full VACUUM instead, which enables the incremental vacuum on a database "
+                "that was created without it. All other connections wait while it runs."
+            ),
+        )
+
+    def handle(self, *_args, **options):
+        """Archive the updates, then vacuum the database."""
+        if options["retention_days"] < 1:
+            raise CommandError("The retention must be at least 1 day.")
+
+        before = timezone.now().date() - timedelta(days=options["retention_days"] - 1)
+        result = archive.compact_messages(archive.MessageArchive(options["directory"]), before, options["batch_size"])
+        self.stdout.write(
+            f"Archived {result.archived} updates of {len(result.days)} day(s) before {before}, "
+            f"deleted {result.deleted} updates."
+        )
+
+        if options["full_vacuum"]:
+            archive.full_vacuum()
+            self.stdout.write(self.style.SUCCESS("Rebuilt the database with incremental vacuuming enabled."))
+            return
+        freed = archive.incremental_vacuum()
+        if freed is None:
+            self.stdout.write(
+                self.style.WARNING("The database does not use incremental vacuuming, run once with --full-vacuum.")
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Freed {freed} pages."))
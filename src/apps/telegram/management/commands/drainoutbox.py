@@ -0,0 +1,79 @@
+"""Drain outbox command."""
+
+import logging
+import signal
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+from django.utils import timezone
+
+from apps.telegram import metrics, outbox
+from apps.telegram.telegrambot.delivery import DeliveryPool
+
+PRUNE_INTERVAL = timedelta(hours=1)
+
+
+class Command(BaseCommand):
+    """Deliver the messages in the outbox."""
+
+    help = (
+        "Run a long-running worker that delivers the messages queued by the bot commands, "
+        "retrying failed deliveries with an exponential backoff."
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.BATCH_SIZE,
+            help=f"Number of messages claimed at once. Default is {outbox.BATCH_SIZE}.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait for new messages when the outbox is empty. Default is 1 second.",
+        )
+        parser.add_argument("--once", action="store_true", help="Deliver the messages that are due now and exit.")
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Serve the metrics of this process on this port. Requires METRICS_ENABLED.",
+        )
+
+    def handle(self, *_args, **options):
+        """Deliver the messages in the outbox until interrupted."""
+        if options["once"]:
+            report = outbox.deliver_pending(options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(str(report)))
+            return
+
+        if options["metrics_port"]:
+            metrics.serve(options["metrics_port"])
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        self.stdout.write(self.style.SUCCESS("Outbox worker started."))
+        pool = DeliveryPool()
+        next_prune = timezone.now()
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    if timezone.now() >= next_prune:
+                        outbox.prune()
+                        next_prune = timezone.now() + PRUNE_INTERVAL
+                    if outbox.deliver_batch(pool, options["batch_size"]):
+                        continue
+                except OperationalError:
+                    # E.g. the database is locked, the claimed messages are retried when their lease expires
+                    logging.exception("Error draining the outbox")
+                    close_old_connections()
+                stop.wait(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            report = pool.close()
+        self.stdout.write(self.style.SUCCESS(f"Outbox worker stopped. {report}"))
@@ -0,0 +1,45 @@
+"""Export history command."""
+
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from apps.telegram import export
+
+
+class Command(BaseCommand):
+    """Stream the consumption history or the message log to a file or stdout."""
+
+    help = (
+        "Stream the consumption history or the logged telegram updates as CSV or NDJSON, optionally gzip-compressed. "
+        "The rows are read in short pages, so the export does not block the bot while it runs."
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument("dataset", choices=list(export.DATASETS), help="The data to export.")
+        parser.add_argument("--format", choices=export.FORMATS, default="ndjson", help="Default is ndjson.")
+        parser.add_argument("--gzip", action="store_true", help="Compress the export with gzip.")
+        parser.add_argument(
+            "--chat-id",
+            type=int,
+            action="append",
+            dest="chat_ids",
+            help="Only export the data of this chat, can be repeated. By default all chats are exported.",
+        )
+        parser.add_argument("--output", type=Path, help="Write the export to this file instead of stdout.")
+
+    def handle(self, *_args, **options):
+        """Write the export chunk by chunk."""
+        chunks = export.export(options["dataset"], options["format"], options["chat_ids"], gzip=options["gzip"])
+        if options["output"] is None:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        with options["output"].open("wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported the {options['dataset']} to {options['output']}."))
@@ -1,27 +1,30 @@
 """Reset reminder state command."""
 
 from django.core.management.base import BaseCommand
-from django.db import transaction
 
 from apps.telegram.models import TelegramSettings
+from apps.telegram.rollover import roll_over
+from apps.telegram.telegrambot import conversations
 
 
 class Command(BaseCommand):
-    """Reset reminder state for all telegram settings."""
+    """Reset reminder state for the telegram settings that passed their local midnight."""
 
-    help = "Reset reminder state for all telegram settings."
+    help = (
+        "Reset reminder state for the telegram settings that passed their local midnight since their last reset. "
+        "Run this command frequently (e.g. every 15 minutes) so every timezone is reset shortly after its midnight. "
+        "Also prunes the conversation state of abandoned commands."
+    )
+    # Started by cron, the system checks are run by `migrate` on deployment
+    requires_system_checks = []
 
     def handle(self, *_args, **_options):
-        """Reset reminder state for all telegram settings."""
+        """Reset reminder state for the telegram settings that passed their local midnight."""
         if not TelegramSettings.objects.exists():
             self.stdout.write(self.style.NOTICE("No TelegramSettings found. Nothing to do."))
             return
 
-        with transaction.atomic():
-            for telegram_settings in TelegramSettings.objects.all():
-                telegram_settings.consumed_today_ml = 0
-                telegram_settings.next_reminder_at = telegram_settings.reminder_window_start
-                telegram_settings.last_reminder_sent_at = None
-                telegram_settings.next_overview_at = telegram_settings.reminder_window_end
-                telegram_settings.save()
-        self.stdout.write(self.style.SUCCESS("Successfully reset reminder state for all users."))
+        reset_count = roll_over()
+        self.stdout.write(self.style.SUCCESS(f"Successfully reset reminder state for {reset_count} users."))
+        pruned_count = conversations.store.prune()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned_count} abandoned conversation states."))
@@ -0,0 +1,44 @@
+"""Run scheduler command."""
+
+import signal
+
+from django.core.management.base import BaseCommand
+
+from apps.telegram import metrics
+from apps.telegram.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    """Run the reminder and overview scheduler."""
+
+    help = (
+        "Run a long-running scheduler that starts the reminder and overview commands at the instant they are due. "
+        "Replaces the periodic startreminder and startoverview cron jobs."
+    )
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Seconds between two polls for settings changed by other processes. Default is 5 seconds.",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Serve the metrics of this process on this port. Requires METRICS_ENABLED.",
+        )
+
+    def handle(self, *_args, **options):
+        """Run the scheduler until it is interrupted."""
+        if options["metrics_port"]:
+            metrics.serve(options["metrics_port"])
+        scheduler = Scheduler(poll_interval=options["poll_interval"], stdout=self.stdout)
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+        self.stdout.write(self.style.SUCCESS("Scheduler started."))
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Scheduler stopped."))
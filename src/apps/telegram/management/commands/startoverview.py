@@ -1,17 +1,14 @@
 """Start overview command for all telegram settings."""
 
-from django.db.models.query_utils import Q
 from django.utils import timezone
-from django_telegram_app.bot.base import TelegramUpdate
-from django_telegram_app.bot.bot import handle_update
-from django_telegram_app.management.base import BaseManagementCommand
-from django_telegram_app.models import AbstractTelegramSettings, Message
+from django_telegram_app.models import AbstractTelegramSettings
 
+from apps.telegram.management.base import TelegramManagementCommand
 from apps.telegram.telegrambot.base import TelegramSettings
 from apps.telegram.telegrambot.commands.overview import Command as OverviewCommand
 
 
-class Command(BaseManagementCommand):
+class Command(TelegramManagementCommand):
     """Start the overview command for all telegram settings."""
 
     command = OverviewCommand
@@ -21,29 +18,10 @@ def get_telegram_settings_filter(self):
         return {"is_initialized": True, "next_overview_at__lte": timezone.now().time()}
 
     def handle_command(self, telegram_settings: AbstractTelegramSettings, command_text: str):
-        """Handle the command and clear next_overview_at."""
+        """Handle the command, then clear the reminders of the rest of the day and next_overview_at."""
         assert isinstance(telegram_settings, TelegramSettings)
-        telegram_settings.next_reminder_at = telegram_settings.reminder_window_start
-        telegram_settings.save()
-        update = self._create_update(telegram_settings, command_text)
-        handle_update(update=update, telegram_settings=telegram_settings)
+        # The overview mentions the next reminder, which is tomorrow's first one
+        telegram_settings.set_reminder_plan([])
+        super().handle_command(telegram_settings, command_text)
         telegram_settings.next_overview_at = None
-        telegram_settings.save()
-
-    def _create_update(self, telegram_settings: TelegramSettings, command_text: str) -> dict:
-        """Create a fake update for the given telegram settings and command text.
-
-        If the telegram settings has a last message, use its language code.
-        """
-        update = {"message": {"chat": {"id": telegram_settings.chat_id}, "text": command_text}}
-        last_message = self._get_last_message(telegram_settings.chat_id)
-        if last_message:
-            language_code = TelegramUpdate(last_message.raw_message).language_code
-            update["message"]["from"] = {"id": telegram_settings.chat_id, "language_code": language_code}
-        return update
-
-    def _get_last_message(self, chat_id: int) -> Message | None:
-        """Get the last message for the given chat id."""
-        q_message = Q(raw_message__message__from__id=chat_id)
-        q_callback_query = Q(raw_message__callback_query__from__id=chat_id)
-        return Message.objects.filter(q_message | q_callback_query).order_by("-raw_message__update_id").first()
+        telegram_settings.save(update_fields=["reminder_plan", "next_reminder_at", "next_overview_at", "updated_at"])
@@ -1,15 +1,22 @@
 """Start reminder command for all telegram settings."""
 
-from django_telegram_app.management.base import BaseManagementCommand
+from django.utils import timezone
 
+from apps.telegram.management.base import TelegramManagementCommand
 from apps.telegram.telegrambot.commands.reminder import Command as ReminderCommand
 
 
-class Command(BaseManagementCommand):
+class Command(TelegramManagementCommand):
     """Start the reminder command for all telegram settings."""
 
     command = ReminderCommand
 
-    def get_telegram_settings_filter(self):
-        """Filter on initialized settings."""
-        return {"is_initialized": True}
+    def get_queryset(self):
+        """Select the settings that are due for a reminder or still need their first reminder to be scheduled.
+
+        Both selections use the partial index on `next_reminder_at`, so only due rows are loaded.
+        """
+        now = timezone.now().time()
+        telegram_settings = self.get_base_queryset()
+        due = telegram_settings.due_for_reminder(now)
+        return due.union(telegram_settings.awaiting_first_reminder(), all=True)
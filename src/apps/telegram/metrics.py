@@ -0,0 +1,215 @@
+"""In-process metrics of the hot paths, exposed in the prometheus text format.
+
+The histograms live in the memory of the process that records them, nothing is aggregated across processes:
+    - the `/metrics` url serves the histograms of the web worker that answers the request. With several gunicorn
+      workers, every scrape sees another worker, so scrape a web server that runs a single worker
+      (`GUNICORN_WORKERS=1`, scaled with more containers that are scraped one by one).
+    - the long-running commands (e.g. `runscheduler`, `drainoutbox`) serve theirs with `--metrics-port`, a scrape
+      target per process.
+Recording is skipped entirely when `METRICS["ENABLED"]` is off, so the disabled cost is a single settings lookup.
+
+The metrics are only served to the addresses of `METRICS["ALLOWED_IPS"]` (localhost by default) and, if
+`METRICS["TOKEN"]` is set, to the clients that send it as bearer token (`Authorization: Bearer <token>`).
+
+References:
+https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.db import connection
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+TICK_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def is_enabled() -> bool:
+    """Return whether metrics are recorded."""
+    return settings.METRICS["ENABLED"]
+
+
+class Histogram:
+    """Thread-safe histogram with a fixed set of labels, rendered like a prometheus histogram."""
+
+    def __init__(self, name: str, documentation: str, buckets: tuple[float, ...], labelnames: tuple[str, ...] = ()):
+        """Initialize an empty histogram."""
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labelnames = labelnames
+        # Per label values: the (non-cumulative) count of every bucket and +Inf, and the sum of the observed values
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        """Record an observation for the given label values."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.setdefault(labelvalues, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        """Observe the duration of the block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def clear(self):
+        """Remove all observations."""
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> Iterator[str]:
+        """Yield the lines of the histogram in the prometheus text format."""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((labels, list(counts), total[0]) for labels, (counts, total) in self._series.items())
+        for labelvalues, counts, total in series:
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labelvalues, strict=True)]
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts, strict=True):
+                cumulative += count
+                bucket_labels = ",".join([*labels, f'le="{bound}"'])
+                yield f"{self.name}_bucket{{{bucket_labels}}} {cumulative}"
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            yield f"{self.name}_sum{suffix} {total}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+STEP_LATENCY = Histogram(
+    "h2oh_step_latency_seconds",
+    "Duration of the telegram command steps, without the steps they chain to.",
+    LATENCY_BUCKETS,
+    ("step",),
+)
+STEP_QUERIES = Histogram(
+    "h2oh_step_queries", "Database queries per handled update, by the step that handled it.", QUERY_BUCKETS, ("step",)
+)
+SEND_LATENCY = Histogram(
+    "h2oh_send_latency_seconds", "Duration of the calls to the telegram bot api.", LATENCY_BUCKETS, ("outcome",)
+)
+TICK_DURATION = Histogram(
+    "h2oh_tick_duration_seconds", "Duration of the ticks of the management commands.", TICK_BUCKETS, ("command",)
+)
+HISTOGRAMS = [STEP_LATENCY, STEP_QUERIES, SEND_LATENCY, TICK_DURATION]
+# The steps being observed in this thread, with the duration of their nested steps
+_local = threading.local()
+
+
+@contextmanager
+def observe_step(step: str) -> Iterator[None]:
+    """Record the duration of a step and, for the step that handles an update, the database queries of the update.
+
+    A step can run the next steps of its command while it is handled. The duration of these nested steps is excluded
+    from the duration of the step, and their queries are counted once, for the update, by the outermost step.
+    Does nothing if metrics are disabled.
+    """
+    if not is_enabled():
+        yield
+        return
+    steps = _local.__dict__.setdefault("steps", [])
+    outermost = not steps
+    # The duration of the nested steps
+    nested = [0.0]
+    steps.append(nested)
+    queries = [0]
+
+    def count_query(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        if outermost:
+            with connection.execute_wrapper(count_query):
+                yield
+        else:
+            yield
+    finally:
+        duration = time.perf_counter() - start
+        steps.pop()
+        if steps:
+            steps[-1][0] += duration
+        STEP_LATENCY.observe(duration - nested[0], step)
+        if outermost:
+            STEP_QUERIES.observe(queries[0], step)
+
+
+@contextmanager
+def observe_send() -> Iterator[None]:
+    """Record the duration of a call to the bot api and whether it succeeded, if metrics are enabled."""
+    if not is_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "sent"
+    finally:
+        SEND_LATENCY.observe(time.perf_counter() - start, outcome)
+
+
+@contextmanager
+def observe_tick(command: str) -> Iterator[None]:
+    """Record the duration of a tick of a management command, if metrics are enabled."""
+    if not is_enabled():
+        yield
+        return
+    with TICK_DURATION.time(command):
+        yield
+
+
+def render() -> str:
+    """Return all metrics in the prometheus text format."""
+    return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
+
+
+def is_authorized(remote_addr: str | None, authorization: str | None) -> bool:
+    """Return whether a client with the given address and authorization header may read the metrics."""
+    if remote_addr in settings.METRICS["ALLOWED_IPS"]:
+        return True
+    token = settings.METRICS["TOKEN"]
+    return bool(token) and hmac.compare_digest((authorization or "").encode(), f"Bearer {token}".encode())
+
+
+def serve(port: int, host: str = "") -> ThreadingHTTPServer:
+    """Serve the metrics of this process on the given port from a background thread and return the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        """Answer every authorized request with the metrics."""
+        if not is_authorized(self.client_address[0], self.headers.get("Authorization")):
+            self.send_error(403)
+            return
+        content = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # noqa: A002  # pylint: disable=redefined-builtin
+        """Do not log requests."""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-16 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0005_telegramsettings_timezone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telegramsettings',
+            index=models.Index(condition=models.Q(('is_initialized', True)), fields=['next_reminder_at', 'last_reminder_sent_at'], name='telegram_due_reminder_idx'),
+        ),
+    ]
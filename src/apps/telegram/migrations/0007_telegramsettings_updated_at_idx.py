@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-16 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0006_telegramsettings_due_reminder_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telegramsettings',
+            index=models.Index(fields=['updated_at'], name='telegram_updated_at_idx'),
+        ),
+    ]
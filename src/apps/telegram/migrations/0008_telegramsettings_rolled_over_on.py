@@ -0,0 +1,22 @@
+# Generated by Django 5.2.9 on 2026-10-16 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0007_telegramsettings_updated_at_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramsettings',
+            name='rolled_over_on',
+            field=models.DateField(blank=True, help_text="the date, in the user's timezone, of the last daily reset of the reminder state", null=True, verbose_name='rolled over on'),
+        ),
+        migrations.AddIndex(
+            model_name='telegramsettings',
+            index=models.Index(fields=['timezone', 'rolled_over_on'], name='telegram_rollover_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+def backfill_language_code(apps, schema_editor):
+    """Copy the language code of each chat's last logged update to its settings."""
+    Message = apps.get_model('django_telegram_app', 'Message')
+    TelegramSettings = apps.get_model('telegram', 'TelegramSettings')
+    language_codes = {}
+    for raw_message in Message.objects.order_by('id').values_list('raw_message', flat=True).iterator():
+        update = raw_message if isinstance(raw_message, dict) else {}
+        sender = (update.get('message') or update.get('callback_query') or {}).get('from') or {}
+        if sender.get('id') is not None and sender.get('language_code'):
+            language_codes[sender['id']] = sender['language_code']
+
+    settings_list = list(TelegramSettings.objects.filter(chat_id__in=language_codes))
+    for telegram_settings in settings_list:
+        telegram_settings.language_code = language_codes[telegram_settings.chat_id]
+    TelegramSettings.objects.bulk_update(settings_list, ['language_code'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_telegram_app', '0002_remove_telegramsettings_user'),
+        ('telegram', '0008_telegramsettings_rolled_over_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramsettings',
+            name='language_code',
+            field=models.CharField(blank=True, default='', help_text="the language code of the user's last update, used to localize scheduled messages", max_length=16, verbose_name='language code'),
+        ),
+        migrations.RunPython(backfill_language_code, migrations.RunPython.noop),
+    ]
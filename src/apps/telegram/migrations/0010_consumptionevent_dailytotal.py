@@ -0,0 +1,39 @@
+# Generated by Django 5.2.9 on 2026-10-16 20:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0009_telegramsettings_language_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumptionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_ml', models.IntegerField(verbose_name='amount (ml)')),
+                ('source', models.CharField(choices=[('hydrate', 'hydrate command'), ('reminder', 'reminder')], max_length=16, verbose_name='source')),
+                ('local_date', models.DateField(help_text="the date in the user's timezone", verbose_name='local date')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('telegram_settings', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumption_events', to=settings.TELEGRAM_SETTINGS_MODEL, verbose_name='telegram settings')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text="the date in the user's timezone", verbose_name='date')),
+                ('consumed_ml', models.IntegerField(default=0, verbose_name='consumed (ml)')),
+                ('event_count', models.IntegerField(default=0, verbose_name='event count')),
+                ('telegram_settings', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to=settings.TELEGRAM_SETTINGS_MODEL, verbose_name='telegram settings')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('telegram_settings', 'date'), name='telegram_daily_total_unique_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-16 20:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0010_consumptionevent_dailytotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.BigIntegerField(verbose_name='chat id')),
+                ('text', models.TextField(verbose_name='text')),
+                ('reply_markup', models.JSONField(blank=True, null=True, verbose_name='reply markup')),
+                ('message_id', models.BigIntegerField(default=0, help_text='the message to edit, 0 to send a new message', verbose_name='message id')),
+                ('idempotency_key', models.CharField(blank=True, help_text='messages with the same key are only queued once', max_length=128, null=True, unique=True, verbose_name='idempotency key')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('sent', 'sent'), ('failed', 'failed')], default='pending', max_length=16, verbose_name='status')),
+                ('attempts', models.IntegerField(default=0, verbose_name='attempts')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='when the message can be (re)tried, also used as lease while a worker delivers it', verbose_name='available at')),
+                ('claim_token', models.CharField(blank=True, default='', max_length=32, verbose_name='claim token')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='last error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent at')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['available_at', 'id'], name='telegram_outbox_due_idx')],
+            },
+        ),
+    ]
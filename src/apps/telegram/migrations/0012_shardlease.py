@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-16 22:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0011_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(help_text='the tick the shards belong to', max_length=32, verbose_name='group')),
+                ('shard', models.PositiveIntegerField(verbose_name='shard')),
+                ('owner', models.CharField(blank=True, default='', max_length=128, verbose_name='owner')),
+                ('expires_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='expires at')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'shard'), name='telegram_shard_lease_unique_shard')],
+            },
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.9 on 2026-10-16 22:42
+
+import math
+from datetime import date, datetime, time, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# A copy of the planning of reminders.scheduling at the time of this migration, later changes must not alter it
+
+
+def _to_seconds(time_):
+    return time_.hour * 3600 + time_.minute * 60 + time_.second + time_.microsecond / 1_000_000
+
+
+def _compute_next_reminder(telegram_settings, consumed_ml, from_time):
+    start, end = telegram_settings.reminder_window_start, telegram_settings.reminder_window_end
+    if not start <= from_time <= end:
+        return start
+    if not consumed_ml:
+        return from_time
+    remaining_reminders = math.ceil(
+        max(0, telegram_settings.daily_goal_ml - consumed_ml) / telegram_settings.consumption_size_ml
+    )
+    remaining_window_seconds = max(
+        0,
+        (end.hour * 3600 + end.minute * 60 + end.second)
+        - (from_time.hour * 3600 + from_time.minute * 60 + from_time.second),
+    )
+    if remaining_reminders <= 0 or remaining_window_seconds <= 0:
+        return start
+    interval_seconds = max(remaining_window_seconds / remaining_reminders, telegram_settings.minimum_interval_seconds)
+    candidate = (datetime.combine(date.today(), from_time) + timedelta(seconds=interval_seconds)).time()
+    return candidate if start <= candidate <= end else start
+
+
+def _plan_reminders(telegram_settings, consumed_ml, from_time):
+    """Return the (utc) reminders of the rest of the day from the given time."""
+    plan = []
+    at = from_time
+    while telegram_settings.daily_goal_ml - consumed_ml > 0 and telegram_settings.consumption_size_ml > 0:
+        next_reminder = _compute_next_reminder(telegram_settings, consumed_ml, at)
+        if next_reminder < at or (next_reminder == at and consumed_ml):
+            break
+        plan.append(next_reminder)
+        consumed_ml += telegram_settings.consumption_size_ml
+        at = next_reminder
+    return plan
+
+
+def backfill_reminder_plans(apps, schema_editor):
+    """Plan the reminders of the initialized settings, the next reminder of scheduled settings becomes the first."""
+    TelegramSettings = apps.get_model('telegram', 'TelegramSettings')
+    now = timezone.now().time()
+    settings_list = list(TelegramSettings.objects.filter(is_initialized=True))
+    for telegram_settings in settings_list:
+        daily_plan = _plan_reminders(telegram_settings, 0, telegram_settings.reminder_window_start)
+        telegram_settings.daily_reminder_plan = [_to_seconds(reminder) for reminder in daily_plan]
+        if telegram_settings.next_reminder_at is not None:
+            plan = _plan_reminders(telegram_settings, telegram_settings.consumed_today_ml, now)
+            telegram_settings.reminder_plan = [_to_seconds(reminder) for reminder in plan]
+            telegram_settings.next_reminder_at = plan[0] if plan else telegram_settings.reminder_window_start
+    TelegramSettings.objects.bulk_update(
+        settings_list, ['daily_reminder_plan', 'reminder_plan', 'next_reminder_at'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0012_shardlease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramsettings',
+            name='daily_reminder_plan',
+            field=models.JSONField(blank=True, default=list, help_text='the (utc) reminders of a day without consumption, the reminder plan of every new day', verbose_name='daily reminder plan'),
+        ),
+        migrations.AddField(
+            model_name='telegramsettings',
+            name='reminder_plan',
+            field=models.JSONField(blank=True, default=list, help_text='the (utc) reminders planned for the rest of the day, in seconds since midnight', verbose_name='reminder plan'),
+        ),
+        migrations.RunPython(backfill_reminder_plans, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.9 on 2026-10-16 22:49
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+WEEK_DAYS = 7
+MONTH_DAYS = 30
+
+
+def backfill_consumption_stats(apps, schema_editor):
+    """Set the goal of the daily totals to the current goal and roll up the closed days of every user."""
+    DailyTotal = apps.get_model('telegram', 'DailyTotal')
+    ConsumptionStats = apps.get_model('telegram', 'ConsumptionStats')
+    TelegramSettings = apps.get_model('telegram', 'TelegramSettings')
+    DailyTotal.objects.update(
+        goal_ml=models.Subquery(
+            TelegramSettings.objects.filter(pk=models.OuterRef('telegram_settings')).values('daily_goal_ml')
+        )
+    )
+
+    stats_list = []
+    for telegram_settings in TelegramSettings.objects.filter(rolled_over_on__isnull=False).iterator():
+        closed_date = telegram_settings.rolled_over_on - timedelta(days=1)
+        totals = {
+            daily_total.date: daily_total
+            for daily_total in DailyTotal.objects.filter(telegram_settings=telegram_settings, date__lte=closed_date)
+        }
+        met = {day for day, daily_total in totals.items() if 0 < daily_total.goal_ml <= daily_total.consumed_ml}
+        week = [day for day in totals if day > closed_date - timedelta(days=WEEK_DAYS)]
+        month = [day for day in totals if day > closed_date - timedelta(days=MONTH_DAYS)]
+        streak_days = 0
+        while closed_date - timedelta(days=streak_days) in met:
+            streak_days += 1
+        stats_list.append(
+            ConsumptionStats(
+                telegram_settings=telegram_settings,
+                tracked_since=min(totals, default=closed_date),
+                through_date=closed_date,
+                week_consumed_ml=sum(totals[day].consumed_ml for day in week),
+                week_goal_days=len(met.intersection(week)),
+                month_consumed_ml=sum(totals[day].consumed_ml for day in month),
+                month_goal_days=len(met.intersection(month)),
+                streak_days=streak_days,
+            )
+        )
+    ConsumptionStats.objects.bulk_create(stats_list, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0013_reminder_plan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumptionStats',
+            fields=[
+                ('telegram_settings', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='consumption_stats', serialize=False, to=settings.TELEGRAM_SETTINGS_MODEL, verbose_name='telegram settings')),
+                ('tracked_since', models.DateField(help_text="the first closed day of the statistics, in the user's timezone", verbose_name='tracked since')),
+                ('through_date', models.DateField(blank=True, help_text="the last closed day of the statistics, in the user's timezone", null=True, verbose_name='through date')),
+                ('week_consumed_ml', models.IntegerField(default=0, verbose_name='consumed in the last 7 days (ml)')),
+                ('week_goal_days', models.IntegerField(default=0, verbose_name='days the goal was met in the last 7 days')),
+                ('month_consumed_ml', models.IntegerField(default=0, verbose_name='consumed in the last 30 days (ml)')),
+                ('month_goal_days', models.IntegerField(default=0, verbose_name='days the goal was met in the last 30 days')),
+                ('streak_days', models.IntegerField(default=0, help_text='consecutive days the goal was met, up to through date', verbose_name='streak (days)')),
+            ],
+            options={
+                'verbose_name_plural': 'consumption stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='dailytotal',
+            name='goal_ml',
+            field=models.IntegerField(default=0, help_text='the daily goal of the user when the last event was logged', verbose_name='goal (ml)'),
+        ),
+        migrations.RunPython(backfill_consumption_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:03
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0014_consumptionstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationState',
+            fields=[
+                ('token', models.CharField(max_length=16, primary_key=True, serialize=False, verbose_name='token')),
+                ('correlation_key', models.CharField(db_index=True, help_text='the run of the command', max_length=64, verbose_name='correlation key')),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='data')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('telegram_settings', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_states', to=settings.TELEGRAM_SETTINGS_MODEL, verbose_name='telegram settings')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-16 23:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telegram', '0015_conversationstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('raw_update', models.JSONField(verbose_name='raw update')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, help_text='when the lease of the process that handles the update expires', verbose_name='available at')),
+                ('claim_token', models.CharField(blank=True, default='', max_length=32, verbose_name='claim token')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['available_at', 'id'], name='telegram_inbox_due_idx')],
+            },
+        ),
+    ]
@@ -1,15 +1,69 @@
 """Models for the Telegram app."""
 
-import zoneinfo
-from datetime import time
+from __future__ import annotations
 
+import uuid
+from dataclasses import replace
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Abs, Coalesce, Mod
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_telegram_app.models import AbstractTelegramSettings
 
-from reminders.scheduling import HydrationSchedule
+from reminders import timezones
+from reminders.scheduling import HydrationSchedule, seconds_to_time, time_to_seconds
+
+if TYPE_CHECKING:
+    from django_telegram_app.bot.base import TelegramUpdate
+
+    from apps.telegram.writebehind import WriteBehindBuffer
+
+
+class TelegramSettingsQuerySet(models.QuerySet):
+    """Custom queryset for TelegramSettings."""
+
+    def due_for_reminder(self, now: time):
+        """Return the initialized settings for which a reminder should be sent at the given (utc) time.
+
+        Mirrors the checks in the reminder command so that only rows that will actually receive a reminder are loaded.
+        """
+        not_sent = Q(last_reminder_sent_at__isnull=True) | Q(last_reminder_sent_at__lt=F("next_reminder_at"))
+        return self.filter(
+            not_sent,
+            is_initialized=True,
+            next_reminder_at__lte=now,
+            reminder_window_start__lte=now,
+            reminder_window_end__gte=now,
+        )
+
+    def awaiting_first_reminder(self):
+        """Return the initialized settings for which no reminder has been scheduled yet."""
+        return self.filter(is_initialized=True, next_reminder_at__isnull=True)
+
+    def planned_between(self, start: time, end: time):
+        """Return the initialized settings whose next reminder is planned between the given (utc) times.
+
+        E.g. the users that are due in the next 5 minutes. The next reminder is the first reminder of the plan, so this
+        is a lookup on the partial index of `next_reminder_at`. A range that passes midnight wraps around.
+        """
+        if start <= end:
+            planned = Q(next_reminder_at__gte=start, next_reminder_at__lte=end)
+        else:
+            planned = Q(next_reminder_at__gte=start) | Q(next_reminder_at__lte=end)
+        return self.filter(planned, is_initialized=True)
+
+    def in_shard(self, shard: int, count: int):
+        """Return the settings whose chat id hashes to the given shard out of `count` shards.
+
+        Mirrors `sharding.get_shard`, so a shard can be selected in the database.
+        """
+        return self.alias(shard=Mod(Abs("chat_id"), count)).filter(shard=shard)
 
 
 class TelegramSettings(AbstractTelegramSettings):
@@ -61,6 +115,18 @@ class TelegramSettings(AbstractTelegramSettings):
     next_reminder_at = models.TimeField(
         verbose_name=_("next reminder at"), null=True, blank=True, help_text=_("when the next reminder is scheduled")
     )
+    reminder_plan = models.JSONField(
+        verbose_name=_("reminder plan"),
+        default=list,
+        blank=True,
+        help_text=_("the (utc) reminders planned for the rest of the day, in seconds since midnight"),
+    )
+    daily_reminder_plan = models.JSONField(
+        verbose_name=_("daily reminder plan"),
+        default=list,
+        blank=True,
+        help_text=_("the (utc) reminders of a day without consumption, the reminder plan of every new day"),
+    )
     consumed_today_ml = models.IntegerField(
         verbose_name=_("consumed today (ml)"),
         default=0,
@@ -89,6 +155,68 @@ class TelegramSettings(AbstractTelegramSettings):
         default="Europe/Brussels",
         help_text=_("the user's timezone, e.g., 'Europe/Brussels'"),
     )
+    language_code = models.CharField(
+        verbose_name=_("language code"),
+        max_length=16,
+        default="",
+        blank=True,
+        help_text=_("the language code of the user's last update, used to localize scheduled messages"),
+    )
+    rolled_over_on = models.DateField(
+        verbose_name=_("rolled over on"),
+        null=True,
+        blank=True,
+        help_text=_("the date, in the user's timezone, of the last daily reset of the reminder state"),
+    )
+
+    objects = TelegramSettingsQuerySet.as_manager()
+
+    # The fields the hydration schedule is computed from
+    SCHEDULE_FIELDS = [
+        "daily_goal_ml",
+        "consumed_today_ml",
+        "consumption_size_ml",
+        "reminder_window_start",
+        "reminder_window_end",
+        "minimum_interval_seconds",
+    ]
+    # The fields changed by planning the reminders
+    PLAN_FIELDS = ["reminder_plan", "daily_reminder_plan", "next_reminder_at", "updated_at"]
+    # A consumption logged later than this after the next reminder replans the rest of the day
+    PLAN_TOLERANCE_SECONDS = 300
+    # Set by the ticks of the management commands to batch the updates of the instance, see `apps.telegram.writebehind`
+    write_behind: WriteBehindBuffer | None = None
+
+    class Meta:
+        """Set meta options."""
+
+        indexes = [
+            models.Index(
+                fields=["next_reminder_at", "last_reminder_sent_at"],
+                condition=Q(is_initialized=True),
+                name="telegram_due_reminder_idx",
+            ),
+            models.Index(fields=["updated_at"], name="telegram_updated_at_idx"),
+            models.Index(fields=["timezone", "rolled_over_on"], name="telegram_rollover_idx"),
+        ]
+
+    @classmethod
+    def create_from_telegram_update(cls, telegram_update: TelegramUpdate):
+        """Create telegram settings from a telegram update, remembering the user's language code."""
+        return cls.objects.create(chat_id=telegram_update.chat_id, language_code=telegram_update.language_code or "")
+
+    def save(self, *args, **kwargs):
+        """Save the settings, or record the updated fields in the write-behind buffer of the instance if it has one."""
+        if self.write_behind is not None and self.write_behind.defer(self, kwargs.get("update_fields")):
+            return
+        super().save(*args, **kwargs)
+
+    def remember_language_code(self, language_code: str | None):
+        """Store the language code of an incoming update, if it changed."""
+        if not language_code or language_code == self.language_code:
+            return
+        self.language_code = language_code
+        self.save(update_fields=["language_code"])
 
     @property
     def hydration_schedule(self) -> HydrationSchedule:
@@ -102,12 +230,100 @@ def hydration_schedule(self) -> HydrationSchedule:
             minimum_interval_seconds=self.minimum_interval_seconds,
         )
 
+    def get_local_date(self, now: datetime | None = None) -> date:
+        """Return the current date in the user's timezone."""
+        if now is None:
+            now = timezone.now()
+        return now.astimezone(timezones.get_zone(self.timezone)).date()
+
+    def log_consumption(self, amount_ml: int, source: str, now: datetime | None = None) -> ConsumptionEvent:
+        """Log consumed water and schedule the next reminder from the given instant.
+
+        The consumed amount is incremented atomically in the database and the row is re-read to compute the next
+        reminder, so concurrent updates of the same chat (e.g. a double tap on a button) are never lost.
+        The settings, the consumption event and the daily total of the user's local date are saved in one transaction,
+        so the daily totals always match the logged events.
+        """
+        if now is None:
+            now = timezone.now()
+        with transaction.atomic():
+            self.consumed_today_ml = F("consumed_today_ml") + amount_ml
+            self.save(update_fields=["consumed_today_ml", "updated_at"])
+            self.refresh_from_db(fields=[*self.SCHEDULE_FIELDS, "reminder_plan"])
+            if not self.advance_reminder_plan(amount_ml, now.time()):
+                self.set_reminder_plan(self.hydration_schedule.plan_reminders(now.time()))
+            self.save(update_fields=["reminder_plan", "next_reminder_at", "updated_at"])
+            event = ConsumptionEvent.objects.create(
+                telegram_settings=self, amount_ml=amount_ml, source=source, local_date=self.get_local_date(now)
+            )
+            DailyTotal.add_event(event)
+        return event
+
     def in_reminder_window(self, time_: time | None = None) -> bool:
         """Check if the current time is within the reminder window."""
         if time_ is None:
             time_ = timezone.now().time()
         return self.hydration_schedule.in_reminder_window(time_)
 
+    def is_due_for_reminder(self, time_: time) -> bool:
+        """Check if a reminder should be sent at the given (utc) time.
+
+        This is the in-memory counterpart of `TelegramSettingsQuerySet.due_for_reminder`.
+        """
+        if not self.is_initialized or self.next_reminder_at is None:
+            return False
+        if self.last_reminder_sent_at is not None and self.last_reminder_sent_at >= self.next_reminder_at:
+            return False
+        return self.next_reminder_at <= time_ and self.in_reminder_window(time_)
+
+    def plan_reminders(self, now: datetime | None = None):
+        """Plan the reminders of the rest of the day from the given instant, and those of a day without consumption.
+
+        The plan of a day without consumption becomes the plan of every new day at the daily rollover.
+        The settings are not saved, `PLAN_FIELDS` are the fields that changed.
+        """
+        if now is None:
+            now = timezone.now()
+        schedule = self.hydration_schedule
+        daily_plan = replace(schedule, consumed_ml=0).plan_reminders(schedule.window_start)
+        self.daily_reminder_plan = [time_to_seconds(reminder) for reminder in daily_plan]
+        self.set_reminder_plan(schedule.plan_reminders(now.time()))
+
+    def get_reminder_plan(self) -> list[time]:
+        """Return the (utc) reminders planned for the rest of the day."""
+        return [seconds_to_time(seconds) for seconds in self.reminder_plan]
+
+    def set_reminder_plan(self, plan: list[time]):
+        """Set the reminders planned for the rest of the day, the first one is the next reminder.
+
+        Without any reminders left, the next reminder is at the start of tomorrow's window.
+        """
+        self.reminder_plan = [time_to_seconds(reminder) for reminder in plan]
+        self.next_reminder_at = plan[0] if plan else self.reminder_window_start
+
+    def advance_reminder_plan(self, amount_ml: int, now: time) -> bool:
+        """Move to the next planned reminder if a consumption at the given (utc) time follows the plan.
+
+        A consumption follows the plan if it is one consumption size, logged at most `PLAN_TOLERANCE_SECONDS` after the
+        next reminder and at least the minimum interval before the reminder after it. The reminder after it is then
+        planned at most the tolerance earlier than the reminder a replan would compute.
+        Return False if it does not follow the plan, the plan must then be recomputed.
+        """
+        plan = self.get_reminder_plan()
+        if amount_ml != self.consumption_size_ml or not plan or now < plan[0]:
+            return False
+        if time_to_seconds(now) - time_to_seconds(plan[0]) > self.PLAN_TOLERANCE_SECONDS:
+            return False
+        if len(plan) > 1 and time_to_seconds(plan[1]) - time_to_seconds(now) < self.minimum_interval_seconds:
+            return False
+        self.set_reminder_plan(plan[1:])
+        return True
+
+    def get_reminder_plan_display(self) -> str:
+        """Get the reminders planned for the rest of the day converted to the user's timezone for display."""
+        local_times = [self.convert_time_from_utc(reminder) for reminder in self.get_reminder_plan()]
+        return ", ".join(local_time.isoformat(timespec="minutes") for local_time in local_times)
+
     def compute_next_reminder_datetime(self, from_time: time | None = None):
         """Compute the next reminder datetime."""
         if from_time is None:
@@ -125,9 +341,13 @@ def convert_time_from_utc(self, time_obj: time) -> time:
     def _convert_time(self, time_obj: time, from_: str, to: str) -> time:
         if from_ == to:
             return time_obj
+        if from_ == "UTC":
+            return timezones.from_utc(time_obj, to)
+        if to == "UTC":
+            return timezones.to_utc(time_obj, from_)
 
-        from_tz = zoneinfo.ZoneInfo(from_)
-        to_tz = zoneinfo.ZoneInfo(to)
+        from_tz = timezones.get_zone(from_)
+        to_tz = timezones.get_zone(to)
         now_utc = timezone.now()
         now_in_timezone = now_utc.astimezone(to_tz)
         dt = timezone.datetime.combine(now_in_timezone.date(), time_obj, tzinfo=from_tz)
@@ -140,3 +360,405 @@ def get_next_reminder_at_display(self) -> str:
             return "N/A"
         local_time = self.convert_time_from_utc(self.next_reminder_at)
         return local_time.isoformat(timespec="minutes")
+
+
+class ConsumptionEvent(models.Model):
+    """Append-only log of the water consumed by a user."""
+
+    class Source(models.TextChoices):
+        """Where the consumption was logged from."""
+
+        HYDRATE = "hydrate", _("hydrate command")
+        REMINDER = "reminder", _("reminder")
+
+    telegram_settings = models.ForeignKey(
+        TelegramSettings,
+        verbose_name=_("telegram settings"),
+        on_delete=models.CASCADE,
+        related_name="consumption_events",
+    )
+    amount_ml = models.IntegerField(verbose_name=_("amount (ml)"))
+    source = models.CharField(verbose_name=_("source"), max_length=16, choices=Source.choices)
+    local_date = models.DateField(verbose_name=_("local date"), help_text=_("the date in the user's timezone"))
+    created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
+
+    def __str__(self):
+        """Return a readable representation of the event."""
+        return f"{self.amount_ml}ml on {self.local_date}"
+
+
+class DailyTotal(models.Model):
+    """Rollup of the consumption events of a user, per local date.
+
+    Maintained incrementally whenever an event is logged, so statistics never aggregate the raw events.
+    """
+
+    telegram_settings = models.ForeignKey(
+        TelegramSettings,
+        verbose_name=_("telegram settings"),
+        on_delete=models.CASCADE,
+        related_name="daily_totals",
+    )
+    date = models.DateField(verbose_name=_("date"), help_text=_("the date in the user's timezone"))
+    consumed_ml = models.IntegerField(verbose_name=_("consumed (ml)"), default=0)
+    event_count = models.IntegerField(verbose_name=_("event count"), default=0)
+    goal_ml = models.IntegerField(
+        verbose_name=_("goal (ml)"), default=0, help_text=_("the daily goal of the user when the last event was logged")
+    )
+
+    class Meta:
+        """Set meta options."""
+
+        constraints = [
+            models.UniqueConstraint(fields=["telegram_settings", "date"], name="telegram_daily_total_unique_date"),
+        ]
+
+    def __str__(self):
+        """Return a readable representation of the daily total."""
+        return f"{self.consumed_ml}ml on {self.date}"
+
+    @staticmethod
+    def goal_met() -> Q:
+        """Return the condition of the daily totals that reached the goal of their date."""
+        return Q(goal_ml__gt=0, consumed_ml__gte=F("goal_ml"))
+
+    @classmethod
+    def add_event(cls, event: ConsumptionEvent):
+        """Add a consumption event to the daily total of its date."""
+        goal_ml = event.telegram_settings.daily_goal_ml
+        _daily_total, created = cls.objects.get_or_create(
+            telegram_settings_id=event.telegram_settings_id,
+            date=event.local_date,
+            defaults={"consumed_ml": event.amount_ml, "event_count": 1, "goal_ml": goal_ml},
+        )
+        if not created:
+            cls.objects.filter(telegram_settings_id=event.telegram_settings_id, date=event.local_date).update(
+                consumed_ml=F("consumed_ml") + event.amount_ml, event_count=F("event_count") + 1, goal_ml=goal_ml
+            )
+
+
+class ConsumptionStats(models.Model):
+    """Rolling weekly and monthly rollups of the daily totals of a user and their streak.
+
+    The statistics cover the closed days, i.e. the days before the user's current local date, up to `through_date`.
+    They are rolled up by the daily rollover, from at most `MONTH_DAYS` daily totals per user, so reading them is a
+    single lookup however long the history of the user is.
+    """
+
+    WEEK_DAYS = 7
+    MONTH_DAYS = 30
+
+    telegram_settings = models.OneToOneField(
+        TelegramSettings,
+        verbose_name=_("telegram settings"),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="consumption_stats",
+    )
+    tracked_since = models.DateField(
+        verbose_name=_("tracked since"), help_text=_("the first closed day of the statistics, in the user's timezone")
+    )
+    through_date = models.DateField(
+        verbose_name=_("through date"),
+        null=True,
+        blank=True,
+        help_text=_("the last closed day of the statistics, in the user's timezone"),
+    )
+    week_consumed_ml = models.IntegerField(verbose_name=_("consumed in the last 7 days (ml)"), default=0)
+    week_goal_days = models.IntegerField(verbose_name=_("days the goal was met in the last 7 days"), default=0)
+    month_consumed_ml = models.IntegerField(verbose_name=_("consumed in the last 30 days (ml)"), default=0)
+    month_goal_days = models.IntegerField(verbose_name=_("days the goal was met in the last 30 days"), default=0)
+    streak_days = models.IntegerField(
+        verbose_name=_("streak (days)"), default=0, help_text=_("consecutive days the goal was met, up to through date")
+    )
+
+    class Meta:
+        """Set meta options."""
+
+        verbose_name_plural = _("consumption stats")
+
+    def __str__(self):
+        """Return a readable representation of the statistics."""
+        return f"Statistics through {self.through_date}"
+
+    @property
+    def tracked_days(self) -> int:
+        """Return the number of closed days covered by the statistics."""
+        if self.through_date is None:
+            return 0
+        return (self.through_date - self.tracked_since).days + 1
+
+    def get_current_streak(self, today: date, goal_met_today: bool) -> int:
+        """Return the number of consecutive days the goal was met, including today if it is already met."""
+        streak = self.streak_days if self.through_date == today - timedelta(days=1) else 0
+        return streak + 1 if goal_met_today else streak
+
+    @classmethod
+    def roll_up(cls, telegram_settings: models.QuerySet[TelegramSettings], local_date: date) -> int:
+        """Close the day before `local_date` in the statistics of the given settings, return the number rolled up.
+
+        The statistics are created for settings without statistics. The sums are recomputed from the daily totals of
+        the last `WEEK_DAYS` and `MONTH_DAYS` closed days, so rolling up twice gives the same result. After a gap in
+        the rollups the streak restarts, the closed days are not looked back upon.
+        """
+        closed_date = local_date - timedelta(days=1)
+        missing = telegram_settings.filter(consumption_stats__isnull=True).values_list("pk", flat=True)
+        cls.objects.bulk_create(
+            (cls(telegram_settings_id=pk, tracked_since=closed_date) for pk in missing), ignore_conflicts=True
+        )
+
+        daily_totals = DailyTotal.objects.filter(telegram_settings=OuterRef("telegram_settings")).order_by()
+        closed_day_met = Exists(daily_totals.filter(DailyTotal.goal_met(), date=closed_date))
+
+        def window(days: int) -> tuple[Coalesce, Coalesce]:
+            totals = daily_totals.filter(date__range=(local_date - timedelta(days=days), closed_date))
+            totals = totals.values("telegram_settings")
+            consumed = Subquery(totals.annotate(total=Sum("consumed_ml")).values("total"))
+            goal_days = Subquery(totals.filter(DailyTotal.goal_met()).annotate(days=Count("pk")).values("days"))
+            return Coalesce(consumed, 0), Coalesce(goal_days, 0)
+
+        week_consumed_ml, week_goal_days = window(cls.WEEK_DAYS)
+        month_consumed_ml, month_goal_days = window(cls.MONTH_DAYS)
+        return (
+            cls.objects.filter(telegram_settings__in=telegram_settings)
+            .exclude(through_date__gte=closed_date)
+            .update(
+                week_consumed_ml=week_consumed_ml,
+                week_goal_days=week_goal_days,
+                month_consumed_ml=month_consumed_ml,
+                month_goal_days=month_goal_days,
+                streak_days=Case(
+                    When(closed_day_met, through_date=closed_date - timedelta(days=1), then=F("streak_days") + 1),
+                    When(closed_day_met, then=Value(1)),
+                    default=Value(0),
+                ),
+                through_date=closed_date,
+            )
+        )
+
+
+class OutboxMessageQuerySet(models.QuerySet):
+    """Custom queryset for OutboxMessage."""
+
+    def due(self, now: datetime):
+        """Return the pending messages that can be delivered at the given instant."""
+        return self.filter(status=OutboxMessage.Status.PENDING, available_at__lte=now)
+
+    def claim(self, limit: int, lease: timedelta, now: datetime | None = None) -> list[OutboxMessage]:
+        """Claim a batch of due messages, oldest first.
+
+        Claimed messages are leased: they only become due again when the lease expires, so a worker that dies while
+        delivering does not lose them and concurrent workers never claim the same message.
+        """
+        if now is None:
+            now = timezone.now()
+        ids = list(self.due(now).order_by("id").values_list("id", flat=True)[:limit])
+        if not ids:
+            return []
+        claim_token = uuid.uuid4().hex
+        self.due(now).filter(id__in=ids).update(available_at=now + lease, claim_token=claim_token)
+        return list(self.filter(id__in=ids, claim_token=claim_token).order_by("id"))
+
+
+class OutboxMessage(models.Model):
+    """Message waiting to be delivered to a chat.
+
+    All messages of the bot commands are stored here first and delivered by the outbox worker (see `outbox.py`).
+    """
+
+    class Status(models.TextChoices):
+        """Delivery status of a message."""
+
+        PENDING = "pending", _("pending")
+        SENT = "sent", _("sent")
+        FAILED = "failed", _("failed")
+
+    chat_id = models.BigIntegerField(verbose_name=_("chat id"))
+    text = models.TextField(verbose_name=_("text"))
+    reply_markup = models.JSONField(verbose_name=_("reply markup"), null=True, blank=True)
+    message_id = models.BigIntegerField(
+        verbose_name=_("message id"), default=0, help_text=_("the message to edit, 0 to send a new message")
+    )
+    idempotency_key = models.CharField(
+        verbose_name=_("idempotency key"),
+        max_length=128,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text=_("messages with the same key are only queued once"),
+    )
+    status = models.CharField(verbose_name=_("status"), max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.IntegerField(verbose_name=_("attempts"), default=0)
+    available_at = models.DateTimeField(
+        verbose_name=_("available at"),
+        default=timezone.now,
+        help_text=_("when the message can be (re)tried, also used as lease while a worker delivers it"),
+    )
+    claim_token = models.CharField(verbose_name=_("claim token"), max_length=32, blank=True, default="")
+    last_error = models.TextField(verbose_name=_("last error"), blank=True, default="")
+    created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
+    sent_at = models.DateTimeField(verbose_name=_("sent at"), null=True, blank=True)
+
+    objects = OutboxMessageQuerySet.as_manager()
+
+    class Meta:
+        """Set meta options."""
+
+        indexes = [
+            models.Index(fields=["available_at", "id"], condition=Q(status="pending"), name="telegram_outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        """Return a readable representation of the message."""
+        return f"Message to {self.chat_id} ({self.status})"
+
+    @classmethod
+    def enqueue(
+        cls,
+        text: str,
+        chat_id: int,
+        reply_markup: dict | None = None,
+        message_id: int = 0,
+        idempotency_key: str | None = None,
+    ) -> bool:
+        """Queue a message for delivery, return False if a message with the same idempotency key was queued before."""
+        fields = {
+            "chat_id": chat_id,
+            "text": text,
+            "reply_markup": reply_markup,
+            "message_id": message_id,
+            "available_at": timezone.now(),
+        }
+        if idempotency_key is None:
+            cls.objects.create(**fields)
+            return True
+        _message, created = cls.objects.get_or_create(idempotency_key=idempotency_key, defaults=fields)
+        return created
+
+
+class InboxUpdateQuerySet(models.QuerySet):
+    """Custom queryset for InboxUpdate."""
+
+    def claim(self, limit: int, lease: timedelta, now: datetime | None = None) -> list[InboxUpdate]:
+        """Claim a batch of updates whose lease expired, oldest first.
+
+        The claimed updates are leased again, so concurrent processes never claim the same update.
+        """
+        if now is None:
+            now = timezone.now()
+        due = self.filter(available_at__lte=now)
+        ids = list(due.order_by("id").values_list("id", flat=True)[:limit])
+        if not ids:
+            return []
+        claim_token = uuid.uuid4().hex
+        due.filter(id__in=ids).update(available_at=now + lease, claim_token=claim_token)
+        return list(self.filter(id__in=ids, claim_token=claim_token).order_by("id"))
+
+
+class InboxUpdate(models.Model):
+    """Telegram update received by the asynchronous webhook that is not handled yet.
+
+    The webhook stores the update here before acknowledging it, and the update is deleted when it is handled (see
+    `ingest.py`). An update that is still here when its lease expires, e.g. because its process stopped, is handled by
+    another process.
+    """
+
+    raw_update = models.JSONField(verbose_name=_("raw update"))
+    available_at = models.DateTimeField(
+        verbose_name=_("available at"),
+        default=timezone.now,
+        help_text=_("when the lease of the process that handles the update expires"),
+    )
+    claim_token = models.CharField(verbose_name=_("claim token"), max_length=32, blank=True, default="")
+    created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
+
+    objects = InboxUpdateQuerySet.as_manager()
+
+    class Meta:
+        """Set meta options."""
+
+        indexes = [models.Index(fields=["available_at", "id"], name="telegram_inbox_due_idx")]
+
+    def __str__(self):
+        """Return a readable representation of the update."""
+        return f"Update {self.pk}"
+
+
+class ShardLeaseQuerySet(models.QuerySet):
+    """Custom queryset for ShardLease."""
+
+    def claim(self, group: str, count: int, owner: str, lease: timedelta, now: datetime | None = None) -> int | None:
+        """Claim a free shard of the group and return it, or None if all `count` shards are leased.
+
+        The lease rows are created on first use. A shard is free when its lease expired, e.g. because the worker that
+        held it finished a previous tick or crashed. The shard whose lease expired first is claimed first.
+        """
+        if now is None:
+            now = timezone.now()
+        self.bulk_create(
+            (ShardLease(group=group, shard=shard, expires_at=now) for shard in range(count)), ignore_conflicts=True
+        )
+        free = self.filter(group=group, shard__lt=count, expires_at__lte=now).order_by("expires_at", "shard")
+        for shard in free.values_list("shard", flat=True):
+            # Another worker may claim the same shard in the meantime, only one of the updates matches
+            if self.filter(group=group, shard=shard, expires_at__lte=now).update(owner=owner, expires_at=now + lease):
+                return shard
+        return None
+
+    def renew(self, group: str, shard: int, owner: str, lease: timedelta, now: datetime | None = None) -> bool:
+        """Extend the lease of the owner on the shard, return False if the lease was lost to another worker."""
+        if now is None:
+            now = timezone.now()
+        return bool(self.filter(group=group, shard=shard, owner=owner).update(expires_at=now + lease))
+
+
+class ShardLease(models.Model):
+    """Lease of a shard of the chats, held by the worker that processes it.
+
+    The reminder and overview ticks can be run by several workers, which claim the shards of their group one at a
+    time (see `sharding.ShardLeaser`).
+    """
+
+    group = models.CharField(verbose_name=_("group"), max_length=32, help_text=_("the tick the shards belong to"))
+    shard = models.PositiveIntegerField(verbose_name=_("shard"))
+    owner = models.CharField(verbose_name=_("owner"), max_length=128, blank=True, default="")
+    expires_at = models.DateTimeField(verbose_name=_("expires at"), default=timezone.now)
+
+    objects = ShardLeaseQuerySet.as_manager()
+
+    class Meta:
+        """Set meta options."""
+
+        constraints = [
+            models.UniqueConstraint(fields=["group", "shard"], name="telegram_shard_lease_unique_shard"),
+        ]
+
+    def __str__(self):
+        """Return a readable representation of the lease."""
+        return f"Shard {self.shard} of {self.group} ({self.owner or 'free'})"
+
+
+class ConversationState(models.Model):
+    """Snapshot of the answers collected by a command, referenced by the callbacks of its buttons.
+
+    A snapshot is addressed by a short hash of its content and never changes, so every process can cache it (see
+    `telegrambot.conversations`). The snapshots of a command are deleted with its callbacks when the command finishes,
+    the snapshots of abandoned commands are pruned by `resetreminderstate`.
+    """
+
+    token = models.CharField(verbose_name=_("token"), max_length=16, primary_key=True)
+    telegram_settings = models.ForeignKey(
+        TelegramSettings,
+        verbose_name=_("telegram settings"),
+        on_delete=models.CASCADE,
+        related_name="conversation_states",
+    )
+    correlation_key = models.CharField(
+        verbose_name=_("correlation key"), max_length=64, db_index=True, help_text=_("the run of the command")
+    )
+    data = models.JSONField(verbose_name=_("data"), default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(verbose_name=_("created at"), auto_now_add=True)
+
+    def __str__(self):
+        """Return a readable representation of the snapshot."""
+        return f"State {self.token} of {self.correlation_key}"
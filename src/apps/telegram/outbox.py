@@ -0,0 +1,111 @@
+"""Delivery of the messages in the outbox.
+
+The outbox worker repeatedly claims a batch of due messages, delivers them through a `DeliveryPool` and records the
+outcome of every message in a few statements:
+    - delivered messages are marked as sent.
+    - messages that telegram rejected (e.g. the user blocked the bot) are marked as failed.
+    - other errors (telegram outages, network errors, rate limits) are retried with an exponential backoff, so an
+      outage of a few hours does not drop any message.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+import requests
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.telegram.models import OutboxMessage
+from apps.telegram.telegrambot.delivery import DeliveryPool, DeliveryReport
+
+BATCH_SIZE = 100
+# A claimed message is retried by another worker if it is not handled within this time
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE = timedelta(seconds=5)
+BACKOFF_MAX = timedelta(minutes=15)
+# About 3.5 hours of retries with the backoff above
+MAX_ATTEMPTS = 20
+# Sent and failed messages are kept this long (e.g. to deduplicate on their idempotency key)
+RETENTION = timedelta(days=7)
+
+
+def deliver_batch(pool: DeliveryPool, batch_size: int = BATCH_SIZE) -> int:
+    """Claim and deliver a batch of due messages, return the number of claimed messages."""
+    messages = OutboxMessage.objects.claim(batch_size, LEASE)
+    errors: dict[int, Exception | None] = {}
+    for message in messages:
+        pool.submit(
+            message.text,
+            message.chat_id,
+            reply_markup=message.reply_markup,
+            message_id=message.message_id,
+            on_done=lambda error, pk=message.pk: errors.__setitem__(pk, error),
+        )
+    pool.join()
+    record_results(messages, errors, timezone.now())
+    return len(messages)
+
+
+def deliver_pending(batch_size: int = BATCH_SIZE, **pool_kwargs) -> DeliveryReport:
+    """Deliver all messages that are due now and return the delivery report.
+
+    The keyword arguments are passed to `DeliveryPool`.
+    """
+    pool = DeliveryPool(**pool_kwargs)
+    try:
+        while deliver_batch(pool, batch_size):
+            pass
+    finally:
+        report = pool.close()
+    return report
+
+
+def record_results(messages: list[OutboxMessage], errors: dict[int, Exception | None], now: datetime):
+    """Store the outcome of the delivery of the given messages.
+
+    A message without an outcome (e.g. the worker was interrupted) keeps its lease and is retried when it expires.
+    """
+    sent_ids = [message.pk for message in messages if message.pk in errors and errors[message.pk] is None]
+    with transaction.atomic():
+        OutboxMessage.objects.filter(pk__in=sent_ids).update(
+            status=OutboxMessage.Status.SENT, sent_at=now, attempts=F("attempts") + 1, last_error=""
+        )
+        for message in messages:
+            error = errors.get(message.pk)
+            if error is None:
+                continue
+            attempts = message.attempts + 1
+            status = OutboxMessage.Status.PENDING
+            if is_permanent_error(error) or attempts >= MAX_ATTEMPTS:
+                status = OutboxMessage.Status.FAILED
+                logging.error(
+                    f"Giving up delivering message {message.pk} to chat {message.chat_id} after {attempts} attempts"
+                )
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                status=status, attempts=attempts, available_at=now + get_backoff(attempts), last_error=str(error)
+            )
+
+
+def get_backoff(attempts: int) -> timedelta:
+    """Return the delay before the next attempt to deliver a message that failed the given number of times."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """Return whether retrying the delivery is pointless, i.e. telegram rejected the message itself."""
+    if not isinstance(error, requests.HTTPError) or error.response is None:
+        return False
+    return 400 <= error.response.status_code < 500 and error.response.status_code != 429
+
+
+def prune(now: datetime | None = None) -> int:
+    """Delete the sent and failed messages older than the retention period, return the number of deleted messages."""
+    if now is None:
+        now = timezone.now()
+    deleted, _ = (
+        OutboxMessage.objects.exclude(status=OutboxMessage.Status.PENDING)
+        .filter(created_at__lt=now - RETENTION)
+        .delete()
+    )
+    return deleted
@@ -0,0 +1,62 @@
+"""Daily rollover of the reminder state.
+
+Every user's reminder state is reset once per day, at midnight in their own timezone.
+Users are grouped by the local date of their timezone and each group is reset with a single set-based UPDATE,
+so the database is only locked for the duration of a few statements. The reminder plan of the new day is copied from
+the precomputed plan of a day without consumption, so nothing is computed per user. The closed day is rolled up in the
+statistics of the users in the same transaction.
+"""
+
+import logging
+import zoneinfo
+from collections import defaultdict
+from datetime import date, datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.telegram.models import ConsumptionStats, TelegramSettings
+
+
+def roll_over(now: datetime | None = None) -> int:
+    """Reset the reminder state of the users whose local date changed since their last rollover.
+
+    Users that were never rolled over (e.g. they just signed up) are only stamped with their local date, their
+    state is reset from the next local midnight onwards.
+
+    Return the number of users whose state was reset.
+    """
+    if now is None:
+        now = timezone.now()
+
+    reset_count = 0
+    for local_date, timezones in group_timezones_by_local_date(now).items():
+        telegram_settings = TelegramSettings.objects.filter(timezone__in=timezones)
+        telegram_settings.filter(rolled_over_on__isnull=True).update(rolled_over_on=local_date)
+        with transaction.atomic():
+            ConsumptionStats.roll_up(telegram_settings.filter(rolled_over_on__lt=local_date), local_date)
+            reset_count += telegram_settings.filter(rolled_over_on__lt=local_date).update(
+                consumed_today_ml=0,
+                next_reminder_at=F("reminder_window_start"),
+                reminder_plan=F("daily_reminder_plan"),
+                last_reminder_sent_at=None,
+                next_overview_at=F("reminder_window_end"),
+                rolled_over_on=local_date,
+                # Bulk updates do not touch auto_now fields, the scheduler relies on updated_at to pick up changes.
+                updated_at=now,
+            )
+    return reset_count
+
+
+def group_timezones_by_local_date(now: datetime) -> dict[date, list[str]]:
+    """Return the timezones of all users, grouped by their local date at the given instant."""
+    groups: dict[date, list[str]] = defaultdict(list)
+    for timezone_name in TelegramSettings.objects.values_list("timezone", flat=True).distinct().order_by():
+        try:
+            tz = zoneinfo.ZoneInfo(timezone_name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            logging.warning(f"Skipping the rollover of unknown timezone '{timezone_name}'")
+            continue
+        groups[now.astimezone(tz).date()].append(timezone_name)
+    return groups
@@ -0,0 +1,176 @@
+"""In-process scheduler that starts the reminder and overview commands when they are due.
+
+The scheduler keeps a `DueQueue` with the next due instant of every chat and sleeps until the earliest one.
+Changes made by this process are picked up through the `post_save` and `post_delete` signals, changes made by other
+processes (e.g. the webhook workers) are picked up by polling the indexed `updated_at` column.
+
+Note:
+    Bulk updates (`QuerySet.update`) do not trigger signals nor touch `updated_at` automatically.
+    Code that changes the schedule in bulk must set `updated_at` itself for the scheduler to notice.
+"""
+
+import logging
+import threading
+from datetime import UTC, datetime, timedelta
+
+from django.db import close_old_connections
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from apps.telegram import metrics
+from apps.telegram.management.commands import startoverview, startreminder
+from apps.telegram.models import TelegramSettings
+from reminders.queue import DueQueue
+
+REMINDER = "reminder"
+OVERVIEW = "overview"
+
+# Rows are polled with an overlap, so that a transaction that commits after a newer one was seen is not missed.
+POLL_OVERLAP = timedelta(seconds=10)
+# Delay before an entry that is still due after its command was started (e.g. because it failed) is retried.
+RETRY_DELAY = timedelta(seconds=60)
+
+
+def get_due_instants(telegram_settings: TelegramSettings, now: datetime) -> dict[str, datetime | None]:
+    """Return the next instant at which the reminder and overview commands are due for the given settings.
+
+    An instant of None means nothing is due until the settings change (e.g. the reminder of today was sent already).
+    """
+    if not telegram_settings.is_initialized:
+        return {REMINDER: None, OVERVIEW: None}
+    return {
+        REMINDER: _get_reminder_due_at(telegram_settings, now),
+        OVERVIEW: _get_overview_due_at(telegram_settings, now),
+    }
+
+
+def _get_reminder_due_at(telegram_settings: TelegramSettings, now: datetime) -> datetime | None:
+    next_reminder_at = telegram_settings.next_reminder_at
+    if next_reminder_at is None or telegram_settings.is_due_for_reminder(now.time()):
+        return now
+    if next_reminder_at > now.time():
+        return datetime.combine(now.date(), next_reminder_at, tzinfo=UTC)
+    return None
+
+
+def _get_overview_due_at(telegram_settings: TelegramSettings, now: datetime) -> datetime | None:
+    next_overview_at = telegram_settings.next_overview_at
+    if next_overview_at is None:
+        return None
+    if next_overview_at <= now.time():
+        return now
+    return datetime.combine(now.date(), next_overview_at, tzinfo=UTC)
+
+
+class Scheduler:
+    """Start the reminder and overview commands for each chat at the instant they are due."""
+
+    def __init__(self, poll_interval: float = 5.0, stdout=None):
+        """Initialize the scheduler.
+
+        Args:
+            poll_interval: The number of seconds between two polls for changes made by other processes.
+            stdout: An optional output wrapper to report on, e.g. the management command's stdout.
+        """
+        self.poll_interval = poll_interval
+        self.stdout = stdout
+        self.queue = DueQueue()
+        self.commands = {REMINDER: startreminder.Command(), OVERVIEW: startoverview.Command()}
+        self._watermark: datetime | None = None
+        self._loaded_on = None
+        self._stop = threading.Event()
+
+    def load(self, now: datetime):
+        """(Re)build the queue from all initialized settings."""
+        self.queue.clear()
+        self._watermark = now
+        for telegram_settings in TelegramSettings.objects.filter(is_initialized=True).iterator():
+            self.reschedule(telegram_settings, now)
+        self._loaded_on = now.date()
+        logging.info(f"Scheduler loaded {len(self.queue)} entries")
+
+    def reschedule(self, telegram_settings: TelegramSettings, now: datetime):
+        """Update the queue entries of the given settings."""
+        for kind, due in get_due_instants(telegram_settings, now).items():
+            key = (kind, telegram_settings.chat_id)
+            if due is None:
+                self.queue.discard(key)
+            else:
+                self.queue.schedule(key, due)
+        if self._watermark is None or telegram_settings.updated_at > self._watermark:
+            self._watermark = telegram_settings.updated_at
+
+    def poll_changes(self, now: datetime):
+        """Reschedule the settings that were changed since the last poll."""
+        if self._watermark is None:
+            return
+        changed = TelegramSettings.objects.filter(updated_at__gt=self._watermark - POLL_OVERLAP)
+        for telegram_settings in changed:
+            self.reschedule(telegram_settings, now)
+
+    def run_pending(self, now: datetime) -> int:
+        """Start the commands that are due and return how many were started."""
+        started = 0
+        for key in self.queue.pop_due(now):
+            kind, chat_id = key
+            telegram_settings = TelegramSettings.objects.filter(chat_id=chat_id).first()
+            if telegram_settings is None:
+                continue
+            command = self.commands[kind]
+            assert command.command is not None
+            try:
+                command.handle_command(telegram_settings, command.command.get_command_string())
+            except Exception:
+                logging.exception(f"Error starting the {kind} for {telegram_settings}")
+            telegram_settings.refresh_from_db()
+            self.reschedule(telegram_settings, now)
+            due = self.queue.get(key)
+            if due is not None and due <= now:
+                self.queue.schedule(key, now + RETRY_DELAY)
+            started += 1
+            if self.stdout:
+                self.stdout.write(f"Started {kind} for {telegram_settings}.")
+        return started
+
+    def run(self):
+        """Run until `stop` is called."""
+        post_save.connect(self._on_save, sender=TelegramSettings, weak=False)
+        post_delete.connect(self._on_delete, sender=TelegramSettings, weak=False)
+        try:
+            next_poll = timezone.now()
+            while not self._stop.is_set():
+                close_old_connections()
+                now = timezone.now()
+                if now.date() != self._loaded_on:
+                    self.load(now)
+                    next_poll = now + timedelta(seconds=self.poll_interval)
+                elif now >= next_poll:
+                    self.poll_changes(now)
+                    next_poll = now + timedelta(seconds=self.poll_interval)
+                with metrics.observe_tick("scheduler"):
+                    self.run_pending(now)
+                self._stop.wait(self._get_sleep_seconds(next_poll))
+        finally:
+            post_save.disconnect(self._on_save, sender=TelegramSettings)
+            post_delete.disconnect(self._on_delete, sender=TelegramSettings)
+
+    def stop(self):
+        """Stop the scheduler after the current iteration."""
+        self._stop.set()
+
+    def _get_sleep_seconds(self, next_poll: datetime) -> float:
+        """Return the number of seconds until the next due entry or poll, whichever comes first."""
+        wake_at = next_poll
+        next_due = self.queue.next_due()
+        if next_due is not None and next_due < wake_at:
+            wake_at = next_due
+        return max(0.0, (wake_at - timezone.now()).total_seconds())
+
+    def _on_save(self, sender, instance: TelegramSettings, **_kwargs):  # noqa: ARG002  # pylint: disable=unused-argument
+        """Reschedule settings saved by this process."""
+        self.reschedule(instance, timezone.now())
+
+    def _on_delete(self, sender, instance: TelegramSettings, **_kwargs):  # noqa: ARG002  # pylint: disable=unused-argument
+        """Remove deleted settings from the queue."""
+        for kind in (REMINDER, OVERVIEW):
+            self.queue.discard((kind, instance.chat_id))
@@ -0,0 +1,72 @@
+"""Sharding of the chats over the workers of the reminder and overview ticks.
+
+A chat belongs to shard `abs(chat_id) % count`. A tick can process a fixed shard (`--shard i/N`), which suits a fixed
+number of workers, or claim shards through `ShardLease` rows (`--lease-shards`), so workers can be added or removed
+freely. A claimed shard stays leased until its lease expires, so it is not processed twice in the same tick. The lease
+is renewed while the shard is processed. The shards of a worker that crashed become free when their leases expire and
+are claimed by the next worker that looks for a shard.
+"""
+
+import argparse
+import os
+import socket
+import uuid
+from collections.abc import Iterator
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.telegram.models import ShardLease
+
+
+def get_shard(chat_id: int, count: int) -> int:
+    """Return the shard of the chat out of `count` shards."""
+    return abs(chat_id) % count
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse a shard in the format `i/N` (e.g. `0/4`) into the shard and the number of shards."""
+    try:
+        shard, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a shard in the format i/N, e.g. 0/4.") from None
+    if count < 1 or not 0 <= shard < count:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a shard in the format i/N with 0 <= i < N.")
+    return shard, count
+
+
+class ShardLeaser:
+    """Claim the shards of a group one at a time, for as long as there are free shards."""
+
+    def __init__(self, group: str, count: int | None = None, lease: timedelta | None = None):
+        """Initialize the leaser.
+
+        Args:
+            group: The name of the tick the shards belong to, e.g. the name of the bot command.
+            count: The number of shards, `SHARDING["SHARDS"]` by default.
+            lease: The duration of a lease, `SHARDING["LEASE_SECONDS"]` by default. It should be shorter than the
+                interval between two ticks, so the shards are free again for the next tick.
+        """
+        self.group = group
+        self.count = count or settings.SHARDING["SHARDS"]
+        self.lease = lease or timedelta(seconds=settings.SHARDING["LEASE_SECONDS"])
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.shard: int | None = None
+        self._renew_at = timezone.now()
+
+    def __iter__(self) -> Iterator[int]:
+        """Claim and yield free shards until every shard is leased."""
+        while (shard := ShardLease.objects.claim(self.group, self.count, self.owner, self.lease)) is not None:
+            self.shard = shard
+            self._renew_at = timezone.now() + self.lease / 2
+            yield shard
+        self.shard = None
+
+    def keep_alive(self) -> bool:
+        """Renew the lease of the current shard once half of it passed, return False if it was lost."""
+        now = timezone.now()
+        if self.shard is None or now < self._renew_at:
+            return self.shard is not None
+        self._renew_at = now + self.lease / 2
+        return ShardLease.objects.renew(self.group, self.shard, self.owner, self.lease, now=now)
@@ -1,31 +1,156 @@
-"""Base classes."""
+"""Base classes.
 
+The steps of a command are defined once per command class (see `TelegramCommand.build_steps`) and shared by all
+command instances. Every command instance, i.e. every handled update, gets bound copies of the steps it runs, so the
+state of an update never ends up on the shared definitions.
+
+The answers collected by the steps are kept server-side (see `conversations`), the callback of a button only refers to
+them with a short token.
+"""
+
+import copy
+import uuid
 from abc import ABC
+from collections.abc import Sequence
+from functools import cached_property
+from typing import Any, ClassVar
 
 from django.utils.translation import gettext as _
-from django_telegram_app.bot import bot
 from django_telegram_app.bot.base import BaseBotCommand, Step, TelegramUpdate
 
+from apps.telegram import metrics
 from apps.telegram.models import TelegramSettings
+from apps.telegram.telegrambot import conversations, delivery
 
 
 class TelegramCommand(BaseBotCommand, ABC):
     """Base class for telegram commands."""
 
     settings: TelegramSettings
+    _step_graphs: ClassVar[dict[type, tuple["TelegramStep", ...]]] = {}
+    _step_names: ClassVar[dict[type, list[str]]] = {}
+
+    @classmethod
+    def build_steps(cls) -> list["TelegramStep"]:
+        """Return the (unbound) steps of the command, called once per command class."""
+        raise NotImplementedError("Subclasses must implement this method")
+
+    @classmethod
+    def get_step_graph(cls) -> tuple["TelegramStep", ...]:
+        """Return the shared step definitions of the command class, building them on first use."""
+        try:
+            return cls._step_graphs[cls]
+        except KeyError:
+            graph = cls._step_graphs[cls] = tuple(cls.build_steps())
+            cls._step_names[cls] = [step.name for step in graph]
+            return graph
+
+    @cached_property
+    def steps(self) -> "BoundSteps":
+        """Return the steps of the command, bound to this command when they are accessed."""
+        return BoundSteps(self, self.get_step_graph())
+
+    def _steps_to_str(self):
+        """Return the names of the steps without binding them."""
+        self.get_step_graph()
+        return self._step_names[type(self)]
+
+    def get_callback_data(self, callback_token: str) -> dict[str, Any]:
+        """Get the callback data from the callback token, with the answers of the conversation snapshot it refers to."""
+        data = super().get_callback_data(callback_token)
+        if conversations.STATE_KEY in data:
+            return {**conversations.store.load(data.pop(conversations.STATE_KEY)), **data}
+        return data
+
+    def _clear_state(self):
+        """Clear the command state, without overwriting fields that may have been changed concurrently."""
+        self.settings.data = {}
+        self.settings.save(update_fields=["data", "updated_at"])
+
+    def _clear_callback_data(self, telegram_update: TelegramUpdate):
+        """Clear the callback data and the conversation snapshots of the current command."""
+        correlation_key = super().get_callback_data(telegram_update.callback_data).get("correlation_key")
+        super()._clear_callback_data(telegram_update)
+        if correlation_key:
+            conversations.store.delete(correlation_key)
 
 
 class TelegramStep(Step, ABC):
-    """Base class for telegram command steps."""
+    """Base class for telegram command steps.
+
+    Steps are created without a command by `TelegramCommand.build_steps` and must only keep state that is the same for
+    every update on `self`, e.g. caches. `bind` returns the copy that handles a single update.
+    """
 
     command: TelegramCommand
 
+    def __init__(self, unique_id: str | None = None, translate: bool | None = None):
+        """Initialize an unbound step."""
+        super().__init__(None, unique_id=unique_id, translate=translate)  # type: ignore[reportArgumentType]
+
+    def bind(self, command: TelegramCommand) -> "TelegramStep":
+        """Return a copy of this step bound to the given command."""
+        bound = copy.copy(self)
+        bound.command = command
+        return bound
+
+    def __call__(self, telegram_update: TelegramUpdate):
+        """Remember the user's language code and execute the step, recording its duration and queries."""
+        with metrics.observe_step(f"{self.command.get_name()}.{self.name}"):
+            self.command.settings.remember_language_code(telegram_update.language_code)
+            return super().__call__(telegram_update)
+
+    def add_waiting_for(self, message_key: str, data: dict[str, Any] | None = None):
+        """Add waiting_for to the command settings, without overwriting fields that may have been changed concurrently.
+
+        The message_key will be used to store the user input in the callback data of the next step.
+        """
+        data = data or {}
+        self.command.settings.data["_waiting_for"] = self.next_step_callback(data, _message_key=message_key)
+        self.command.settings.save(update_fields=["data", "updated_at"])
+
+    def _create_callback(self, action: str, original_data: dict | None = None, **kwargs):
+        """Create callback data for the current step and return the token.
+
+        The answers collected so far (`original_data`) are stored as a conversation snapshot, shared by all buttons of
+        the step. The callback only holds the token of the snapshot, the correlation key and the values of the button.
+        """
+        state = dict(original_data or {})
+        correlation_key = kwargs.setdefault("correlation_key", state.pop("correlation_key", None) or str(uuid.uuid4()))
+        if state:
+            token = conversations.store.save(self.command.settings, correlation_key, state)
+            kwargs[conversations.STATE_KEY] = token
+        return self.command.create_callback(self.name, action, **kwargs)
+
     def send_not_initialized_message(self, telegram_update: TelegramUpdate):
         """Send a message instructing the user to complete the setup if the chat is not initialized."""
         if not self.command.settings.is_initialized:
-            bot.send_message(
+            delivery.send_message(
                 _("Please complete the setup first by using the /start command."),
                 self.command.settings.chat_id,
                 message_id=telegram_update.message_id,
             )
             return
+
+
+class BoundSteps(Sequence[TelegramStep]):
+    """Sequence of the steps of a command, bound to the command when they are accessed."""
+
+    def __init__(self, command: TelegramCommand, graph: tuple[TelegramStep, ...]):
+        """Initialize the sequence for the given command."""
+        self.command = command
+        self.graph = graph
+        self._bound: dict[int, TelegramStep] = {}
+
+    def __len__(self):
+        """Return the number of steps."""
+        return len(self.graph)
+
+    def __getitem__(self, index):
+        """Return the bound step at the given index."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = range(len(self.graph))[index]
+        if index not in self._bound:
+            self._bound[index] = self.graph[index].bind(self.command)
+        return self._bound[index]
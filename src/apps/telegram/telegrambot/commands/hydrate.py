@@ -1,9 +1,10 @@
 """Hydrate command for Telegram bot."""
 
 from django.utils.translation import gettext as _
-from django_telegram_app.bot import bot
 from django_telegram_app.bot.base import TelegramUpdate
 
+from apps.telegram.models import ConsumptionEvent
+from apps.telegram.telegrambot import delivery
 from apps.telegram.telegrambot.base import TelegramCommand, TelegramStep
 
 
@@ -12,10 +13,10 @@ class Command(TelegramCommand):
 
     description = _("Log water consumption for the user.")
 
-    @property
-    def steps(self):
+    @classmethod
+    def build_steps(cls):
         """Return the steps of the command."""
-        return [AskConsumptionSize(self), LogConsumption(self)]
+        return [AskConsumptionSize(), LogConsumption()]
 
 
 class AskConsumptionSize(TelegramStep):
@@ -37,7 +38,7 @@ def handle(self, telegram_update: TelegramUpdate):
         default_callback = self.next_step_callback(data, consumption_size_ml=self.command.settings.consumption_size_ml)
         keyboard = [[{"text": f"{self.command.settings.consumption_size_ml}ml", "callback_data": default_callback}]]
 
-        bot.send_message(
+        delivery.send_message(
             prompt,
             self.command.settings.chat_id,
             reply_markup={"inline_keyboard": keyboard},
@@ -63,9 +64,7 @@ def handle(self, telegram_update: TelegramUpdate):
             self.command.previous_step(self.name, telegram_update)
             return
 
-        self.command.settings.consumed_today_ml += consumption_size_ml
-        self.command.settings.next_reminder_at = self.command.settings.compute_next_reminder_datetime()
-        self.command.settings.save()
+        self.command.settings.log_consumption(consumption_size_ml, source=ConsumptionEvent.Source.HYDRATE)
         data = self.get_callback_data(telegram_update)
         msg = _(
             "Logged {consumption_size_ml}ml of water! 💧\n\n"
@@ -77,7 +76,7 @@ def handle(self, telegram_update: TelegramUpdate):
             daily_goal_ml=self.command.settings.daily_goal_ml,
             next_reminder_at=self.command.settings.get_next_reminder_at_display(),
         )
-        bot.send_message(
+        delivery.send_message(
             msg,
             self.command.settings.chat_id,
             message_id=telegram_update.message_id,
@@ -1,9 +1,9 @@
 """Overview command for Telegram bot."""
 
 from django.utils.translation import gettext as _
-from django_telegram_app.bot import bot
 from django_telegram_app.bot.base import TelegramUpdate
 
+from apps.telegram.telegrambot import delivery
 from apps.telegram.telegrambot.base import TelegramCommand, TelegramStep
 
 
@@ -12,10 +12,10 @@ class Command(TelegramCommand):
 
     description = _("Show an overview of today's water consumption.")
 
-    @property
-    def steps(self):
+    @classmethod
+    def build_steps(cls):
         """Return the steps of the command."""
-        return [ShowOverview(self)]
+        return [ShowOverview()]
 
 
 class ShowOverview(TelegramStep):
@@ -42,8 +42,12 @@ def handle(self, telegram_update: TelegramUpdate):
         msg += _("\n\nNext reminder scheduled at {next_reminder_at}.").format(
             next_reminder_at=self.command.settings.get_next_reminder_at_display()
         )
+        if len(self.command.settings.reminder_plan) > 1:
+            msg += _("\nPlanned reminders for today: {reminder_plan}.").format(
+                reminder_plan=self.command.settings.get_reminder_plan_display()
+            )
 
-        bot.send_message(
+        delivery.send_message(
             msg,
             self.command.settings.chat_id,
             message_id=telegram_update.message_id,
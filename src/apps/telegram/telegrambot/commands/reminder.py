@@ -1,10 +1,12 @@
 """Reminder command for the telegram bot."""
 
+from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import gettext as _
-from django_telegram_app.bot import bot
 from django_telegram_app.bot.base import TelegramUpdate
 
+from apps.telegram.models import ConsumptionEvent
+from apps.telegram.telegrambot import delivery
 from apps.telegram.telegrambot.base import TelegramCommand, TelegramStep
 
 
@@ -14,10 +16,10 @@ class Command(TelegramCommand):
     description = _("Send hydration reminders to the user.")
     exclude_from_help = True
 
-    @property
-    def steps(self):
+    @classmethod
+    def build_steps(cls):
         """Return the steps of the command."""
-        return [Remind(self), ScheduleNext(self)]
+        return [Remind(), ScheduleNext()]
 
 
 class Remind(TelegramStep):
@@ -31,8 +33,8 @@ def handle(self, telegram_update: TelegramUpdate):
 
         if not self.command.settings.next_reminder_at:
             # First reminder
-            self.command.settings.next_reminder_at = self.command.settings.compute_next_reminder_datetime()
-            self.command.settings.save()
+            self.command.settings.plan_reminders()
+            self.command.settings.save(update_fields=self.command.settings.PLAN_FIELDS)
             return
 
         now = timezone.now()
@@ -54,14 +56,18 @@ def handle(self, telegram_update: TelegramUpdate):
 
         data = self.get_callback_data(telegram_update)
         keyboard = [[{"text": _("💧 Done"), "callback_data": self.next_step_callback(data, done=True)}]]
-        bot.send_message(
-            self.command.settings.reminder_text,
-            self.command.settings.chat_id,
-            reply_markup={"inline_keyboard": keyboard},
-            message_id=telegram_update.message_id,
-        )
-        self.command.settings.last_reminder_sent_at = current_time
-        self.command.settings.save()
+        # The reminder is queued together with its state, and at most once per reminder slot
+        reminder_slot = f"{self.command.settings.get_local_date(now)}T{self.command.settings.next_reminder_at}"
+        with transaction.atomic():
+            delivery.send_message(
+                self.command.settings.reminder_text,
+                self.command.settings.chat_id,
+                reply_markup={"inline_keyboard": keyboard},
+                message_id=telegram_update.message_id,
+                idempotency_key=f"reminder:{self.command.settings.chat_id}:{reminder_slot}",
+            )
+            self.command.settings.last_reminder_sent_at = current_time
+            self.command.settings.save(update_fields=["last_reminder_sent_at", "updated_at"])
 
 
 class ScheduleNext(TelegramStep):
@@ -69,15 +75,12 @@ class ScheduleNext(TelegramStep):
 
     def handle(self, telegram_update: TelegramUpdate):
         """Handle scheduling the next reminder."""
-        now = timezone.now()
-        from_time = now.time()
-        self.command.settings.consumed_today_ml += self.command.settings.consumption_size_ml
-        self.command.settings.next_reminder_at = self.command.settings.compute_next_reminder_datetime(from_time)
-        self.command.settings.save()
+        settings = self.command.settings
+        settings.log_consumption(settings.consumption_size_ml, source=ConsumptionEvent.Source.REMINDER)
         msg = _("Next reminder scheduled at {next_reminder_at}.").format(
             next_reminder_at=self.command.settings.get_next_reminder_at_display()
         )
-        bot.send_message(
+        delivery.send_message(
             msg,
             self.command.settings.chat_id,
             message_id=telegram_update.message_id,
@@ -1,11 +1,12 @@
 """Start command for Telegram bot."""
 
 from django.core.exceptions import ValidationError
+from django.utils.translation import get_language
 from django.utils.translation import gettext as _
-from django_telegram_app.bot import bot
 from django_telegram_app.bot.base import TelegramUpdate
 
-from apps.telegram.telegrambot import timezoneinfo
+from apps.telegram.models import TelegramSettings
+from apps.telegram.telegrambot import delivery, timezoneinfo
 from apps.telegram.telegrambot.base import TelegramCommand, TelegramStep
 
 
@@ -17,29 +18,29 @@ class Command(TelegramCommand):
 
     description = _("Start command to welcome the user and initialize settings.")
 
-    @property
-    def steps(self):
+    @classmethod
+    def build_steps(cls):
         """Return the steps of the command."""
         return [
-            WelcomeStep(self),
-            AskTimezoneRegion(self),
-            ValidateTimezone(self, unique_id="validate_timezone_region"),
-            AskTimezone(self),
-            ValidateTimezone(self, unique_id="validate_timezone"),
-            AskTelegramSettingsField(self, "daily_goal_ml", unique_id="ask_daily_goal_ml"),
-            ValidateFieldInput(self, "daily_goal_ml", unique_id="validate_daily_goal_ml"),
-            AskTelegramSettingsField(self, "reminder_window_start", unique_id="ask_reminder_window_start"),
-            ValidateFieldInput(self, "reminder_window_start", unique_id="validate_reminder_window_start"),
-            AskTelegramSettingsField(self, "reminder_window_end", unique_id="ask_reminder_window_end"),
-            ValidateFieldInput(self, "reminder_window_end", unique_id="validate_reminder_window_end"),
-            AskTelegramSettingsField(self, "consumption_size_ml", unique_id="ask_consumption_size_ml"),
-            ValidateFieldInput(self, "consumption_size_ml", unique_id="validate_consumption_size_ml"),
-            AskTelegramSettingsField(self, "minimum_interval_seconds", unique_id="ask_minimum_interval_seconds"),
-            ValidateFieldInput(self, "minimum_interval_seconds", unique_id="validate_minimum_interval_seconds"),
-            AskTelegramSettingsField(self, "reminder_text", unique_id="ask_reminder_text"),
-            ValidateFieldInput(self, "reminder_text", unique_id="validate_reminder_text"),
-            AskConfirmation(self),
-            ConfirmStart(self),
+            WelcomeStep(),
+            AskTimezoneRegion(),
+            ValidateTimezone(unique_id="validate_timezone_region"),
+            AskTimezone(),
+            ValidateTimezone(unique_id="validate_timezone"),
+            AskTelegramSettingsField("daily_goal_ml", unique_id="ask_daily_goal_ml"),
+            ValidateFieldInput("daily_goal_ml", unique_id="validate_daily_goal_ml"),
+            AskTelegramSettingsField("reminder_window_start", unique_id="ask_reminder_window_start"),
+            ValidateFieldInput("reminder_window_start", unique_id="validate_reminder_window_start"),
+            AskTelegramSettingsField("reminder_window_end", unique_id="ask_reminder_window_end"),
+            ValidateFieldInput("reminder_window_end", unique_id="validate_reminder_window_end"),
+            AskTelegramSettingsField("consumption_size_ml", unique_id="ask_consumption_size_ml"),
+            ValidateFieldInput("consumption_size_ml", unique_id="validate_consumption_size_ml"),
+            AskTelegramSettingsField("minimum_interval_seconds", unique_id="ask_minimum_interval_seconds"),
+            ValidateFieldInput("minimum_interval_seconds", unique_id="validate_minimum_interval_seconds"),
+            AskTelegramSettingsField("reminder_text", unique_id="ask_reminder_text"),
+            ValidateFieldInput("reminder_text", unique_id="validate_reminder_text"),
+            AskConfirmation(),
+            ConfirmStart(),
         ]
 
 
@@ -52,7 +53,7 @@ def handle(self, telegram_update: TelegramUpdate):
             "Welcome to H2Oh! I am here to help you track and maintain your daily water intake. "
             "Let's get started with setting up your preferences."
         )
-        bot.send_message(greeting, self.command.settings.chat_id, message_id=telegram_update.message_id)
+        delivery.send_message(greeting, self.command.settings.chat_id, message_id=telegram_update.message_id)
         self.command.next_step(self.name, telegram_update)
 
 
@@ -75,7 +76,7 @@ def handle(self, telegram_update: TelegramUpdate):
             callback_data = self.next_step_callback(data, timezone_region=region)
             keyboard.append([{"text": region, "callback_data": callback_data}])
         reply_markup = {"inline_keyboard": keyboard}
-        bot.send_message(
+        delivery.send_message(
             prompt,
             self.command.settings.chat_id,
             reply_markup=reply_markup,
@@ -84,7 +85,10 @@ def handle(self, telegram_update: TelegramUpdate):
 
 
 class ValidateTimezone(TelegramStep):
-    """Step to validate the user's timezone input."""
+    """Step to validate the user's timezone input.
+
+    Invalid input is answered with the closest timezones as buttons, so a typo does not restart the timezone steps.
+    """
 
     def handle(self, telegram_update: TelegramUpdate):
         """Validate the user's timezone input."""
@@ -92,16 +96,40 @@ def handle(self, telegram_update: TelegramUpdate):
         timezone_input = data.get("timezone", "")
         normalized_tz = timezoneinfo.normalize_timezone(timezone_input)
         if "timezone" in data and normalized_tz not in timezoneinfo.ALL_TIMEZONES:
+            data.pop("timezone")
+            suggestions = timezoneinfo.TIMEZONE_INDEX.suggest(timezone_input)
+            if suggestions:
+                self.send_suggestions(timezone_input, suggestions, data, telegram_update)
+                return
             error_message = _(
                 "The timezone '{timezone_input}' (normalized as '{normalized_tz}') is not valid. Please try again."
             ).format(timezone_input=timezone_input, normalized_tz=normalized_tz)
-            data.pop("timezone")
             telegram_update.callback_data = self.previous_step_callback(1, data, _error=error_message)
             self.command.previous_step(self.name, telegram_update)
             return
 
         self.command.next_step(self.name, telegram_update)
 
+    def send_suggestions(
+        self, timezone_input: str, suggestions: list[str], data: dict, telegram_update: TelegramUpdate
+    ):
+        """Ask the user to pick one of the suggested timezones or to go back."""
+        prompt = _(
+            "The timezone '{timezone_input}' is not valid. Did you mean one of these? "
+            "You can also send another timezone name."
+        ).format(timezone_input=timezone_input)
+        keyboard = []
+        for tz in suggestions:
+            keyboard.append([{"text": tz, "callback_data": self.next_step_callback(data, timezone=tz)}])
+        keyboard.append([{"text": _("⬅️ Back"), "callback_data": self.previous_step_callback(1, data)}])
+        reply_markup = {"inline_keyboard": keyboard}
+        delivery.send_message(
+            prompt,
+            self.command.settings.chat_id,
+            reply_markup=reply_markup,
+            message_id=telegram_update.message_id,
+        )
+
 
 class AskTimezone(TelegramStep):
     """Step to ask the user for their timezone."""
@@ -118,7 +146,7 @@ def handle(self, telegram_update: TelegramUpdate):
         region = data["timezone_region"]
         keyboard = []
         for tz in timezoneinfo.COMMON_TIMEZONES[region]:
-            callback_data = self.next_step_callback(self.get_callback_data(telegram_update), timezone=tz)
+            callback_data = self.next_step_callback(data, timezone=tz)
             keyboard.append([{"text": tz, "callback_data": callback_data}])
 
         data.pop("timezone_region", None)
@@ -127,7 +155,7 @@ def handle(self, telegram_update: TelegramUpdate):
         keyboard.append([{"text": _("⬅️ Back"), "callback_data": step_back_data}])
 
         reply_markup = {"inline_keyboard": keyboard}
-        bot.send_message(
+        delivery.send_message(
             prompt,
             self.command.settings.chat_id,
             reply_markup=reply_markup,
@@ -138,35 +166,44 @@ def handle(self, telegram_update: TelegramUpdate):
 class AskTelegramSettingsField(TelegramStep):
     """Step to ask the user for a value for a TelegramSettings field."""
 
-    def __init__(self, command, field_name: str, unique_id=None):
+    def __init__(self, field_name: str, unique_id=None):
         """Initialize the AskUserData step."""
-        super().__init__(command, unique_id=unique_id)
+        super().__init__(unique_id=unique_id)
         self.field_name = field_name
-        self.field = self.command.settings._meta.get_field(self.field_name)
-        self.prompt = _("Please provide your {field_verbose_name}.\n{field_help_text}").format(
-            field_verbose_name=self.field.verbose_name,
-            field_help_text=self.field.help_text,
-        )
+        self.field = TelegramSettings._meta.get_field(self.field_name)
+        # The translated prompt per language code, shared by all updates
+        self._prompts: dict[str, str] = {}
+
+    def get_prompt(self) -> str:
+        """Return the prompt in the active language."""
+        language = get_language()
+        if language not in self._prompts:
+            self._prompts[language] = _("Please provide your {field_verbose_name}.\n{field_help_text}").format(
+                field_verbose_name=self.field.verbose_name,
+                field_help_text=self.field.help_text,
+            )
+        return self._prompts[language]
 
     def handle(self, telegram_update: TelegramUpdate):
         """Prepare any data needed for the Ask step."""
         data = self.get_callback_data(telegram_update)
+        prompt = self.get_prompt()
         if "_error" in data:
-            self.prompt = f"{data.pop('_error')}\n\n{self.prompt}"
+            prompt = f"{data.pop('_error')}\n\n{prompt}"
         self.add_waiting_for(self.field_name, data)
         reply_markup = None
         current_value = getattr(self.command.settings, self.field_name)
         if self.field.blank or current_value:
             skip_value = current_value or self.field.get_default()
-            self.prompt += _(
+            prompt += _(
                 "\nOr you can skip by clicking the button below to use the current value: {skip_value}."
             ).format(skip_value=skip_value)
             skip_options = {self.field_name: skip_value}
             next_callback = self.next_step_callback(data, **skip_options)
             keyboard = [[{"text": str(skip_value), "callback_data": next_callback}]]
             reply_markup = {"inline_keyboard": keyboard}
-        bot.send_message(
-            self.prompt,
+        delivery.send_message(
+            prompt,
             self.command.settings.chat_id,
             reply_markup=reply_markup,
             message_id=telegram_update.message_id,
@@ -176,11 +213,11 @@ def handle(self, telegram_update: TelegramUpdate):
 class ValidateFieldInput(TelegramStep):
     """Step to validate user input for a TelegramSettings field."""
 
-    def __init__(self, command, field_name: str, unique_id=None):
+    def __init__(self, field_name: str, unique_id=None):
         """Initialize the ValidateFieldInput step."""
-        super().__init__(command, unique_id=unique_id)
+        super().__init__(unique_id=unique_id)
         self.field_name = field_name
-        self.field = self.command.settings._meta.get_field(self.field_name)
+        self.field = TelegramSettings._meta.get_field(self.field_name)
 
     def handle(self, telegram_update: TelegramUpdate):
         """Validate the user input for the specified field."""
@@ -229,7 +266,7 @@ def handle(self, telegram_update: TelegramUpdate):
             field_value = data.get(field)
             prompt += f" - {self.command.settings._meta.get_field(field).verbose_name}: {field_value}\n"
         prompt = prompt.rstrip("\n")
-        bot.send_message(
+        delivery.send_message(
             prompt,
             self.command.settings.chat_id,
             reply_markup=reply_markup,
@@ -263,11 +300,13 @@ def handle(self, telegram_update: TelegramUpdate):
         cmd_settings.timezone = timezoneinfo.normalize_timezone(cmd_settings.timezone)
         cmd_settings.reminder_window_start = cmd_settings.convert_time_to_utc(cmd_settings.reminder_window_start)
         cmd_settings.reminder_window_end = cmd_settings.convert_time_to_utc(cmd_settings.reminder_window_end)
-        cmd_settings.next_reminder_at = cmd_settings.compute_next_reminder_datetime()
+        cmd_settings.plan_reminders()
         cmd_settings.save()
         confirmation_message = _(
             "Thank you! Your setup is now complete. You will start receiving hydration reminders based on your preferences. "
             "Stay hydrated!"
         )
-        bot.send_message(confirmation_message, self.command.settings.chat_id, message_id=telegram_update.message_id)
+        delivery.send_message(
+            confirmation_message, self.command.settings.chat_id, message_id=telegram_update.message_id
+        )
         self.command.finish(self.name, telegram_update)
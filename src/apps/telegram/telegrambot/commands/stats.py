@@ -0,0 +1,68 @@
+"""Stats command for Telegram bot."""
+
+from django.utils.translation import gettext as _
+from django_telegram_app.bot.base import TelegramUpdate
+
+from apps.telegram.models import ConsumptionStats
+from apps.telegram.telegrambot import delivery
+from apps.telegram.telegrambot.base import TelegramCommand, TelegramStep
+
+
+class Command(TelegramCommand):
+    """Stats command to display the averages, the goal-hit rate and the streak of the user."""
+
+    description = _("Show your weekly and monthly hydration statistics.")
+
+    @classmethod
+    def build_steps(cls):
+        """Return the steps of the command."""
+        return [ShowStats()]
+
+
+class ShowStats(TelegramStep):
+    """Step to show the statistics, read from the rollups of the daily totals."""
+
+    def handle(self, telegram_update: TelegramUpdate):
+        """Handle showing the statistics."""
+        if not self.command.settings.is_initialized:
+            self.send_not_initialized_message(telegram_update)
+            return
+
+        settings = self.command.settings
+        stats = ConsumptionStats.objects.filter(telegram_settings=settings).first()
+        today = settings.get_local_date()
+        goal_met_today = settings.consumed_today_ml >= settings.daily_goal_ml
+        msg = _("📊 Your hydration statistics:\n\nToday: {consumed}ml out of your daily goal of {goal}ml.").format(
+            consumed=settings.consumed_today_ml, goal=settings.daily_goal_ml
+        )
+        if stats is None or not stats.tracked_days:
+            msg += _("\n\nCome back tomorrow for your weekly and monthly statistics.")
+        else:
+            msg += self.format_period(
+                _("Last 7 days"), stats.week_consumed_ml, stats.week_goal_days, stats.WEEK_DAYS, stats
+            )
+            msg += self.format_period(
+                _("Last 30 days"), stats.month_consumed_ml, stats.month_goal_days, stats.MONTH_DAYS, stats
+            )
+        streak = stats.get_current_streak(today, goal_met_today) if stats is not None else int(goal_met_today)
+        msg += _("\n\n🔥 Current streak: {streak} day(s).").format(streak=streak)
+
+        delivery.send_message(msg, settings.chat_id, message_id=telegram_update.message_id)
+        self.command.next_step(self.name, telegram_update)
+
+    @staticmethod
+    def format_period(label: str, consumed_ml: int, goal_days: int, period_days: int, stats: ConsumptionStats) -> str:
+        """Format the average and the goal-hit rate of the last closed days of a period.
+
+        Users that are tracked for less days than the period are averaged over the days they are tracked.
+        """
+        days = min(period_days, stats.tracked_days)
+        return _(
+            "\n\n{label}: {average}ml per day on average, goal reached on {goal_days} of {days} days ({rate}%)."
+        ).format(
+            label=label,
+            average=round(consumed_ml / days),
+            goal_days=goal_days,
+            days=days,
+            rate=round(goal_days * 100 / days),
+        )
@@ -1,9 +1,9 @@
 """Stop command for Telegram bot."""
 
 from django.utils.translation import gettext as _
-from django_telegram_app.bot import bot
 from django_telegram_app.bot.base import TelegramUpdate
 
+from apps.telegram.telegrambot import delivery
 from apps.telegram.telegrambot.base import TelegramCommand, TelegramStep
 
 
@@ -15,10 +15,10 @@ class Command(TelegramCommand):
 
     description = _("Stop command to stop the bot and clear settings.")
 
-    @property
-    def steps(self):
+    @classmethod
+    def build_steps(cls):
         """Return the steps of the command."""
-        return [AskConfirmation(self), ConfirmStop(self)]
+        return [AskConfirmation(), ConfirmStop()]
 
 
 class AskConfirmation(TelegramStep):
@@ -35,7 +35,7 @@ def handle(self, telegram_update: TelegramUpdate):
         ]
         reply_markup = {"inline_keyboard": keyboard}
         prompt = _("Are you sure you want your settings to be cleared?\nYou won't receive reminders anymore.")
-        bot.send_message(
+        delivery.send_message(
             prompt,
             self.command.settings.chat_id,
             reply_markup=reply_markup,
@@ -53,5 +53,7 @@ def handle(self, telegram_update: TelegramUpdate):
             "Your settings have been cleared. You will no longer receive hydration reminders. "
             "If you want to start again, just send the /start command."
         )
-        bot.send_message(confirmation_message, self.command.settings.chat_id, message_id=telegram_update.message_id)
+        delivery.send_message(
+            confirmation_message, self.command.settings.chat_id, message_id=telegram_update.message_id
+        )
         self.command._clear_callback_data(telegram_update)
@@ -0,0 +1,122 @@
+"""Server-side state of the conversations of the commands.
+
+A command collects answers over several steps, e.g. the timezone, goal and reminder window of /start. Every button
+used to carry all answers collected so far in its own callback data, so every step copied a growing blob into a row
+per button and parsed it again. The answers are now stored once per step as a `ConversationState` snapshot, and the
+callback of a button only holds the short token of the snapshot next to the value of the button itself.
+
+A snapshot is addressed by a hash of the chat, the run of the command and the answers, so storing the same answers
+twice stores a single row, and a snapshot never changes. The snapshots are kept in an in-process LRU in front of the
+database, whichever process stored them. Deleting a run evicts its snapshots from the cache of the process that
+deletes it, so saving always inserts the row (ignoring the conflict if it exists): another process may have deleted
+the snapshot since it was cached here.
+
+The snapshots of a run are deleted when its command finishes. The snapshots of abandoned conversations are pruned
+after `RETENTION` by `resetreminderstate`, their buttons then continue without the collected answers.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from apps.telegram.models import ConversationState, TelegramSettings
+
+# The key of the token of the snapshot in the callback data
+STATE_KEY = "_state"
+CACHE_SIZE = 4_096
+# The snapshots of conversations that were abandoned are kept this long
+RETENTION = timedelta(days=7)
+
+
+class ConversationStore:
+    """Store of the conversation snapshots, backed by the database with an in-process LRU in front."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        """Initialize an empty cache of `maxsize` snapshots."""
+        self.maxsize = maxsize
+        # The correlation key and answers of a token, and the cached tokens of a correlation key
+        self._cache: OrderedDict[str, tuple[str, dict[str, Any]]] = OrderedDict()
+        self._tokens: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def save(self, telegram_settings: TelegramSettings, correlation_key: str, data: dict[str, Any]) -> str:
+        """Store the answers of a run of a command and return the token of the snapshot."""
+        content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(f"{telegram_settings.chat_id}:{correlation_key}:{content}".encode())
+        token = digest.hexdigest()
+        data = json.loads(content)  # As it is read from the database, e.g. with times as strings
+        ConversationState.objects.bulk_create(
+            [
+                ConversationState(
+                    token=token, telegram_settings=telegram_settings, correlation_key=correlation_key, data=data
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        self._set_cached(token, correlation_key, data)
+        return token
+
+    def load(self, token: str) -> dict[str, Any]:
+        """Return a copy of the answers of the snapshot, or an empty dict if the snapshot was deleted."""
+        data = self._get_cached(token)
+        if data is None:
+            row = ConversationState.objects.filter(token=token).values_list("correlation_key", "data").first()
+            if row is None:
+                return {}
+            correlation_key, data = row
+            self._set_cached(token, correlation_key, data)
+        return dict(data)
+
+    def delete(self, correlation_key: str):
+        """Delete the snapshots of a run of a command and evict their copies from the cache of this process."""
+        ConversationState.objects.filter(correlation_key=correlation_key).delete()
+        with self._lock:
+            for token in self._tokens.pop(correlation_key, ()):
+                del self._cache[token]
+
+    def prune(self, now: datetime | None = None) -> int:
+        """Delete the snapshots older than the retention period, return the number of deleted snapshots.
+
+        The snapshots of a finished command are already deleted, so these are the snapshots of abandoned conversations.
+        The copies in the caches of the processes are evicted in due time.
+        """
+        if now is None:
+            now = timezone.now()
+        deleted, _ = ConversationState.objects.filter(created_at__lt=now - RETENTION).delete()
+        return deleted
+
+    def clear_cache(self):
+        """Empty the in-process cache."""
+        with self._lock:
+            self._cache.clear()
+            self._tokens.clear()
+
+    def _get_cached(self, token: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._cache.get(token)
+            if entry is None:
+                return None
+            self._cache.move_to_end(token)
+            return entry[1]
+
+    def _set_cached(self, token: str, correlation_key: str, data: dict[str, Any]):
+        with self._lock:
+            self._cache[token] = (correlation_key, data)
+            self._cache.move_to_end(token)
+            self._tokens.setdefault(correlation_key, set()).add(token)
+            if len(self._cache) > self.maxsize:
+                evicted, (evicted_key, _) = self._cache.popitem(last=False)
+                tokens = self._tokens[evicted_key]
+                tokens.discard(evicted)
+                if not tokens:
+                    del self._tokens[evicted_key]
+
+
+store = ConversationStore()
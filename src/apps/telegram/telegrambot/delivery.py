@@ -0,0 +1,227 @@
+"""Outbound delivery of telegram messages.
+
+Steps send their messages through `send_message`, which stores them in the outbox (`OutboxMessage`). The outbox
+worker (see `apps.telegram.outbox`) claims them in batches and hands them to a `DeliveryPool`, which sends them
+concurrently while respecting telegram's rate limits. Handling an update or a tick never waits for the bot api.
+
+References:
+https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from apps.telegram import metrics
+from apps.telegram.models import OutboxMessage
+
+if TYPE_CHECKING:
+    import requests
+
+# Telegram allows about 30 messages per second overall and about 1 message per second in a single chat.
+GLOBAL_RATE = 30.0
+PER_CHAT_RATE = 1.0
+WORKERS = 8
+MAX_RETRIES = 3
+
+DeliveryCallback = Callable[[Exception | None], None]
+
+
+def send_message(
+    text: str,
+    chat_id: int,
+    reply_markup: dict | None = None,
+    message_id: int = 0,
+    idempotency_key: str | None = None,
+) -> bool:
+    """Queue a message for delivery to the user.
+
+    The signature is the same as `django_telegram_app.bot.bot.send_message`, with an optional idempotency key.
+    A message with a key that was queued before is dropped. Return whether the message was queued.
+    """
+    return OutboxMessage.enqueue(
+        text, chat_id, reply_markup=reply_markup, message_id=message_id, idempotency_key=idempotency_key
+    )
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter.
+
+    The bucket holds at most `capacity` tokens and is refilled with `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        """Initialize a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available.
+
+        Return 0 if a token was taken, otherwise the number of seconds until a token will be available.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        while wait := self.try_acquire():
+            time.sleep(wait)
+
+
+@dataclass
+class DeliveryReport:
+    """Report on the messages delivered by a pool."""
+
+    sent: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def throughput(self) -> float:
+        """Return the number of messages sent per second."""
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def add(self, sent: bool):
+        """Count a sent or failed message."""
+        with self._lock:
+            if sent:
+                self.sent += 1
+            else:
+                self.failed += 1
+
+    def __str__(self):
+        """Return a one line summary of the report."""
+        return (
+            f"Delivered {self.sent} messages ({self.failed} failed) in {self.elapsed:.2f}s "
+            f"({self.throughput:.1f} msg/s)."
+        )
+
+
+class DeliveryPool:
+    """Pool of worker threads that deliver messages concurrently.
+
+    Messages for the same chat are always handled by the same worker, so they are delivered in the order they were
+    submitted. A global token bucket (shared by all workers) and a token bucket per chat enforce telegram's limits.
+    """
+
+    def __init__(
+        self,
+        workers: int = WORKERS,
+        global_rate: float = GLOBAL_RATE,
+        per_chat_rate: float = PER_CHAT_RATE,
+        max_retries: int = MAX_RETRIES,
+    ):
+        """Initialize the pool and start its workers."""
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.report = DeliveryReport()
+        self._started_at = time.perf_counter()
+        self._queues: list[queue.Queue] = [queue.Queue() for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._work, args=(work_queue,), daemon=True, name=f"delivery-{index}")
+            for index, work_queue in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(
+        self,
+        text: str,
+        chat_id: int,
+        reply_markup: dict | None = None,
+        message_id: int = 0,
+        on_done: DeliveryCallback | None = None,
+    ):
+        """Queue a message for delivery.
+
+        `on_done` is called from a worker thread once the message is delivered (with None) or given up on (with the
+        last error).
+        """
+        message = {"text": text, "chat_id": chat_id, "reply_markup": reply_markup, "message_id": message_id}
+        self._queues[hash(chat_id) % len(self._queues)].put((message, on_done))
+
+    def join(self):
+        """Wait until all queued messages are handled, without stopping the workers."""
+        for work_queue in self._queues:
+            work_queue.join()
+
+    def close(self) -> DeliveryReport:
+        """Wait until all queued messages are delivered, stop the workers and return the report."""
+        for work_queue in self._queues:
+            work_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.report.elapsed = time.perf_counter() - self._started_at
+        return self.report
+
+    def _work(self, work_queue: queue.Queue):
+        """Deliver the messages of a single queue until the stop sentinel is received."""
+        chat_buckets: dict[int, TokenBucket] = {}
+        while (item := work_queue.get()) is not None:
+            message, on_done = item
+            try:
+                chat_bucket = chat_buckets.setdefault(message["chat_id"], TokenBucket(self.per_chat_rate))
+                error = self._deliver(message, chat_bucket)
+                self.report.add(error is None)
+                if on_done is not None:
+                    on_done(error)
+            finally:
+                work_queue.task_done()
+        work_queue.task_done()
+
+    def _deliver(self, message: dict, chat_bucket: TokenBucket) -> Exception | None:
+        """Deliver a single message, retrying when telegram asks to slow down. Return the error if it was not sent."""
+        # Imported here, so queueing messages (e.g. in the ticks started by cron) does not import the http client
+        import requests
+        from django_telegram_app.bot import bot
+
+        error = None
+        for _ in range(self.max_retries + 1):
+            chat_bucket.acquire()
+            self.global_bucket.acquire()
+            try:
+                with metrics.observe_send():
+                    bot.send_message(**message)
+            except requests.HTTPError as exc:
+                retry_after = _get_retry_after(exc)
+                if retry_after is None:
+                    logging.exception(f"Error delivering a message to chat {message['chat_id']}")
+                    return exc
+                error = exc
+                time.sleep(retry_after)
+            except requests.RequestException as exc:
+                logging.exception(f"Error delivering a message to chat {message['chat_id']}")
+                return exc
+            else:
+                return None
+        logging.error(f"Giving up delivering a message to chat {message['chat_id']} after {self.max_retries} retries")
+        return error
+
+
+def _get_retry_after(exc: requests.HTTPError) -> float | None:
+    """Return the number of seconds telegram asks to wait before retrying, or None if the error is not a 429."""
+    if exc.response is None or exc.response.status_code != 429:
+        return None
+    try:
+        return float(exc.response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return 1.0
@@ -1,6 +1,15 @@
-"""Timezone information for Telegram bot."""
+"""Timezone information for Telegram bot.
 
+`TIMEZONE_INDEX` is built once at import. It resolves timezone names regardless of case and spacing, as well as
+unambiguous city names (e.g. "tokyo"), and suggests the closest timezones for misspelled input by comparing trigrams.
+"""
+
+import re
 import zoneinfo
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from itertools import chain
 
 ALL_TIMEZONES = zoneinfo.available_timezones()
 COMMON_TIMEZONES = {
@@ -46,16 +55,97 @@
 
 
 def normalize_timezone(tz_input: str) -> str:
-    """Normalize timezone input by stripping spaces and title-casing.
+    """Normalize timezone input to the name of a known timezone, or by stripping spaces and title-casing.
 
-    For single word timezones like "UTC", convert to uppercase.
+    Known timezones are matched regardless of case and spacing, unambiguous city names resolve to their timezone.
+    For unknown single word timezones, convert to uppercase.
 
     Example:
         "america/new york" -> "America/New_York"
         " europe / paris " -> "Europe/Paris"
+        "tokyo" -> "Asia/Tokyo"
         "UTC" -> "UTC"
     """
+    if timezone_name := TIMEZONE_INDEX.lookup(tz_input):
+        return timezone_name
     if "/" not in tz_input:
         # Single word timezone, e.g.: "UTC"
         return tz_input.strip().upper()
     return tz_input.strip().replace(" ", "_").title()
+
+
+class TimezoneIndex:
+    """Index of timezone names for exact lookups and fuzzy suggestions.
+
+    Every timezone is indexed by two terms: its full name and its city (the last part of the name), both as a key
+    without case, spaces, underscores or dashes. A suggestion scores the terms by their shared trigrams, and terms
+    that start with the input score as an exact match.
+    """
+
+    MIN_SCORE = 0.3
+
+    def __init__(self, timezones: Iterable[str]):
+        """Build the index for the given timezone names."""
+        self._names: dict[str, str] = {}  # full key -> name
+        self._cities: dict[str, list[str]] = defaultdict(list)  # city key -> names
+        self._terms: list[tuple[str, str]] = []  # (key, name), sorted by key for the prefix lookups
+        for name in sorted(timezones):
+            key = self.get_key(name)
+            city_key = self.get_key(name.rsplit("/", 1)[-1])
+            self._names[key] = name
+            self._cities[city_key].append(name)
+            self._terms.append((key, name))
+            if city_key != key:
+                self._terms.append((city_key, name))
+        self._terms.sort()
+        self._term_keys = [key for key, _ in self._terms]
+        self._trigram_counts = [len(self.get_trigrams(key)) for key in self._term_keys]
+        self._postings: dict[str, list[int]] = defaultdict(list)  # trigram -> indexes of the terms
+        for index, key in enumerate(self._term_keys):
+            for trigram in self.get_trigrams(key):
+                self._postings[trigram].append(index)
+
+    @staticmethod
+    def get_key(text: str) -> str:
+        """Return the key of a timezone name or of user input."""
+        return re.sub(r"[\s_-]+", "", text).lower()
+
+    @staticmethod
+    def get_trigrams(key: str) -> set[str]:
+        """Return the trigrams of a key, padded so short keys and their first letters count as well."""
+        padded = f"  {key} "
+        return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+    def lookup(self, text: str) -> str | None:
+        """Return the timezone for the full name or an unambiguous city name, or None."""
+        key = self.get_key(text)
+        if key in self._names:
+            return self._names[key]
+        names = self._cities.get(key, [])
+        return names[0] if len(names) == 1 else None
+
+    def suggest(self, text: str, limit: int = 5) -> list[str]:
+        """Return up to `limit` timezones that are closest to the given text, best first."""
+        key = self.get_key(text)
+        if not key:
+            return []
+        scores: dict[str, float] = {}
+        # Terms that start with the input
+        start = bisect_left(self._term_keys, key)
+        for term_key, name in self._terms[start:]:
+            if not term_key.startswith(key):
+                break
+            scores[name] = 1.0
+        # Terms that share trigrams with the input, scored by the dice coefficient
+        trigrams = self.get_trigrams(key)
+        shared = Counter(chain.from_iterable(self._postings.get(trigram, ()) for trigram in trigrams))
+        for index, count in shared.items():
+            score = 2 * count / (len(trigrams) + self._trigram_counts[index])
+            name = self._terms[index][1]
+            if score >= self.MIN_SCORE and score > scores.get(name, 0.0):
+                scores[name] = score
+        best = sorted(scores.items(), key=lambda item: (-item[1], len(item[0]), item[0]))
+        return [name for name, _ in best[:limit]]
+
+
+TIMEZONE_INDEX = TimezoneIndex(ALL_TIMEZONES)
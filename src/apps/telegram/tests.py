@@ -1,21 +1,96 @@
 """Tests for the telegram app."""
 
-from datetime import datetime, time
+import argparse
+import csv
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time as time_module
+import zoneinfo
+from contextlib import contextmanager
+from datetime import UTC, date, datetime, time, timedelta
+from io import StringIO
+from pathlib import Path
 from unittest.mock import patch
 
-from django.utils import timezone
+import requests
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.test import (
+    AsyncClient,
+    AsyncRequestFactory,
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+)
+from django.urls import reverse
+from django.utils import timezone, translation
+from django_telegram_app.bot.bot import handle_update
 from django_telegram_app.bot.testing.testcases import TelegramBotTestCase
+from django_telegram_app.conf import settings as app_settings
+from django_telegram_app.models import CallbackData, Message
 
-from apps.telegram.models import TelegramSettings
+from apps.telegram import archive, dashboard, export, metrics, outbox, sharding
+from apps.telegram import views as telegram_views
+from apps.telegram.ingest import UpdateIngester
+from apps.telegram.management.base import TelegramManagementCommand
+from apps.telegram.models import (
+    ConsumptionEvent,
+    ConsumptionStats,
+    ConversationState,
+    DailyTotal,
+    InboxUpdate,
+    OutboxMessage,
+    ShardLease,
+    TelegramSettings,
+)
+from apps.telegram.rollover import roll_over
+from apps.telegram.scheduler import OVERVIEW, REMINDER, Scheduler
+from apps.telegram.telegrambot import conversations, delivery, timezoneinfo
+from apps.telegram.telegrambot.commands.overview import Command as OverviewCommand
+from apps.telegram.telegrambot.commands.start import AskTelegramSettingsField
+from apps.telegram.telegrambot.commands.start import Command as StartCommand
+from apps.telegram.writebehind import WriteBehindBuffer
+from apps.users.models import User
+from benchmarks._utils import StubTelegramServer
+from benchmarks._vectorized import compute_next_reminders
+from reminders import timezones
+from reminders.queue import DueQueue
+from reminders.scheduling import HydrationSchedule, seconds_to_time, time_to_seconds
 
 
-class StartCommandTests(TelegramBotTestCase):
+class OutboxTelegramBotTestCase(TelegramBotTestCase):
+    """Telegram bot test case that delivers the outbox after every update, like the outbox worker would."""
+
+    def post_data(self, data: dict, verify: bool = True):
+        """Post data to the webhook and deliver the queued messages."""
+        response = super().post_data(data, verify=verify)
+        self.deliver_outbox()
+        return response
+
+    @staticmethod
+    def deliver_outbox():
+        """Deliver the queued messages, without rate limiting."""
+        return outbox.deliver_pending(workers=1, global_rate=10_000, per_chat_rate=10_000)
+
+
+class StartCommandTests(OutboxTelegramBotTestCase):
     """Start command test case."""
 
     def test_start_command_flow(self):
         """Test the full flow of the start command."""
         self.send_text("/start")
-        self.send_text("invalid timezone")  # timezone
+        self.send_text("1234")  # timezone
         self.assertIn("Please try again", self.last_bot_message)
         self.click_on_button("Europe")
         self.click_on_button(-1)  # go back
@@ -43,8 +118,22 @@ def test_start_command_flow(self):
         self.assertTrue(settings.is_initialized)
         self.assertIsNotNone(settings.next_reminder_at)
 
+    def test_timezone_suggestions(self):
+        """Test that a misspelled timezone is answered with suggestions and that a city name is resolved."""
+        self.send_text("/start")
+        self.send_text("europe/brussel")
+        self.assertIn("Did you mean one of these?", self.last_bot_message)
+        self.send_text("tokio")
+        self.assertIn("'tokio' is not valid", self.last_bot_message)
+        self.send_text("tokyo")
+        self.assertTrue(self.last_bot_message.startswith("Please provide your daily goal (ml)."))
+        self.send_text("/start")
+        self.send_text("europe/brussel")
+        self.click_on_button("Europe/Brussels")
+        self.assertTrue(self.last_bot_message.startswith("Please provide your daily goal (ml)."))
+
 
-class ReminderCommandTests(TelegramBotTestCase):
+class ReminderCommandTests(OutboxTelegramBotTestCase):
     """Reminder command test case."""
 
     def test_reminder_command(self):
@@ -79,6 +168,8 @@ def test_reminder_command(self):
         expected_time = self.fake_settings.reminder_window_start
         self._remind_and_done(fake_datetime, expected_time=expected_time)
         self.assertEqual(self.fake_settings.consumed_today_ml, self.fake_settings.daily_goal_ml)
+        daily_total = DailyTotal.objects.get(telegram_settings=self.fake_settings)
+        self.assertEqual((daily_total.consumed_ml, daily_total.event_count), (2000, 8))
 
     def _remind_only(self, fake_datetime: datetime):
         with patch("apps.telegram.telegrambot.commands.reminder.timezone.now", return_value=fake_datetime):
@@ -114,7 +205,7 @@ def create_fake_settings(self, current_datetime: datetime) -> TelegramSettings:
         return settings
 
 
-class HydrateCommandTests(TelegramBotTestCase):
+class HydrateCommandTests(OutboxTelegramBotTestCase):
     """Hydrate command test case."""
 
     @classmethod
@@ -144,3 +235,1390 @@ def test_hydrate_command(self):
         self.telegramsettings.refresh_from_db()
         self.assertEqual(self.telegramsettings.consumed_today_ml, 300)
         self.assertIsNotNone(self.telegramsettings.next_reminder_at)
+
+    def test_hydrate_command_logs_events_and_daily_total(self):
+        """Test that every consumption is logged and added to the daily total."""
+        for amount in ("300", "200"):
+            self.send_text("/hydrate")
+            self.send_text(amount)
+
+        events = ConsumptionEvent.objects.filter(telegram_settings=self.telegramsettings)
+        self.assertEqual(sorted(events.values_list("amount_ml", flat=True)), [200, 300])
+        self.assertEqual(set(events.values_list("source", flat=True)), {ConsumptionEvent.Source.HYDRATE})
+        daily_total = DailyTotal.objects.get(telegram_settings=self.telegramsettings)
+        self.assertEqual(daily_total.date, self.telegramsettings.get_local_date())
+        self.assertEqual((daily_total.consumed_ml, daily_total.event_count), (500, 2))
+
+
+class ConcurrentConsumptionTests(TransactionTestCase):
+    """Concurrent consumption logging test case."""
+
+    def test_parallel_updates_are_not_lost(self):
+        """Test that parallel consumption logs and state saves of one chat never lose an increment."""
+        telegram_settings = TelegramSettings.objects.create(
+            chat_id=123456789, timezone="UTC", daily_goal_ml=100_000, is_initialized=True
+        )
+        workers, logs_per_worker = 8, 10
+        barrier = threading.Barrier(workers)
+        errors = []
+
+        def worker(index: int):
+            try:
+                # Every worker starts from its own (soon stale) copy, like concurrent webhook requests
+                instance = TelegramSettings.objects.get(pk=telegram_settings.pk)
+                barrier.wait()
+                for _ in range(logs_per_worker):
+                    if index % 2:
+                        self._retry_while_locked(lambda: instance.log_consumption(100, ConsumptionEvent.Source.HYDRATE))
+                    else:
+                        self._retry_while_locked(lambda: self._save_state(instance))
+                        self._retry_while_locked(lambda: instance.log_consumption(50, ConsumptionEvent.Source.REMINDER))
+            except Exception as exc:  # noqa: BLE001
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        telegram_settings.refresh_from_db()
+        expected_ml = (workers // 2) * logs_per_worker * (100 + 50)
+        self.assertEqual(telegram_settings.consumed_today_ml, expected_ml)
+        daily_total = DailyTotal.objects.get(telegram_settings=telegram_settings)
+        self.assertEqual((daily_total.consumed_ml, daily_total.event_count), (expected_ml, workers * logs_per_worker))
+
+    @staticmethod
+    def _save_state(instance: TelegramSettings):
+        """Save the command state like the bot does between steps."""
+        OverviewCommand(instance)._clear_state()  # pylint: disable=protected-access
+
+    @staticmethod
+    def _retry_while_locked(func):
+        """Retry the function while the in-memory test database is locked by another thread."""
+        while True:
+            try:
+                return func()
+            except OperationalError as exc:
+                if "locked" not in str(exc):
+                    raise
+                time_module.sleep(0.001)
+
+
+class StartReminderCommandTests(OutboxTelegramBotTestCase):
+    """Startreminder management command test case."""
+
+    def test_only_due_settings_are_selected(self):
+        """Test that the tick only handles settings that are due for a reminder."""
+        defaults = {"is_initialized": True, "reminder_window_start": time(8), "reminder_window_end": time(22)}
+        TelegramSettings.objects.create(chat_id=1, next_reminder_at=time(11, 30), **defaults)
+        TelegramSettings.objects.create(chat_id=2, next_reminder_at=time(13), **defaults)
+        TelegramSettings.objects.create(
+            chat_id=3, next_reminder_at=time(11), last_reminder_sent_at=time(11, 1), **defaults
+        )
+        TelegramSettings.objects.create(chat_id=4, next_reminder_at=time(11, 30), is_initialized=False)
+        TelegramSettings.objects.create(chat_id=5, **defaults)
+
+        fake_datetime = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        with (
+            patch("apps.telegram.management.commands.startreminder.timezone.now", return_value=fake_datetime),
+            patch("apps.telegram.telegrambot.commands.reminder.timezone.now", return_value=fake_datetime),
+        ):
+            call_command("startreminder", stdout=StringIO())
+        self.deliver_outbox()
+
+        reminded_chat_ids = [call[1]["payload"]["chat_id"] for call in self.fake_bot_post.call_args_list]
+        self.assertEqual(reminded_chat_ids, [1])
+        self.assertIsNotNone(TelegramSettings.objects.get(chat_id=5).next_reminder_at)
+
+    def test_sharded_ticks(self):
+        """Test that every shard only handles its own chats and that leased shards together handle all chats."""
+        defaults = {"is_initialized": True, "reminder_window_start": time(8), "reminder_window_end": time(22)}
+        chat_ids = [1, 2, 3, -4, 5, 6]
+        for chat_id in chat_ids:
+            TelegramSettings.objects.create(chat_id=chat_id, next_reminder_at=time(11, 30), **defaults)
+
+        fake_datetime = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        with (
+            patch("apps.telegram.management.commands.startreminder.timezone.now", return_value=fake_datetime),
+            patch("apps.telegram.telegrambot.commands.reminder.timezone.now", return_value=fake_datetime),
+        ):
+            call_command("startreminder", shard=(1, 2), stdout=StringIO())
+            self.assertEqual(self._queued_chat_ids(), {1, 3, 5})
+            call_command("startreminder", lease_shards=True, stdout=StringIO())
+            self.assertEqual(self._queued_chat_ids(), set(chat_ids))
+        self.assertEqual(ShardLease.objects.filter(group="reminder").count(), 16)
+        self.assertFalse(ShardLease.objects.filter(group="reminder", owner="").exists())
+
+    def test_settings_updates_are_batched(self):
+        """Test that the updates of the settings are written with a query per chunk instead of per user."""
+        defaults = {"is_initialized": True, "reminder_window_start": time(8), "reminder_window_end": time(22)}
+        for chat_id in range(1, 11):
+            TelegramSettings.objects.create(chat_id=chat_id, next_reminder_at=time(11, 30), **defaults)
+
+        fake_datetime = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        statements = []
+
+        def record_statement(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with (
+            patch("apps.telegram.management.commands.startreminder.timezone.now", return_value=fake_datetime),
+            patch("apps.telegram.telegrambot.commands.reminder.timezone.now", return_value=fake_datetime),
+            connection.execute_wrapper(record_statement),
+        ):
+            call_command("startreminder", chunk_size=4, stdout=StringIO())
+
+        updates = [sql for sql in statements if sql.startswith('UPDATE "telegram_telegramsettings"')]
+        self.assertEqual(len(updates), 3)
+        # The selection, 3 per chunk (its savepoint, release and flush) and 9 per user: 3 savepoints with their
+        # release, the insert of the callback and the lookup and the insert of the outbox message
+        self.assertEqual(len(statements), 1 + 3 * 3 + 10 * 9)
+        self.assertEqual(self._queued_chat_ids(), set(range(1, 11)))
+        reminded = TelegramSettings.objects.filter(last_reminder_sent_at=fake_datetime.time(), data={})
+        self.assertEqual(reminded.count(), 10)
+
+    def test_failed_user_is_skipped(self):
+        """Test that an error only rolls back the reminder of its user, which is queued once by a later tick."""
+        self._create_due_settings()
+        with self._patch_now(), patch.object(TelegramManagementCommand, "handle_command", self._crash_on_chat_4()):
+            with self.assertLogs(level="ERROR") as logs:
+                call_command("startreminder", chunk_size=2, stdout=StringIO())
+            self.assertIn("Error starting the reminder for", logs.output[0])
+            self.assertEqual(self._queued_chat_ids(), {1, 2, 3, 5})
+            sent = TelegramSettings.objects.filter(last_reminder_sent_at__isnull=False)
+            self.assertEqual(set(sent.values_list("chat_id", flat=True)), {1, 2, 3, 5})
+
+        with self._patch_now():
+            call_command("startreminder", chunk_size=2, stdout=StringIO())
+        self.assertEqual(OutboxMessage.objects.count(), 5)
+        self.assertEqual(self._queued_chat_ids(), set(range(1, 6)))
+
+    def test_interrupted_chunk_is_rolled_back(self):
+        """Test that the reminders of an interrupted chunk are not queued nor marked as sent, and are queued later."""
+        self._create_due_settings()
+        crash = self._crash_on_chat_4(KeyboardInterrupt)
+        with self._patch_now():
+            with patch.object(TelegramManagementCommand, "handle_command", crash), self.assertRaises(KeyboardInterrupt):
+                call_command("startreminder", chunk_size=2, stdout=StringIO())
+            self.assertEqual(self._queued_chat_ids(), {1, 2})
+            sent = TelegramSettings.objects.filter(last_reminder_sent_at__isnull=False)
+            self.assertEqual(set(sent.values_list("chat_id", flat=True)), {1, 2})
+
+            call_command("startreminder", chunk_size=2, stdout=StringIO())
+        self.assertEqual(OutboxMessage.objects.count(), 5)
+        self.assertEqual(self._queued_chat_ids(), set(range(1, 6)))
+
+    @staticmethod
+    def _create_due_settings():
+        defaults = {"is_initialized": True, "reminder_window_start": time(8), "reminder_window_end": time(22)}
+        for chat_id in range(1, 6):
+            TelegramSettings.objects.create(chat_id=chat_id, next_reminder_at=time(11, 30), **defaults)
+
+    @staticmethod
+    @contextmanager
+    def _patch_now():
+        fake_datetime = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        with (
+            patch("apps.telegram.management.commands.startreminder.timezone.now", return_value=fake_datetime),
+            patch("apps.telegram.telegrambot.commands.reminder.timezone.now", return_value=fake_datetime),
+        ):
+            yield
+
+    @staticmethod
+    def _crash_on_chat_4(exception: type[BaseException] = RuntimeError):
+        handle_command = TelegramManagementCommand.handle_command
+
+        def crash_on_chat_4(command, telegram_settings, command_text):
+            # After the reminder is queued and marked as sent, which must be rolled back
+            handle_command(command, telegram_settings, command_text)
+            if telegram_settings.chat_id == 4:
+                raise exception("crash")
+
+        return crash_on_chat_4
+
+    @staticmethod
+    def _queued_chat_ids() -> set[int]:
+        return set(OutboxMessage.objects.values_list("chat_id", flat=True))
+
+
+class WriteBehindTests(TestCase):
+    """Write-behind buffer test case."""
+
+    def test_defer_and_flush(self):
+        """Test that updates are deferred until flushed, unless they save all fields or expressions."""
+        telegram_settings = TelegramSettings.objects.create(chat_id=1, consumed_today_ml=100)
+        updated_at = telegram_settings.updated_at
+        telegram_settings.write_behind = buffer = WriteBehindBuffer()
+        telegram_settings.next_overview_at = time(21)
+        telegram_settings.save(update_fields=["next_overview_at", "updated_at"])
+        self.assertIsNone(TelegramSettings.objects.get(pk=telegram_settings.pk).next_overview_at)
+        self.assertEqual(len(buffer), 1)
+
+        telegram_settings.consumed_today_ml = F("consumed_today_ml") + 250
+        telegram_settings.save(update_fields=["consumed_today_ml"])
+        self.assertEqual(TelegramSettings.objects.get(pk=telegram_settings.pk).consumed_today_ml, 350)
+
+        self.assertEqual(buffer.flush(), 1)
+        stored = TelegramSettings.objects.get(pk=telegram_settings.pk)
+        self.assertEqual(stored.next_overview_at, time(21))
+        self.assertGreater(stored.updated_at, updated_at)
+
+        telegram_settings.refresh_from_db()
+        telegram_settings.save(update_fields=["data"])
+        telegram_settings.save()
+        self.assertEqual(len(buffer), 0)
+
+
+class ShardingTests(TestCase):
+    """Sharding test case."""
+
+    def test_parse_shard(self):
+        """Test that shards are parsed from the i/N format and that invalid shards are rejected."""
+        self.assertEqual(sharding.parse_shard("1/4"), (1, 4))
+        for value in ("4/4", "-1/4", "0/0", "1", "a/b"):
+            with self.subTest(value=value), self.assertRaises(argparse.ArgumentTypeError):
+                sharding.parse_shard(value)
+
+    def test_in_shard_matches_get_shard(self):
+        """Test that the database selection of a shard matches the shard computed in python."""
+        chat_ids = [1, 2, 7, -3, -8, 123456789, -1001234567890]
+        TelegramSettings.objects.bulk_create(TelegramSettings(chat_id=chat_id) for chat_id in chat_ids)
+        for shard in range(3):
+            with self.subTest(shard=shard):
+                selected = TelegramSettings.objects.in_shard(shard, 3).values_list("chat_id", flat=True)
+                expected = [chat_id for chat_id in chat_ids if sharding.get_shard(chat_id, 3) == shard]
+                self.assertCountEqual(selected, expected)
+
+    def test_leases(self):
+        """Test that a shard is leased by one worker at a time and that expired leases are taken over."""
+        lease = timedelta(seconds=50)
+        now = timezone.now()
+        claims = [ShardLease.objects.claim("test", 2, owner, lease, now=now) for owner in ("a", "b", "c")]
+        self.assertEqual(claims, [0, 1, None])
+        self.assertTrue(ShardLease.objects.renew("test", 0, "a", lease, now=now + timedelta(seconds=20)))
+
+        later = now + timedelta(seconds=60)
+        self.assertEqual(ShardLease.objects.claim("test", 2, "c", lease, now=later), 1)
+        self.assertIsNone(ShardLease.objects.claim("test", 2, "d", lease, now=later))
+        self.assertFalse(ShardLease.objects.renew("test", 1, "b", lease, now=later))
+
+    def test_leaser_claims_every_shard_once(self):
+        """Test that a leaser claims the free shards until every shard is leased."""
+        leaser = sharding.ShardLeaser("test", count=4)
+        self.assertEqual(sorted(leaser), [0, 1, 2, 3])
+        self.assertEqual(list(sharding.ShardLeaser("test", count=4)), [])
+
+
+class DueQueueTests(SimpleTestCase):
+    """DueQueue test case."""
+
+    def test_pop_due_in_order_and_skip_rescheduled(self):
+        """Test that due keys are popped earliest first and that rescheduled or discarded keys are not popped."""
+        now = datetime(2025, 1, 1, 12, tzinfo=UTC)
+        queue = DueQueue()
+        queue.schedule("a", now + timedelta(seconds=2))
+        queue.schedule("b", now + timedelta(seconds=1))
+        queue.schedule("c", now + timedelta(seconds=3))
+        queue.schedule("a", now + timedelta(hours=1))
+        queue.discard("c")
+        self.assertEqual(queue.next_due(), now + timedelta(seconds=1))
+        self.assertEqual(queue.pop_due(now + timedelta(seconds=5)), ["b"])
+        self.assertEqual(queue.next_due(), now + timedelta(hours=1))
+        self.assertEqual(len(queue), 1)
+
+
+class SchedulerTests(OutboxTelegramBotTestCase):
+    """Scheduler test case."""
+
+    def test_run_pending(self):
+        """Test that due reminders are started and that future reminders are queued at their instant."""
+        defaults = {"is_initialized": True, "reminder_window_start": time(8), "reminder_window_end": time(22)}
+        TelegramSettings.objects.create(chat_id=1, next_reminder_at=time(11, 30), **defaults)
+        TelegramSettings.objects.create(chat_id=2, next_reminder_at=time(13), next_overview_at=time(22), **defaults)
+        now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+
+        scheduler = Scheduler()
+        scheduler.load(now)
+        self.assertEqual(scheduler.queue.get((REMINDER, 1)), now)
+        self.assertEqual(scheduler.queue.get((REMINDER, 2)), now.replace(hour=13))
+        self.assertEqual(scheduler.queue.get((OVERVIEW, 2)), now.replace(hour=22))
+
+        with patch("apps.telegram.telegrambot.commands.reminder.timezone.now", return_value=now):
+            self.assertEqual(scheduler.run_pending(now), 1)
+        self.deliver_outbox()
+        self.assertEqual(self.fake_bot_post.call_args[1]["payload"]["chat_id"], 1)
+        self.assertNotIn((REMINDER, 1), scheduler.queue)
+
+        TelegramSettings.objects.filter(chat_id=2).update(next_reminder_at=time(14), updated_at=timezone.now())
+        scheduler.poll_changes(now)
+        self.assertEqual(scheduler.queue.get((REMINDER, 2)), now.replace(hour=14))
+
+
+class DeliveryPoolTests(SimpleTestCase):
+    """DeliveryPool test case."""
+
+    def setUp(self):
+        """Start a stub telegram server and point the bot to it."""
+        self.server = StubTelegramServer(rate_limited=2)
+        self.addCleanup(self.server.stop)
+        patcher = patch("django_telegram_app.bot.bot._construct_endpoint", lambda name: f"{self.server.url}/{name}")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_pooled_delivery(self):
+        """Test that all messages are delivered, in order per chat, and that a 429 is retried."""
+        pool = delivery.DeliveryPool(workers=4, global_rate=1000, per_chat_rate=1000)
+        for index in range(30):
+            pool.submit(f"message {index // 10}", index % 10)
+        pool.close()
+        self.assertEqual(pool.report.sent, 30)
+        self.assertEqual(pool.report.failed, 0)
+        self.assertGreater(pool.report.throughput, 0)
+        for chat_id in range(10):
+            texts = [payload["text"] for payload in self.server.payloads if payload["chat_id"] == chat_id]
+            self.assertEqual(texts, ["message 0", "message 1", "message 2"])
+
+    def test_per_chat_rate_limit(self):
+        """Test that messages to the same chat are spaced according to the per chat rate."""
+        start = time_module.perf_counter()
+        pool = delivery.DeliveryPool(workers=2, global_rate=1000, per_chat_rate=20)
+        for _ in range(5):
+            pool.submit("hi", 1)
+        pool.close()
+        self.assertEqual(pool.report.sent, 5)
+        self.assertGreaterEqual(time_module.perf_counter() - start, 4 / 20)
+
+
+class TokenBucketTests(SimpleTestCase):
+    """TokenBucket test case."""
+
+    def test_try_acquire(self):
+        """Test that tokens are refilled at the configured rate, up to the capacity."""
+        now = [0.0]
+        bucket = delivery.TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(bucket.try_acquire(), 0.5)
+        now[0] = 10.0
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertGreater(bucket.try_acquire(), 0)
+
+
+class ResetReminderStateCommandTests(TestCase):
+    """Resetreminderstate management command test case."""
+
+    def test_reset_at_local_midnight(self):
+        """Test that only the users that passed their local midnight are reset, in a single statement per date."""
+        defaults = {
+            "is_initialized": True,
+            "consumed_today_ml": 1500,
+            "reminder_window_start": time(7),
+            "reminder_window_end": time(21),
+            "next_reminder_at": time(18),
+            "last_reminder_sent_at": time(17),
+            "rolled_over_on": date(2025, 1, 10),
+        }
+        TelegramSettings.objects.create(chat_id=1, timezone="Asia/Tokyo", **defaults)
+        TelegramSettings.objects.create(chat_id=2, timezone="Europe/Brussels", **defaults)
+        TelegramSettings.objects.create(chat_id=3, timezone="Asia/Tokyo", **{**defaults, "rolled_over_on": None})
+
+        # 01:00 on the 11th in Tokyo, 17:00 on the 10th in Brussels
+        fake_datetime = datetime(2025, 1, 10, 16, tzinfo=UTC)
+        with (
+            patch("apps.telegram.rollover.timezone.now", return_value=fake_datetime),
+            # exists, distinct timezones and for each of the two local dates: the rolled over date of new users, and in
+            # a savepoint the missing statistics rows (insert only when missing), the statistics rollup and the reset,
+            # and the pruning of the abandoned conversation states
+            self.assertNumQueries(16),
+        ):
+            call_command("resetreminderstate", stdout=StringIO())
+
+        tokyo = TelegramSettings.objects.get(chat_id=1)
+        self.assertEqual(tokyo.consumed_today_ml, 0)
+        self.assertEqual(tokyo.next_reminder_at, time(7))
+        self.assertEqual(tokyo.next_overview_at, time(21))
+        self.assertIsNone(tokyo.last_reminder_sent_at)
+        self.assertEqual(tokyo.rolled_over_on, date(2025, 1, 11))
+        self.assertEqual(tokyo.updated_at, fake_datetime)
+        brussels = TelegramSettings.objects.get(chat_id=2)
+        self.assertEqual(brussels.consumed_today_ml, 1500)
+        self.assertEqual(brussels.rolled_over_on, date(2025, 1, 10))
+        new_user = TelegramSettings.objects.get(chat_id=3)
+        self.assertEqual(new_user.consumed_today_ml, 1500)
+        self.assertEqual(new_user.rolled_over_on, date(2025, 1, 11))
+
+
+class ReminderPlanTests(OutboxTelegramBotTestCase):
+    """Reminder plan test case."""
+
+    def setUp(self):
+        """Create initialized settings with a planned day."""
+        super().setUp()
+        self.telegram_settings = TelegramSettings.objects.create(
+            chat_id=123456789,
+            timezone="UTC",
+            daily_goal_ml=2000,
+            consumption_size_ml=250,
+            reminder_window_start=time(8),
+            reminder_window_end=time(22),
+            minimum_interval_seconds=1800,
+            is_initialized=True,
+        )
+        self.telegram_settings.plan_reminders(datetime(2025, 1, 10, 7, tzinfo=UTC))
+        self.telegram_settings.save(update_fields=TelegramSettings.PLAN_FIELDS)
+
+    def test_plan_follows_the_schedule(self):
+        """Test that every planned reminder is the next reminder after answering the previous one."""
+        plan = self.telegram_settings.get_reminder_plan()
+        self.assertEqual(plan, [time(8), *(time(hour) for hour in range(10, 23, 2))])
+        self.assertEqual(self.telegram_settings.next_reminder_at, time(8))
+        self.assertEqual(self.telegram_settings.get_reminder_plan(), plan)
+        self.assertEqual(self.telegram_settings.daily_reminder_plan, self.telegram_settings.reminder_plan)
+
+        schedule = self.telegram_settings.hydration_schedule
+        for reminder, next_reminder in zip(plan, plan[1:], strict=False):
+            schedule.consumed_ml += schedule.consumption_size_ml
+            self.assertEqual(schedule.compute_next_reminder(reminder), next_reminder)
+
+    def test_consumption_advances_or_replans(self):
+        """Test that a consumption that follows the plan pops the next reminder and any other consumption replans."""
+        self.telegram_settings.log_consumption(
+            250, ConsumptionEvent.Source.REMINDER, datetime(2025, 1, 10, 8, 5, tzinfo=UTC)
+        )
+        self.assertEqual(self.telegram_settings.next_reminder_at, time(10))
+        self.assertEqual(len(self.telegram_settings.reminder_plan), 7)
+
+        self.telegram_settings.log_consumption(
+            500, ConsumptionEvent.Source.HYDRATE, datetime(2025, 1, 10, 9, tzinfo=UTC)
+        )
+        self.telegram_settings.refresh_from_db()
+        expected = self.telegram_settings.hydration_schedule.plan_reminders(time(9))
+        self.assertEqual(self.telegram_settings.get_reminder_plan(), expected)
+        self.assertEqual(self.telegram_settings.next_reminder_at, expected[0])
+
+        self.telegram_settings.log_consumption(
+            1250, ConsumptionEvent.Source.HYDRATE, datetime(2025, 1, 10, 9, tzinfo=UTC)
+        )
+        self.assertEqual(self.telegram_settings.reminder_plan, [])
+        self.assertEqual(self.telegram_settings.next_reminder_at, time(8))
+
+    def test_late_consumption_replans(self):
+        """Test that a consumption logged well after the next reminder replans instead of popping the next reminder."""
+        late = datetime(2025, 1, 10, 9, tzinfo=UTC)
+        self.telegram_settings.log_consumption(250, ConsumptionEvent.Source.REMINDER, late)
+        self.telegram_settings.refresh_from_db()
+        expected = self.telegram_settings.hydration_schedule.plan_reminders(late.time())
+        self.assertEqual(self.telegram_settings.get_reminder_plan(), expected)
+        self.assertGreater(self.telegram_settings.next_reminder_at, time(10))
+
+    def test_rollover_copies_the_daily_plan(self):
+        """Test that the plan of a new day is the daily plan."""
+        self.telegram_settings.log_consumption(
+            750, ConsumptionEvent.Source.HYDRATE, datetime(2025, 1, 10, 9, tzinfo=UTC)
+        )
+        TelegramSettings.objects.filter(pk=self.telegram_settings.pk).update(rolled_over_on=date(2025, 1, 10))
+        with patch("apps.telegram.rollover.timezone.now", return_value=datetime(2025, 1, 11, 0, 5, tzinfo=UTC)):
+            call_command("resetreminderstate", stdout=StringIO())
+
+        self.telegram_settings.refresh_from_db()
+        self.assertEqual(self.telegram_settings.reminder_plan, self.telegram_settings.daily_reminder_plan)
+        self.assertEqual(self.telegram_settings.next_reminder_at, time(8))
+
+    def test_planned_between(self):
+        """Test that the settings are selected by their next planned reminder, also across midnight."""
+        TelegramSettings.objects.create(chat_id=2, is_initialized=True, next_reminder_at=time(23, 58))
+        TelegramSettings.objects.create(chat_id=3, is_initialized=False, next_reminder_at=time(8))
+
+        def planned(start: time, end: time) -> set[int]:
+            return set(TelegramSettings.objects.planned_between(start, end).values_list("chat_id", flat=True))
+
+        self.assertEqual(planned(time(7, 55), time(8)), {123456789})
+        self.assertEqual(planned(time(23, 55), time(0, 5)), {2})
+        self.assertEqual(planned(time(8, 1), time(23, 55)), set())
+
+    def test_overview_shows_the_plan(self):
+        """Test that the overview lists the planned reminders in the user's timezone."""
+        TelegramSettings.objects.filter(pk=self.telegram_settings.pk).update(timezone="Asia/Tokyo")
+        self.send_text("/overview")
+        self.assertIn("Planned reminders for today: 17:00, 19:00, 21:00, 23:00", self.last_bot_message)
+
+
+class StatsCommandTests(OutboxTelegramBotTestCase):
+    """Stats command and consumption statistics test case."""
+
+    def setUp(self):
+        """Create initialized settings that were rolled over on the 10th of January."""
+        super().setUp()
+        self.telegram_settings = TelegramSettings.objects.create(
+            chat_id=123456789,
+            timezone="UTC",
+            daily_goal_ml=2000,
+            is_initialized=True,
+            rolled_over_on=date(2025, 1, 10),
+        )
+
+    def test_roll_up(self):
+        """Test that the rollover closes the day in the rolling sums and the streak of the statistics."""
+        # Goal met on the 3 days before the 10th, 1000ml on the days before and nothing on the 2nd of January
+        self._create_history(date(2025, 1, 9), 40, goal_days=3, skip=[date(2025, 1, 2)])
+        self._roll_over_to(date(2025, 1, 11))
+
+        stats = ConsumptionStats.objects.get(telegram_settings=self.telegram_settings)
+        self.assertEqual(stats.through_date, date(2025, 1, 10))
+        self.assertEqual(stats.tracked_days, 1)
+        self.assertEqual((stats.week_consumed_ml, stats.week_goal_days), (3 * 2000 + 3 * 1000, 3))
+        self.assertEqual((stats.month_consumed_ml, stats.month_goal_days), (3 * 2000 + 25 * 1000, 3))
+        # The 10th itself was not logged
+        self.assertEqual(stats.streak_days, 0)
+
+        for day in (11, 12):
+            DailyTotal.objects.create(
+                telegram_settings=self.telegram_settings, date=date(2025, 1, day), consumed_ml=2500, goal_ml=2000
+            )
+            self._roll_over_to(date(2025, 1, day + 1))
+        self._roll_over_to(date(2025, 1, 13))
+        stats.refresh_from_db()
+        self.assertEqual((stats.through_date, stats.tracked_days, stats.streak_days), (date(2025, 1, 12), 3, 2))
+        self.assertEqual(stats.get_current_streak(date(2025, 1, 13), goal_met_today=True), 3)
+        self.assertEqual(stats.get_current_streak(date(2025, 1, 14), goal_met_today=False), 0)
+
+    def test_stats_command(self):
+        """Test that the statistics are shown with a constant number of queries, however long the history is."""
+        self.send_text("/stats")
+        self.assertIn("Come back tomorrow", self.last_bot_message)
+
+        self._create_history(date(2025, 1, 9), 5, goal_days=2)
+        ConsumptionStats.objects.create(telegram_settings=self.telegram_settings, tracked_since=date(2025, 1, 5))
+        self._roll_over_to(date(2025, 1, 10))
+        short_history_queries = self._count_stats_queries()
+        self.assertIn(
+            "Last 7 days: 1400ml per day on average, goal reached on 2 of 5 days (40%).", self.last_bot_message
+        )
+        self.assertIn("Current streak: 1 day(s).", self.last_bot_message)
+
+        DailyTotal.objects.all().delete()
+        self._create_history(date(2025, 1, 9), 400, goal_days=2)
+        ConsumptionStats.objects.update(tracked_since=date(2024, 1, 1), through_date=None)
+        self._roll_over_to(date(2025, 1, 10))
+        self.assertEqual(self._count_stats_queries(), short_history_queries)
+        self.assertIn(
+            "Last 30 days: 1067ml per day on average, goal reached on 2 of 30 days (7%).", self.last_bot_message
+        )
+
+    def _create_history(self, last_date: date, days: int, goal_days: int, skip: list[date] | None = None):
+        """Create the daily totals of the given number of days up to the last date, meeting the goal on the last days."""
+        DailyTotal.objects.bulk_create(
+            DailyTotal(
+                telegram_settings=self.telegram_settings,
+                date=last_date - timedelta(days=index),
+                consumed_ml=2000 if index < goal_days else 1000,
+                goal_ml=2000,
+            )
+            for index in range(days)
+            if last_date - timedelta(days=index) not in (skip or [])
+        )
+
+    def _roll_over_to(self, local_date: date):
+        """Roll over the settings from the day before to the given date."""
+        TelegramSettings.objects.filter(pk=self.telegram_settings.pk).update(
+            rolled_over_on=local_date - timedelta(days=1)
+        )
+        with patch("apps.telegram.rollover.timezone.now", return_value=datetime.combine(local_date, time(0, 5), UTC)):
+            roll_over()
+        self.telegram_settings.refresh_from_db()
+
+    def _count_stats_queries(self) -> int:
+        """Send /stats on the 10th of January and return the number of queries it took."""
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        fake_datetime = datetime(2025, 1, 10, 12, tzinfo=UTC)
+        with (
+            patch("apps.telegram.models.timezone.now", return_value=fake_datetime),
+            connection.execute_wrapper(count_query),
+        ):
+            self.send_text("/stats")
+        return queries
+
+
+class ExportTests(TestCase):
+    """Consumption history and message log export test case."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Log consumptions for two chats and a few telegram updates."""
+        cls.alice, cls.bob = (
+            TelegramSettings.objects.create(chat_id=chat_id, timezone="UTC", is_initialized=True) for chat_id in (1, 2)
+        )
+        for amount_ml in (250, 300, 350):
+            cls.alice.log_consumption(amount_ml, ConsumptionEvent.Source.HYDRATE)
+        cls.bob.log_consumption(500, ConsumptionEvent.Source.REMINDER)
+        Message.objects.create(raw_message={"update_id": 1, "message": {"chat": {"id": 1}, "text": "/hydrate"}})
+        Message.objects.create(raw_message={"update_id": 2, "callback_query": {"message": {"chat": {"id": 2}}}})
+        Message.objects.create(raw_message={"update_id": 3, "message": {"chat": {"id": 1}, "text": "300"}})
+
+    def test_pages(self):
+        """Test that the rows are read in pages, with a query per page."""
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            rows = list(export.consumption_rows(page_size=2))
+        self.assertEqual([row["amount_ml"] for row in rows], [250, 300, 350, 500])
+        self.assertEqual([row["chat_id"] for row in rows], [1, 1, 1, 2])
+        self.assertEqual(queries, 3)
+        messages = export.message_rows([1], page_size=1)
+        self.assertEqual([message["raw_message"]["update_id"] for message in messages], [1, 3])
+
+    def test_export_command(self):
+        """Test that the command writes CSV and gzip-compressed NDJSON files."""
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = Path(directory) / "consumption.csv"
+            call_command("exporthistory", "consumption", format="csv", chat_ids=[1], output=csv_path, stdout=StringIO())
+            with csv_path.open(newline="") as file:
+                rows = list(csv.DictReader(file))
+            ndjson_path = Path(directory) / "messages.ndjson.gz"
+            call_command("exporthistory", "messages", gzip=True, output=ndjson_path, stdout=StringIO())
+            with gzip.open(ndjson_path, "rt") as file:
+                messages = [json.loads(line) for line in file]
+
+        self.assertEqual([row["amount_ml"] for row in rows], ["250", "300", "350"])
+        self.assertEqual(list(rows[0]), ["id", "amount_ml", "source", "local_date", "created_at", "chat_id"])
+        self.assertEqual([message["raw_message"]["update_id"] for message in messages], [1, 2, 3])
+
+    def test_admin_action(self):
+        """Test that the admin action streams the history of the selected users."""
+        client = Client()
+        client.force_login(User.objects.create_superuser(username="admin", password="admin"))
+        response = client.post(
+            reverse("admin:telegram_telegramsettings_changelist"),
+            {"action": "export_consumption_ndjson", "_selected_action": [self.bob.pk]},
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        rows = [json.loads(line) for line in gzip.decompress(b"".join(response.streaming_content)).splitlines()]
+        self.assertEqual([(row["chat_id"], row["amount_ml"], row["source"]) for row in rows], [(2, 500, "reminder")])
+
+    async def test_admin_action_over_asgi(self):
+        """Test that the admin action streams an asynchronous iterator when it is served over ASGI."""
+        client = AsyncClient()
+        await client.aforce_login(await User.objects.acreate(username="admin", is_staff=True, is_superuser=True))
+        response = await client.post(
+            reverse("admin:telegram_telegramsettings_changelist"),
+            {"action": "export_consumption_csv", "_selected_action": [self.alice.pk]},
+        )
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        rows = list(csv.DictReader(gzip.decompress(content).decode().splitlines()))
+        self.assertEqual([row["amount_ml"] for row in rows], ["250", "300", "350"])
+
+
+class FleetDashboardTests(TestCase):
+    """Admin fleet dashboard test case."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Create users in two timezones, with various progress towards their goal."""
+        defaults = {"is_initialized": True, "daily_goal_ml": 2000}
+        for chat_id, consumed_today_ml, next_reminder_at in (
+            (1, 0, time(12, 30)),
+            (2, 400, time(13, 30)),
+            (3, 1000, time(12, 59)),
+            (4, 1600, time(11, 59)),
+            (5, 2000, None),
+        ):
+            TelegramSettings.objects.create(
+                chat_id=chat_id,
+                timezone="Europe/Brussels",
+                consumed_today_ml=consumed_today_ml,
+                next_reminder_at=next_reminder_at,
+                **defaults,
+            )
+        TelegramSettings.objects.create(chat_id=6, timezone="UTC", consumed_today_ml=2500, **defaults)
+        TelegramSettings.objects.create(chat_id=7, timezone="UTC", next_reminder_at=time(12, 30))
+
+    def setUp(self):
+        """Start every test with an empty cache."""
+        cache.delete(dashboard.CACHE_KEY)
+
+    def count_queries(self, func):
+        """Call func and return its result and the number of executed queries."""
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            result = func()
+        return result, queries
+
+    def test_compute_fleet_stats(self):
+        """Test that the statistics are aggregated in three queries."""
+        stats, queries = self.count_queries(lambda: dashboard.compute_fleet_stats(datetime(2025, 1, 1, 12, tzinfo=UTC)))
+        self.assertEqual(queries, 3)
+        self.assertEqual((stats.users, stats.initialized, stats.due_within_hour), (7, 6, 2))
+        self.assertEqual([users for _name, users in stats.goal_attainment], [1, 1, 0, 1, 1, 2])
+        self.assertEqual(stats.timezones, [("Europe/Brussels", 5, 5), ("UTC", 2, 1)])
+        self.assertEqual([row[2] for row in stats.get_goal_attainment_rows()], [17, 17, 0, 17, 17, 33])
+
+    def test_due_within_hour_wraps_around_midnight(self):
+        """Test that the users due in the next hour are counted across midnight."""
+        TelegramSettings.objects.filter(chat_id=1).update(next_reminder_at=time(0, 10))
+        stats = dashboard.compute_fleet_stats(datetime(2025, 1, 1, 23, 30, tzinfo=UTC))
+        self.assertEqual(stats.due_within_hour, 1)
+
+    def test_stats_are_cached(self):
+        """Test that the statistics are computed once per cache period."""
+        stats = dashboard.get_fleet_stats()
+        TelegramSettings.objects.create(chat_id=8)
+        cached, queries = self.count_queries(dashboard.get_fleet_stats)
+        self.assertEqual((cached.users, queries), (stats.users, 0))
+        cache.delete(dashboard.CACHE_KEY)
+        self.assertEqual(dashboard.get_fleet_stats().users, stats.users + 1)
+
+    def test_cached_stats_are_language_neutral(self):
+        """Test that the buckets are cached by name and labelled in the language of the request that renders them."""
+        stats = dashboard.get_fleet_stats()
+        self.assertEqual(
+            [name for name, _users in stats.goal_attainment], [name for name, *_ in dashboard.GOAL_BUCKETS]
+        )
+        with patch.object(
+            dashboard, "GOAL_BUCKETS", [(name, f"label {name}", q) for name, _, q in dashboard.GOAL_BUCKETS]
+        ):
+            labels = [label for label, _users, _percentage in dashboard.get_fleet_stats().get_goal_attainment_rows()]
+        self.assertEqual(labels[0], "label nothing")
+
+    def test_dashboard_view(self):
+        """Test that the dashboard is linked from the change list and requires staff access."""
+        client = Client()
+        url = reverse("admin:telegram_telegramsettings_dashboard")
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(User.objects.create_superuser(username="admin", password="admin"))
+        self.assertContains(client.get(reverse("admin:telegram_telegramsettings_changelist")), url)
+        response = client.get(url)
+        self.assertContains(response, "Europe/Brussels")
+        self.assertEqual(response.context["stats"].initialized, 6)
+
+
+class MessageArchiveTests(TestCase):
+    """Message log retention test case."""
+
+    def setUp(self):
+        """Log updates of three days, in a temporary archive directory."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive = archive.MessageArchive(Path(directory.name))
+        self.messages = [
+            self._create_message({"message": {"date": self._timestamp(1, 8), "text": "/start"}}),
+            self._create_message({"my_chat_member": {}}),
+            self._create_message({"callback_query": {"message": {"date": self._timestamp(1, 8)}}}),
+            self._create_message({"message": {"date": self._timestamp(2, 9), "text": "/hydrate"}}),
+            # A button of an old message is archived with the updates around it
+            self._create_message({"callback_query": {"message": {"date": self._timestamp(1, 8)}}}),
+            self._create_message(
+                {"edited_message": {"date": self._timestamp(2, 9), "edit_date": self._timestamp(2, 10)}}
+            ),
+            self._create_message({"message": {"date": self._timestamp(3, 7), "text": "/overview"}}),
+        ]
+
+    @staticmethod
+    def _timestamp(day: int, hour: int) -> int:
+        return int(datetime(2025, 1, day, hour, tzinfo=UTC).timestamp())
+
+    @staticmethod
+    def _create_message(raw_message: dict) -> Message:
+        return Message.objects.create(raw_message={"update_id": Message.objects.count() + 1, **raw_message})
+
+    def test_get_update_date(self):
+        """Test that the date of an update is read from the keys of its kind."""
+        self.assertEqual(archive.get_update_date(self.messages[5].raw_message), date(2025, 1, 2))
+        self.assertEqual(archive.get_update_date(self.messages[2].raw_message), date(2025, 1, 1))
+        self.assertIsNone(archive.get_update_date(self.messages[1].raw_message))
+
+    def test_compact_messages(self):
+        """Test that the updates before the date are archived per day and deleted."""
+        result = archive.compact_messages(self.archive, date(2025, 1, 3), block_size=2)
+
+        self.assertEqual((result.archived, result.deleted), (6, 6))
+        self.assertEqual(result.days, [date(2025, 1, 1), date(2025, 1, 2)])
+        self.assertEqual(list(Message.objects.values_list("pk", flat=True)), [self.messages[6].pk])
+        self.assertEqual(self.archive.get_days(), result.days)
+        first_day, second_day = (list(self.archive.iter_rows(day)) for day in result.days)
+        self.assertEqual([row["raw_message"]["update_id"] for row in first_day], [1, 2, 3])
+        self.assertEqual([row["raw_message"]["update_id"] for row in second_day], [4, 5, 6])
+        self.assertEqual(len(list(self.archive.iter_blocks(date(2025, 1, 1)))), 2)
+        with gzip.open(self.archive.get_segment_path(date(2025, 1, 2)), "rt") as segment:
+            self.assertEqual(len(segment.readlines()), 3)
+
+        self.assertEqual(self.archive.find(self.messages[4].pk)["raw_message"], self.messages[4].raw_message)
+        self.assertIsNone(self.archive.find(self.messages[6].pk))
+
+        result = archive.compact_messages(self.archive, date(2025, 1, 3), block_size=2)
+        self.assertEqual((result.archived, result.deleted), (0, 0))
+
+    def test_interrupted_compaction(self):
+        """Test that updates archived by an interrupted run are deleted without archiving them twice."""
+        rows = [{"id": message.pk, "raw_message": message.raw_message, "error": None} for message in self.messages[:2]]
+        self.archive.write_block(date(2025, 1, 1), rows)
+        with self.archive.get_segment_path(date(2025, 1, 1)).open("ab") as segment:
+            segment.write(b"incomplete block")
+
+        result = archive.compact_messages(self.archive, date(2025, 1, 2))
+
+        self.assertEqual((result.archived, result.deleted), (1, 3))
+        rows = list(self.archive.iter_rows(date(2025, 1, 1)))
+        self.assertEqual([row["id"] for row in rows], [message.pk for message in self.messages[:3]])
+
+
+class CompactMessagesCommandTests(TransactionTestCase):
+    """Compact messages command test case."""
+
+    def test_command(self):
+        """Test that the command archives the updates older than the retention window and vacuums the database."""
+        old = int((timezone.now() - timedelta(days=10)).timestamp())
+        Message.objects.bulk_create(
+            Message(raw_message={"update_id": index, "message": {"date": old, "text": "x" * 1000}})
+            for index in range(500)
+        )
+        Message.objects.create(raw_message={"update_id": 500, "message": {"date": int(timezone.now().timestamp())}})
+        stdout = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            call_command("compactmessages", retention_days=7, directory=Path(directory), stdout=stdout)
+            self.assertEqual(len(list(Path(directory).glob("*.ndjson.gz"))), 1)
+
+        self.assertIn("Archived 500 updates of 1 day(s)", stdout.getvalue())
+        self.assertEqual(Message.objects.get().raw_message["update_id"], 500)
+        self.assertIn("Freed", stdout.getvalue())
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA freelist_count")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_retention_must_be_positive(self):
+        """Test that a retention of less than a day is refused."""
+        with self.assertRaises(CommandError):
+            call_command("compactmessages", retention_days=0, stdout=StringIO())
+
+
+class ConversationStateTests(OutboxTelegramBotTestCase):
+    """Server-side conversation state test case."""
+
+    def get_button_callback(self, index: int) -> CallbackData:
+        """Return the callback of a button of the last bot message."""
+        inline_keyboard = self.fake_bot_post.call_args[1]["payload"]["reply_markup"]["inline_keyboard"]
+        token = [button for row in inline_keyboard for button in row][index]["callback_data"]
+        return CallbackData.objects.get(token=token)
+
+    def test_callbacks_refer_to_the_collected_answers(self):
+        """Test that the buttons only hold a token of the answers, which are deleted when the command finishes."""
+        self.send_text("/start")
+        for answer in ("utc", "2500", "09:00", "21:00", "300", "60"):
+            self.send_text(answer)
+
+        callback = self.get_button_callback(0)
+        self.assertEqual(set(callback.data), {"correlation_key", conversations.STATE_KEY, "reminder_text"})
+        self.assertEqual(len(callback.data[conversations.STATE_KEY]), 16)
+        state = ConversationState.objects.get(token=callback.data[conversations.STATE_KEY])
+        self.assertEqual(state.correlation_key, callback.data["correlation_key"])
+        self.assertEqual(state.data["daily_goal_ml"], "2500")
+        self.assertEqual(state.data["minimum_interval_seconds"], "60")
+
+        self.click_on_button(0)
+        self.assertIn("Are these settings correct?", self.last_bot_message)
+        confirm, cancel = self.get_button_callback(0), self.get_button_callback(1)
+        self.assertEqual(confirm.data[conversations.STATE_KEY], cancel.data[conversations.STATE_KEY])
+        self.click_on_button("✅ Yes")
+        self.assertEqual(TelegramSettings.objects.get().daily_goal_ml, 2500)
+        self.assertFalse(ConversationState.objects.exists())
+
+    def test_reused_button(self):
+        """Test that a button that is used again continues with the answers it was created with."""
+        self.send_text("/start")
+        self.click_on_button("Europe")
+        callback_data = str(self.get_button_callback(0).token)
+        self.click_on_button(0)
+        self.send_text("2500")
+        self.post_data(self.construct_telegram_callback_query(callback_data))
+        self.assertTrue(self.last_bot_message.startswith("Please provide your daily goal (ml)."))
+        self.send_text("2000")
+        self.assertTrue(self.last_bot_message.startswith("Please provide your first reminder."))
+
+    def test_store(self):
+        """Test that equal answers are stored once and that snapshots are read through the cache."""
+        telegram_settings = TelegramSettings.objects.create(chat_id=1)
+        store = conversations.ConversationStore(maxsize=1)
+        token = store.save(telegram_settings, "key", {"reminder_window_start": time(9), "daily_goal_ml": "2500"})
+        self.assertEqual(
+            store.save(telegram_settings, "key", {"daily_goal_ml": "2500", "reminder_window_start": time(9)}), token
+        )
+        self.assertNotEqual(store.save(telegram_settings, "other key", {"daily_goal_ml": "2500"}), token)
+        self.assertEqual(ConversationState.objects.count(), 2)
+
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            data = store.load(token)
+            self.assertEqual(queries, 1)
+            data.pop("daily_goal_ml")
+            self.assertEqual(store.load(token)["daily_goal_ml"], "2500")
+        self.assertEqual(queries, 1)
+        self.assertEqual(data, {"reminder_window_start": "09:00:00"})
+
+        store.delete("key")
+        self.assertEqual(store.load(token), {})
+
+    def test_saved_again_after_delete(self):
+        """Test that answers that are saved again after their run was deleted are stored again."""
+        telegram_settings = TelegramSettings.objects.create(chat_id=1)
+        store = conversations.ConversationStore()
+        token = store.save(telegram_settings, "key", {"daily_goal_ml": "2500"})
+        conversations.ConversationStore().delete("key")  # E.g. by another process
+        self.assertEqual(store.save(telegram_settings, "key", {"daily_goal_ml": "2500"}), token)
+        store.clear_cache()
+        self.assertEqual(store.load(token), {"daily_goal_ml": "2500"})
+
+    def test_prune(self):
+        """Test that resetreminderstate prunes the snapshots of abandoned conversations."""
+        telegram_settings = TelegramSettings.objects.create(chat_id=1)
+        old_token = conversations.store.save(telegram_settings, "old key", {"daily_goal_ml": "2500"})
+        new_token = conversations.store.save(telegram_settings, "new key", {"daily_goal_ml": "2000"})
+        ConversationState.objects.filter(token=old_token).update(
+            created_at=timezone.now() - conversations.RETENTION - timedelta(minutes=1)
+        )
+        call_command("resetreminderstate", stdout=StringIO())
+        self.assertQuerySetEqual(ConversationState.objects.values_list("token", flat=True), [new_token])
+
+
+class LanguageCodeTests(OutboxTelegramBotTestCase):
+    """Language code cache test case."""
+
+    def test_language_code_is_remembered_and_used_by_ticks(self):
+        """Test that the language code of incoming updates is stored and used for the scheduled overview."""
+        TelegramSettings.objects.create(chat_id=123456789, is_initialized=True, next_overview_at=time(0))
+        update = self.construct_telegram_update("/overview")
+        update["message"]["from"] = {"id": 123456789, "language_code": "nl"}
+        self.post_data(update)
+        telegram_settings = TelegramSettings.objects.get(chat_id=123456789)
+        self.assertEqual(telegram_settings.language_code, "nl")
+
+        with patch("django_telegram_app.bot.bot.handle_update") as fake_handle_update:
+            call_command("startoverview", stdout=StringIO())
+        update = fake_handle_update.call_args[1]["update"]
+        self.assertEqual(update["message"]["from"]["language_code"], "nl")
+
+
+class TimezoneConversionTests(SimpleTestCase):
+    """Timezone conversion test case."""
+
+    zone_names = ["Europe/Brussels", "America/New_York", "Asia/Kolkata", "Australia/Lord_Howe", "Pacific/Auckland"]
+    # A regular day and the DST transition days of the zones above
+    days = [
+        date(2025, 1, 15),
+        date(2025, 3, 9),
+        date(2025, 3, 30),
+        date(2025, 4, 6),
+        date(2025, 9, 28),
+        date(2025, 10, 26),
+        date(2025, 11, 2),
+    ]
+
+    def test_matches_zoneinfo(self):
+        """Test that the cached conversions give the same results as a plain zoneinfo conversion."""
+        times = [time(hour, minute, 30, 1234) for hour in range(24) for minute in range(0, 60, 5)]
+        for day in self.days:
+            for hour in (0, 12, 23):
+                now = datetime.combine(day, time(hour), tzinfo=UTC)
+                for zone_name in self.zone_names:
+                    with self.subTest(zone=zone_name, now=now):
+                        items = [(time_obj, zone_name) for time_obj in times]
+                        expected_from_utc = [self._convert(time_obj, "UTC", zone_name, now) for time_obj in times]
+                        expected_to_utc = [self._convert(time_obj, zone_name, "UTC", now) for time_obj in times]
+                        self.assertEqual(timezones.from_utc_many(items, now), expected_from_utc)
+                        self.assertEqual(timezones.to_utc_many(items, now), expected_to_utc)
+
+    @staticmethod
+    def _convert(time_obj: time, from_: str, to: str, now: datetime) -> time:
+        """Convert the time like TelegramSettings did before the conversions were cached."""
+        from_tz = zoneinfo.ZoneInfo(from_)
+        to_tz = zoneinfo.ZoneInfo(to)
+        dt = datetime.combine(now.astimezone(to_tz).date(), time_obj, tzinfo=from_tz)
+        return dt.astimezone(to_tz).time()
+
+
+class BatchScheduleTests(SimpleTestCase):
+    """Vectorized schedule computation test case."""
+
+    def test_matches_hydration_schedule(self):
+        """Test that the batch computation gives the same results as HydrationSchedule."""
+        randomizer = random.Random(7)
+        schedules, from_times = [], []
+        for _ in range(5000):
+            window_start = time(randomizer.randrange(24), randomizer.randrange(60), randomizer.randrange(60))
+            window_end = time(randomizer.randrange(24), randomizer.randrange(60), randomizer.randrange(60))
+            schedules.append(
+                HydrationSchedule(
+                    goal_ml=randomizer.choice([0, 250, 1500, 2000, 3333]),
+                    consumed_ml=randomizer.choice([0, 0, 100, 250, 1000, 2000, 4000]),
+                    consumption_size_ml=randomizer.choice([1, 33, 250, 500]),
+                    window_start=window_start,
+                    window_end=window_end,
+                    minimum_interval_seconds=randomizer.choice([0, 60, 899.5, 3600, 90000]),
+                )
+            )
+            from_times.append(
+                time(
+                    randomizer.randrange(24),
+                    randomizer.randrange(60),
+                    randomizer.randrange(60),
+                    randomizer.randrange(10**6),
+                )
+            )
+
+        result = compute_next_reminders(
+            goal_ml=[schedule.goal_ml for schedule in schedules],
+            consumed_ml=[schedule.consumed_ml for schedule in schedules],
+            consumption_size_ml=[schedule.consumption_size_ml for schedule in schedules],
+            window_start=[time_to_seconds(schedule.window_start) for schedule in schedules],
+            window_end=[time_to_seconds(schedule.window_end) for schedule in schedules],
+            minimum_interval_seconds=[schedule.minimum_interval_seconds for schedule in schedules],
+            from_time=[time_to_seconds(from_time) for from_time in from_times],
+        )
+
+        expected = [
+            schedule.compute_next_reminder(from_time) for schedule, from_time in zip(schedules, from_times, strict=True)
+        ]
+        self.assertEqual([seconds_to_time(seconds) for seconds in result.tolist()], expected)
+
+    def test_single_from_time(self):
+        """Test that a single from time is used for every schedule."""
+        result = compute_next_reminders(
+            goal_ml=[2000, 2000],
+            consumed_ml=[0, 1000],
+            consumption_size_ml=[250, 250],
+            window_start=[8 * 3600, 8 * 3600],
+            window_end=[20 * 3600, 20 * 3600],
+            minimum_interval_seconds=[900, 900],
+            from_time=12 * 3600,
+        )
+        self.assertEqual([seconds_to_time(seconds) for seconds in result.tolist()], [time(12), time(14)])
+
+
+class AsyncWebhookTests(TransactionTestCase):
+    """Asynchronous webhook test case."""
+
+    def setUp(self):
+        """Block the handling of updates until released and use a dedicated ingester."""
+        self.release = threading.Event()
+        self.fake_bot_post = patch("django_telegram_app.bot.bot.post").start()
+        self.fake_handle_update = patch(
+            "django_telegram_app.bot.bot.handle_update", side_effect=self._slow_handle_update
+        ).start()
+        # Without the periodic recovery, which would race the recovery of the tests
+        self.ingester = UpdateIngester(consumers=2, recover_periodically=False)
+        patch("apps.telegram.views.get_ingester", return_value=self.ingester).start()
+        self.addCleanup(patch.stopall)
+
+    async def test_update_is_acknowledged_before_it_is_handled(self):
+        """Test that the webhook responds while the update is still being handled."""
+        response = await self._post(TelegramBotTestCase.construct_telegram_update("/start"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {"status": "ok", "message": "Message received."})
+        self.assertEqual(await Message.objects.acount(), 0)
+        self.assertEqual(await InboxUpdate.objects.acount(), 1)
+
+        self.release.set()
+        await self.ingester.join()
+        message = await Message.objects.aget()
+        self.assertIsNone(message.error)
+        self.assertTrue(await OutboxMessage.objects.filter(chat_id=123456789).aexists())
+        self.assertFalse(await InboxUpdate.objects.aexists())
+
+    async def test_updates_of_a_stopped_process_are_recovered(self):
+        """Test that stored updates are handled by another process when their lease expires."""
+        update = TelegramBotTestCase.construct_telegram_update("/start")
+        leased = await InboxUpdate.objects.acreate(
+            raw_update=update, available_at=timezone.now() + timedelta(minutes=1)
+        )
+        expired = await InboxUpdate.objects.acreate(raw_update=update, available_at=timezone.now())
+        self.release.set()
+
+        self.assertEqual(await self.ingester.recover(), 1)
+        await self.ingester.join()
+        self.assertEqual(await Message.objects.acount(), 1)
+        self.assertFalse(await InboxUpdate.objects.filter(pk=expired.pk).aexists())
+        self.assertTrue(await InboxUpdate.objects.filter(pk=leased.pk).aexists())
+        self.assertEqual(await self.ingester.recover(), 0)
+
+    async def test_invalid_requests_are_rejected(self):
+        """Test that updates with an invalid token or body are not enqueued."""
+        update = TelegramBotTestCase.construct_telegram_update("/start")
+        self.assertEqual((await self._post(update, token="invalid")).status_code, 403)
+        self.assertEqual((await self._post("not an update")).status_code, 400)
+        await self.ingester.join()
+        self.assertFalse(self.fake_handle_update.called)
+        self.assertFalse(await InboxUpdate.objects.aexists())
+
+    async def _post(self, data, token: str | None = None):
+        request = AsyncRequestFactory().post(
+            "/webhook",
+            data=json.dumps(data),
+            content_type="application/json",
+            headers={"X-Telegram-Bot-Api-Secret-Token": token or app_settings.WEBHOOK_TOKEN},
+        )
+        return await telegram_views.webhook(request)
+
+    def _slow_handle_update(self, update: dict):
+        self.release.wait(timeout=5)
+        return handle_update(update)
+
+
+class OutboxTests(TestCase):
+    """Outbox test case."""
+
+    def setUp(self):
+        """Patch the bot api."""
+        self.fake_bot_post = patch("django_telegram_app.bot.bot.post").start()
+        self.addCleanup(patch.stopall)
+
+    def test_messages_are_delivered_once_per_idempotency_key(self):
+        """Test that queued messages are delivered and that a duplicate idempotency key is dropped."""
+        self.assertTrue(delivery.send_message("first", 1, idempotency_key="reminder:1"))
+        self.assertFalse(delivery.send_message("duplicate", 1, idempotency_key="reminder:1"))
+        self.assertTrue(delivery.send_message("second", 1))
+
+        report = OutboxTelegramBotTestCase.deliver_outbox()
+
+        self.assertEqual(report.sent, 2)
+        texts = [call[1]["payload"]["text"] for call in self.fake_bot_post.call_args_list]
+        self.assertEqual(texts, ["first", "second"])
+        self.assertFalse(OutboxMessage.objects.exclude(status=OutboxMessage.Status.SENT).exists())
+
+    def test_worker_keeps_polling_after_a_database_error(self):
+        """Test that the outbox worker logs a database error and keeps draining the outbox."""
+        side_effect = [OperationalError("database is locked"), 0, KeyboardInterrupt()]
+        stdout = StringIO()
+        with (
+            patch("apps.telegram.outbox.deliver_batch", side_effect=side_effect) as fake_deliver_batch,
+            self.assertLogs(level="ERROR") as logs,
+        ):
+            call_command("drainoutbox", poll_interval=0, stdout=stdout)
+        self.assertEqual(fake_deliver_batch.call_count, 3)
+        self.assertIn("Error draining the outbox", logs.output[0])
+        self.assertIn("Outbox worker stopped.", stdout.getvalue())
+
+    def test_failed_deliveries_are_retried_with_backoff(self):
+        """Test that transient errors are retried later and that rejected messages are not retried."""
+        delivery.send_message("outage", 1)
+        delivery.send_message("blocked", 2)
+        self.fake_bot_post.side_effect = lambda _endpoint, payload: self._raise_http_error(
+            503 if payload["chat_id"] == 1 else 403
+        )
+        OutboxTelegramBotTestCase.deliver_outbox()
+
+        outage = OutboxMessage.objects.get(chat_id=1)
+        self.assertEqual((outage.status, outage.attempts), (OutboxMessage.Status.PENDING, 1))
+        self.assertGreater(outage.available_at, timezone.now())
+        self.assertEqual(OutboxMessage.objects.get(chat_id=2).status, OutboxMessage.Status.FAILED)
+
+        self.fake_bot_post.side_effect = None
+        later = timezone.now() + outbox.get_backoff(1)
+        with patch("apps.telegram.outbox.timezone.now", return_value=later):
+            report = OutboxTelegramBotTestCase.deliver_outbox()
+        self.assertEqual(report.sent, 1)
+        self.assertEqual(OutboxMessage.objects.get(chat_id=1).status, OutboxMessage.Status.SENT)
+
+    @staticmethod
+    def _raise_http_error(status_code: int):
+        response = requests.Response()
+        response.status_code = status_code
+        raise requests.HTTPError(response=response)
+
+
+class SqliteConnectionTests(TestCase):
+    """Sqlite connection profile test case."""
+
+    def test_pragmas_are_set_on_new_connections(self):
+        """Test that the connection initialization sets the synchronous mode and the busy timeout."""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertGreater(cursor.fetchone()[0], 0)
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
+class CronSettingsTests(SimpleTestCase):
+    """Lightweight settings profile test case."""
+
+    def test_cron_commands_boot_without_the_web_stack(self):
+        """Test that loading a cron command with the cron profile does not import the admin or the http client."""
+        script = (
+            "import sys, django; django.setup(); "
+            "from django.core.management import load_command_class; "
+            "[load_command_class('apps.telegram', name) for name in sys.argv[1:]]; "
+            "print(sorted(name for name in ('django.contrib.admin', 'django.contrib.sessions', 'requests') "
+            "if name in sys.modules))"
+        )
+        process = subprocess.run(
+            [sys.executable, "-c", script, "startreminder", "startoverview", "resetreminderstate"],
+            cwd=django_settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "h2oh.settings_cron"},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(process.stdout.strip(), "[]")
+
+
+class MetricsTests(OutboxTelegramBotTestCase):
+    """Metrics test case."""
+
+    def setUp(self):
+        """Start every test without observations."""
+        super().setUp()
+        for histogram in metrics.HISTOGRAMS:
+            histogram.clear()
+
+    def test_histogram_render(self):
+        """Test that the buckets are cumulative and that the sum and count are rendered."""
+        histogram = metrics.Histogram("test_seconds", "Test.", (0.1, 1.0), ("step",))
+        histogram.observe(0.05, "a")
+        histogram.observe(0.5, "a")
+        histogram.observe(5, "a")
+        lines = list(histogram.render())
+        self.assertEqual(
+            lines[2:],
+            [
+                'test_seconds_bucket{step="a",le="0.1"} 1',
+                'test_seconds_bucket{step="a",le="1.0"} 2',
+                'test_seconds_bucket{step="a",le="+Inf"} 3',
+                'test_seconds_sum{step="a"} 5.55',
+                'test_seconds_count{step="a"} 3',
+            ],
+        )
+
+    def test_steps_and_ticks_are_observed_when_enabled(self):
+        """Test that the step latency, the queries per step and the tick duration are recorded."""
+        TelegramSettings.objects.create(chat_id=123456789, is_initialized=True)
+        with self.settings(METRICS=self.get_metrics_settings()):
+            self.send_text("/hydrate")
+            call_command("startoverview", stdout=StringIO())
+            response = telegram_views.metrics(RequestFactory().get("/metrics"))
+
+        content = response.content.decode()
+        self.assertIn('h2oh_step_latency_seconds_count{step="hydrate.AskConsumptionSize"} 1', content)
+        self.assertIn('h2oh_step_queries_count{step="hydrate.AskConsumptionSize"} 1', content)
+        self.assertIn('h2oh_tick_duration_seconds_count{command="overview"} 1', content)
+
+    def test_chained_steps_are_counted_once(self):
+        """Test that the queries of an update are recorded once, by the step that handled it."""
+        with self.settings(METRICS=self.get_metrics_settings()):
+            self.send_text("/start")
+        content = metrics.render()
+        self.assertIn('h2oh_step_queries_count{step="start.WelcomeStep"} 1', content)
+        self.assertNotIn('h2oh_step_queries_count{step="start.AskTimezoneRegion"}', content)
+        self.assertIn('h2oh_step_latency_seconds_count{step="start.AskTimezoneRegion"} 1', content)
+
+    def test_nested_step_latency_is_excluded(self):
+        """Test that the duration of a step does not include the duration of the steps it chains to."""
+        with self.settings(METRICS=self.get_metrics_settings()), metrics.observe_step("outer"):
+            with metrics.observe_step("inner"):
+                time_module.sleep(0.05)
+        sums = dict(line.rsplit(" ", 1) for line in metrics.STEP_LATENCY.render() if "_sum" in line)
+        self.assertLess(float(sums['h2oh_step_latency_seconds_sum{step="outer"}']), 0.05)
+        self.assertGreaterEqual(float(sums['h2oh_step_latency_seconds_sum{step="inner"}']), 0.05)
+
+    def test_access_is_restricted(self):
+        """Test that the metrics are only served to the allowed addresses and to the clients with the token."""
+        factory = RequestFactory(REMOTE_ADDR="10.0.0.5")
+        with self.settings(METRICS=self.get_metrics_settings()):
+            self.assertEqual(telegram_views.metrics(factory.get("/metrics")).status_code, 403)
+            request = factory.get("/metrics", headers={"Authorization": "Bearer secret"})
+            self.assertEqual(telegram_views.metrics(request).status_code, 403)
+        with self.settings(METRICS=self.get_metrics_settings(TOKEN="secret")):
+            self.assertEqual(telegram_views.metrics(request).status_code, 200)
+            wrong_token = factory.get("/metrics", headers={"Authorization": "Bearer wrong"})
+            self.assertEqual(telegram_views.metrics(wrong_token).status_code, 403)
+        with self.settings(METRICS=self.get_metrics_settings(ALLOWED_IPS=["10.0.0.5"])):
+            self.assertEqual(telegram_views.metrics(factory.get("/metrics")).status_code, 200)
+
+    @staticmethod
+    def get_metrics_settings(**overrides) -> dict:
+        """Return the metrics settings with metrics enabled."""
+        return {"ENABLED": True, "URL": "metrics", "ALLOWED_IPS": ["127.0.0.1"], "TOKEN": "", **overrides}
+
+    def test_nothing_is_observed_when_disabled(self):
+        """Test that no metrics are recorded when they are disabled."""
+        TelegramSettings.objects.create(chat_id=123456789, is_initialized=True)
+        self.send_text("/hydrate")
+        self.assertNotIn("_count", metrics.render())
+
+
+class TimezoneIndexTests(SimpleTestCase):
+    """Timezone index test case."""
+
+    def test_lookup(self):
+        """Test that names match regardless of case and spacing and that only unambiguous cities resolve."""
+        index = timezoneinfo.TIMEZONE_INDEX
+        self.assertEqual(index.lookup(" america / new york "), "America/New_York")
+        self.assertEqual(index.lookup("tokyo"), "Asia/Tokyo")
+        self.assertEqual(index.lookup("America/Port-au-Prince"), "America/Port-au-Prince")
+        self.assertIsNone(index.lookup("buenos aires"))
+        self.assertEqual(timezoneinfo.normalize_timezone("antarctica/dumontdurville"), "Antarctica/DumontDUrville")
+
+    def test_suggest(self):
+        """Test the suggestions for misspelled and partial input."""
+        index = timezoneinfo.TIMEZONE_INDEX
+        self.assertEqual(index.suggest("europe/brussel")[0], "Europe/Brussels")
+        self.assertEqual(index.suggest("amsterdm"), ["Europe/Amsterdam"])
+        self.assertIn("Asia/Tokyo", index.suggest("tokio"))
+        self.assertLessEqual(len(index.suggest("par")), 5)
+        self.assertEqual(index.suggest("1234"), [])
+
+
+class StepGraphTests(SimpleTestCase):
+    """Step graph test case."""
+
+    def test_steps_are_built_once_and_bound_per_command(self):
+        """Test that the step definitions are shared and that every command gets its own bound steps."""
+        first = StartCommand(TelegramSettings(chat_id=1))
+        second = StartCommand(TelegramSettings(chat_id=2))
+        self.assertIs(StartCommand.get_step_graph(), StartCommand.get_step_graph())
+        self.assertEqual(first._steps_to_str()[0], "WelcomeStep")  # pylint: disable=protected-access
+        self.assertEqual(len(first.steps), len(StartCommand.get_step_graph()))
+        self.assertIs(first.steps[5].command, first)
+        self.assertIs(second.steps[5].command, second)
+        self.assertIs(first.steps[5], first.steps[5])
+        self.assertIsNone(StartCommand.get_step_graph()[5].command)
+
+    def test_prompts_are_cached_per_language(self):
+        """Test that the prompt of a field is translated once per language."""
+        step = StartCommand.get_step_graph()[5]
+        assert isinstance(step, AskTelegramSettingsField)
+        with translation.override("en"):
+            english = step.get_prompt()
+        with translation.override("nl"):
+            step.get_prompt()
+        with translation.override("en"):
+            self.assertIs(step.get_prompt(), english)
+        self.assertLessEqual({"en", "nl"}, set(step._prompts))  # pylint: disable=protected-access
@@ -0,0 +1,38 @@
+"""Views for the Telegram app."""
+
+import json
+
+from django.contrib.auth.decorators import login_not_required  # type: ignore[reportAttributeAccessIssue]
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
+from django_telegram_app.bot import bot
+
+from apps.telegram import metrics as telegram_metrics
+from apps.telegram.ingest import get_ingester
+
+
+@csrf_exempt
+@login_not_required
+async def webhook(request: HttpRequest):
+    """Validate and store incoming messages, they are handled in the background."""
+    if not bot.is_valid_token(request.headers.get("X-Telegram-Bot-Api-Secret-Token")):
+        return JsonResponse({"status": "error", "message": "Invalid token."}, status=403)
+    try:
+        update = json.loads(request.body)
+    except json.JSONDecodeError:
+        update = None
+    if not isinstance(update, dict):
+        return JsonResponse({"status": "error", "message": "Invalid update."}, status=400)
+    # The update is stored before it is acknowledged, if its consumer is busy it is handled when its lease expires
+    await get_ingester().submit(update)
+    return JsonResponse({"status": "ok", "message": "Message received."})
+
+
+@require_GET
+@login_not_required
+def metrics(request: HttpRequest):
+    """Return the metrics of this process in the prometheus text format."""
+    if not telegram_metrics.is_authorized(request.META.get("REMOTE_ADDR"), request.headers.get("Authorization")):
+        return HttpResponseForbidden()
+    return HttpResponse(telegram_metrics.render(), content_type=telegram_metrics.CONTENT_TYPE)
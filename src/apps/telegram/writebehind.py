@@ -0,0 +1,74 @@
+"""Write-behind buffer for the updates of the telegram settings in the ticks of the management commands.
+
+A tick handles its selection in chunks. While a chunk is handled, `TelegramSettings.save(update_fields=...)` only
+records the updated fields in the buffer of the instance, `flush` writes them with one `bulk_update` per distinct set
+of fields. Every instance only writes the fields it updated, so fields changed by other processes are not overwritten.
+
+The management commands handle a chunk in a single transaction and flush at its end. The messages queued in the outbox
+and the state that marks them as queued (e.g. `last_reminder_sent_at`) are committed together or not at all: after a
+crash a reminder is neither sent twice nor lost, the next tick handles the rolled back chunk again.
+
+Only the updates of the settings are batched. The other writes of a user stay one statement each: a reminder is about
+9 statements per user (the callback and the outbox message inserts, the idempotency lookup and 3 savepoints), plus 3
+per chunk (its transaction and the flush). A chunk is an immediate transaction, so it holds the write lock of SQLite
+until it commits and the other writers (e.g. the webhook) wait for it. `CHUNK_SIZE` trades the number of transactions
+for the time the lock is held: about 0.13 seconds per chunk in the `writebehind` benchmark, against 0.6 seconds for
+chunks of 200 settings.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable
+
+from django.db import models
+
+# Number of settings handled per transaction by the ticks, small enough to keep the write lock short
+CHUNK_SIZE = 50
+
+
+class WriteBehindBuffer:
+    """Buffer of the pending field updates of model instances."""
+
+    def __init__(self):
+        """Initialize an empty buffer."""
+        self._pending: dict[tuple[type[models.Model], object], tuple[models.Model, set[str]]] = {}
+
+    def __len__(self):
+        """Return the number of instances with pending updates."""
+        return len(self._pending)
+
+    def defer(self, instance: models.Model, update_fields: Iterable[str] | None) -> bool:
+        """Record the updated fields of a save of the instance, return False if the save must be executed instead.
+
+        New instances, saves of all fields and saves of expressions (e.g. `F("consumed_today_ml") + 1`, which is read
+        back after saving) are not deferred. A save of all fields also writes the pending fields of the instance.
+        """
+        if instance.pk is None:
+            return False
+        key = (type(instance), instance.pk)
+        if update_fields is None:
+            self._pending.pop(key, None)
+            return False
+        fields = [instance._meta.get_field(name) for name in update_fields]
+        if any(hasattr(getattr(instance, field.attname), "resolve_expression") for field in fields):
+            return False
+        for field in fields:
+            # Like save, e.g. to set the `auto_now` fields
+            setattr(instance, field.attname, field.pre_save(instance, add=False))
+        _instance, pending_fields = self._pending.setdefault(key, (instance, set()))
+        pending_fields.update(field.name for field in fields)
+        return True
+
+    def discard(self, instance: models.Model) -> bool:
+        """Drop the pending updates of the instance, e.g. when its changes were rolled back, return whether any were."""
+        return self._pending.pop((type(instance), instance.pk), None) is not None
+
+    def flush(self) -> int:
+        """Write the pending updates, with one query per model and set of fields, return the number of instances."""
+        groups: dict[tuple[type[models.Model], frozenset[str]], list[models.Model]] = defaultdict(list)
+        for instance, fields in self._pending.values():
+            groups[type(instance), frozenset(fields)].append(instance)
+        for (model, fields), instances in groups.items():
+            model._default_manager.bulk_update(instances, sorted(fields))
+        flushed = len(self._pending)
+        self._pending.clear()
+        return flushed
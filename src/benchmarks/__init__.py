@@ -0,0 +1,5 @@
+"""Benchmarks package.
+
+Every public module in this package is a benchmark that can be started with `manage benchmark <name>`.
+A benchmark module exposes a `run(stdout)` function that returns its results as a json serializable dict.
+"""
@@ -0,0 +1,110 @@
+"""Helpers shared by the benchmarks."""
+
+import json
+import sqlite3
+import statistics
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from django.db import connection
+
+
+def measure(func: Callable[[], object], repeat: int = 5) -> dict[str, float]:
+    """Call `func` `repeat` times and return the best and median duration in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return {"best_ms": round(min(durations), 3), "median_ms": round(statistics.median(durations), 3)}
+
+
+def summarize(durations_ms: list[float]) -> dict[str, float]:
+    """Return the median, 95th and 99th percentile and maximum of the given durations in milliseconds.
+
+    The same keys are returned, all 0, when there are no durations.
+    """
+    if not durations_ms:
+        return {"median_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(durations_ms)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(_percentile(ordered, 95), 3),
+        "p99_ms": round(_percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def _percentile(ordered: list[float], percentile: int) -> float:
+    """Return the given percentile of the sorted values (nearest rank)."""
+    return ordered[round(percentile / 100 * (len(ordered) - 1))]
+
+
+def copy_database(path: Path) -> Path:
+    """Copy the current (test) database to the given file, so other connections or processes can use it."""
+    connection.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        connection.connection.backup(target)
+    finally:
+        target.close()
+    return path
+
+
+class StubTelegramServer(ThreadingHTTPServer):
+    """Local stub of the telegram bot api that counts the requests and records the payloads it receives.
+
+    The first `rate_limited` requests are answered with a 429 (Too Many Requests), the others with a success.
+    """
+
+    def __init__(self, rate_limited: int = 0):
+        """Start the server on a free port."""
+        super().__init__(("127.0.0.1", 0), _StubTelegramHandler)
+        self.requests = 0
+        self.payloads: list[dict] = []
+        self.rate_limited = rate_limited
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        """Return the root url of the server."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def stop(self):
+        """Stop the server."""
+        self.shutdown()
+        self.server_close()
+
+
+class _StubTelegramHandler(BaseHTTPRequestHandler):
+    server: StubTelegramServer
+
+    def do_POST(self):
+        """Record the payload and answer like telegram would."""
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests += 1
+            rate_limited = self.server.rate_limited > 0
+            if rate_limited:
+                self.server.rate_limited -= 1
+            else:
+                self.server.payloads.append(payload)
+        if rate_limited:
+            self._respond(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 0.01}})
+        else:
+            self._respond(200, {"ok": True, "result": {}})
+
+    def _respond(self, status: int, body: dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # noqa: A002  # pylint: disable=redefined-builtin
+        """Do not log requests."""
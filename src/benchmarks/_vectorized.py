@@ -0,0 +1,65 @@
+"""Vectorized computation of the next reminder of many hydration schedules at once, for the `batch` benchmark.
+
+This is the vectorized counterpart of `HydrationSchedule.compute_next_reminder`: every argument is a column (one
+value per schedule) and all schedules are computed in a single pass, with the same results as the scalar class.
+Times are expressed in seconds since midnight, see `scheduling.time_to_seconds` and `scheduling.seconds_to_time`.
+
+It is not used by the apps, which follow the planned reminders of `TelegramSettings.reminder_plan`, so it lives with
+the benchmarks and numpy is a development dependency.
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+from reminders.scheduling import MICROSECONDS_PER_SECOND
+
+MICROSECONDS_PER_DAY = 24 * 3600 * MICROSECONDS_PER_SECOND
+
+ArrayLike = npt.ArrayLike
+
+
+def compute_next_reminders(
+    *,
+    goal_ml: ArrayLike,
+    consumed_ml: ArrayLike,
+    consumption_size_ml: ArrayLike,
+    window_start: ArrayLike,
+    window_end: ArrayLike,
+    minimum_interval_seconds: ArrayLike,
+    from_time: ArrayLike,
+) -> np.ndarray:
+    """Compute the next reminder of every schedule, in seconds since midnight.
+
+    `from_time` can be a single value (e.g. now) or one value per schedule.
+    """
+    goal = np.asarray(goal_ml, dtype=np.int64)
+    consumed = np.asarray(consumed_ml, dtype=np.int64)
+    size = np.asarray(consumption_size_ml, dtype=np.int64)
+    minimum_interval = np.asarray(minimum_interval_seconds, dtype=np.float64)
+    start_us = _to_microseconds(window_start)
+    end_us = _to_microseconds(window_end)
+    from_us = np.broadcast_to(_to_microseconds(from_time), goal.shape)
+
+    remaining_ml = np.maximum(0, goal - consumed)
+    remaining_reminders = -(-remaining_ml // size)  # ceil of the integer division
+    # Like the scalar class, the remaining window ignores microseconds
+    remaining_window = np.maximum(0, end_us // MICROSECONDS_PER_SECOND - from_us // MICROSECONDS_PER_SECOND)
+    schedulable = (remaining_reminders > 0) & (remaining_window > 0)
+
+    ideal_interval = np.divide(
+        remaining_window, remaining_reminders, out=np.zeros(goal.shape), where=schedulable, dtype=np.float64
+    )
+    interval = np.where(schedulable, np.maximum(ideal_interval, minimum_interval), 0.0)
+    candidate_us = (from_us + np.rint(interval * MICROSECONDS_PER_SECOND).astype(np.int64)) % MICROSECONDS_PER_DAY
+
+    in_window = (start_us <= from_us) & (from_us <= end_us)
+    candidate_in_window = (start_us <= candidate_us) & (candidate_us <= end_us)
+    next_us = np.where(schedulable & candidate_in_window, candidate_us, start_us)
+    next_us = np.where(np.logical_not(consumed), from_us, next_us)
+    next_us = np.where(in_window, next_us, start_us)
+    return next_us / MICROSECONDS_PER_SECOND
+
+
+def _to_microseconds(seconds: ArrayLike) -> np.ndarray:
+    """Convert seconds since midnight to integer microseconds since midnight."""
+    return np.rint(np.asarray(seconds, dtype=np.float64) * MICROSECONDS_PER_SECOND).astype(np.int64)
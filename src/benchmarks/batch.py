@@ -0,0 +1,51 @@
+"""Microbenchmark of the computation of the next reminder of many schedules.
+
+Compares `HydrationSchedule.compute_next_reminder` called once per schedule with the vectorized batch computation.
+"""
+
+import random
+from datetime import time
+
+import numpy as np
+
+from benchmarks._utils import measure
+from benchmarks._vectorized import compute_next_reminders
+from reminders.scheduling import HydrationSchedule, time_to_seconds
+
+SCHEDULES = 100_000
+
+
+def run(stdout):
+    """Run the benchmark."""
+    randomizer = random.Random(42)
+    schedules = [
+        HydrationSchedule(
+            goal_ml=randomizer.choice([1500, 2000, 2500, 3000]),
+            consumed_ml=randomizer.randrange(0, 3000, 250),
+            consumption_size_ml=randomizer.choice([250, 330, 500]),
+            window_start=time(randomizer.randrange(6, 10)),
+            window_end=time(randomizer.randrange(18, 23)),
+            minimum_interval_seconds=randomizer.choice([900, 1800, 3600]),
+        )
+        for _ in range(SCHEDULES)
+    ]
+    from_time = time(13, 37)
+    columns = {
+        "goal_ml": [schedule.goal_ml for schedule in schedules],
+        "consumed_ml": [schedule.consumed_ml for schedule in schedules],
+        "consumption_size_ml": [schedule.consumption_size_ml for schedule in schedules],
+        "window_start": [time_to_seconds(schedule.window_start) for schedule in schedules],
+        "window_end": [time_to_seconds(schedule.window_end) for schedule in schedules],
+        "minimum_interval_seconds": [schedule.minimum_interval_seconds for schedule in schedules],
+    }
+    arrays = {name: np.asarray(values) for name, values in columns.items()}
+    from_seconds = time_to_seconds(from_time)
+
+    results = {
+        "scalar": measure(lambda: [schedule.compute_next_reminder(from_time) for schedule in schedules]),
+        "batch_from_lists": measure(lambda: compute_next_reminders(**columns, from_time=from_seconds)),
+        "batch_from_arrays": measure(lambda: compute_next_reminders(**arrays, from_time=from_seconds)),
+    }
+    for name, result in results.items():
+        stdout.write(f"{name}: {result['median_ms']:.1f}ms for {SCHEDULES} schedules")
+    return {"benchmark": "batch", "schedules": SCHEDULES, "runs": results}
@@ -0,0 +1,86 @@
+"""Cold start of the management commands that are started by cron, with the full and the lightweight settings.
+
+Every command is started a number of times as a new process, like cron does, against a copy of the (empty) benchmark
+database, so a run is a tick with nothing to do. Next to the wall time, the `-X importtime` report of every run is
+summarized: the number of imported modules, the total import time and the slowest top-level imports.
+
+Save the results with `manage benchmark coldstart --output <file>` to track the cold start as a regression metric.
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+
+from benchmarks._utils import copy_database
+from manage import CRON_COMMANDS
+
+RUNS = 5
+PROFILES = {"full": "h2oh.settings", "cron": "h2oh.settings_cron"}
+SLOWEST_IMPORTS = 10
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run(stdout):
+    """Run the benchmark."""
+    results: dict[str, dict] = defaultdict(dict)
+    with tempfile.TemporaryDirectory() as directory:
+        database = copy_database(Path(directory) / "db.sqlite3")
+        for command in sorted(CRON_COMMANDS):
+            for profile, settings_module in PROFILES.items():
+                results[command][profile] = result = _cold_start(command, settings_module, database)
+                stdout.write(
+                    f"{command} ({profile}): {result['wall_ms']}ms, "
+                    f"{result['modules']} modules imported in {result['import_ms']}ms"
+                )
+    return {"benchmark": "coldstart", "runs": RUNS, "profiles": PROFILES, "commands": results}
+
+
+def _cold_start(command: str, settings_module: str, database: Path) -> dict:
+    """Start the command `RUNS` times in a new process and return the median measurements."""
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings_module, "DJANGO_DATABASE_NAME": str(database)}
+    wall_times, import_times, modules = [], [], []
+    slowest: dict[str, list[float]] = defaultdict(list)
+    for _ in range(RUNS):
+        start = perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", settings.BASE_DIR / "manage.py", command],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        wall_times.append((perf_counter() - start) * 1000)
+        report = _parse_import_times(process.stderr)
+        import_times.append(sum(self_us for _, self_us, _, _ in report) / 1000)
+        modules.append(len(report))
+        for name, _, cumulative_us, top_level in report:
+            if top_level:
+                slowest[name].append(cumulative_us / 1000)
+    slowest_imports = sorted(((statistics.median(times), name) for name, times in slowest.items()), reverse=True)
+    return {
+        "wall_ms": round(statistics.median(wall_times), 3),
+        "import_ms": round(statistics.median(import_times), 3),
+        "modules": round(statistics.median(modules)),
+        "slowest_imports": {name: round(time_ms, 3) for time_ms, name in slowest_imports[:SLOWEST_IMPORTS]},
+    }
+
+
+def _parse_import_times(stderr: str) -> list[tuple[str, int, int, bool]]:
+    """Return the name, self and cumulative import time in microseconds and whether it is a top-level import.
+
+    Nested imports are indented by two spaces per level, top-level imports by a single space.
+    """
+    report = []
+    for line in stderr.splitlines():
+        if match := IMPORT_TIME_LINE.match(line):
+            self_us, cumulative_us, indent, name = match.groups()
+            report.append((name, int(self_us), int(cumulative_us), len(indent) == 1))
+    return report
@@ -0,0 +1,164 @@
+"""Benchmark the contention between webhook writers and a running startreminder tick on a sqlite database file.
+
+Webhook writers log consumptions for random users, at a fixed total rate, while the startreminder tick queues a
+reminder for every user.
+The run is repeated on a copy of the same database with Django's default sqlite configuration (rollback journal,
+deferred transactions and a new connection per request) and with the connection profile from the settings.
+The latency of a write includes the time spent waiting for the database lock.
+"""
+
+import random
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import time
+from io import StringIO
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connection, connections
+
+from apps.telegram.models import ConsumptionEvent, OutboxMessage, TelegramSettings
+from benchmarks._utils import copy_database, summarize
+
+USERS = 2_000
+WRITERS = 8
+# Writes per second offered by all writers together
+WRITE_RATE = 50
+PROFILES = {
+    "default": {"CONN_MAX_AGE": 0, "OPTIONS": {}},
+    "tuned": {
+        "CONN_MAX_AGE": settings.DATABASES["default"]["CONN_MAX_AGE"],
+        "OPTIONS": dict(settings.DATABASES["default"]["OPTIONS"]),
+    },
+}
+
+
+def run(stdout):
+    """Run the benchmark."""
+    user_ids = _populate(USERS)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # The copies are made first, the in-memory test database is dropped once its connection is closed
+        paths = {name: copy_database(Path(directory) / f"{name}.sqlite3") for name in PROFILES}
+        for name, profile in PROFILES.items():
+            with _use_database(paths[name], profile):
+                results[name] = result = _contend(user_ids)
+            tick_failure = f" (tick failed: {result['tick_error']})" if result["tick_error"] else ""
+            stdout.write(
+                f"{name}: {result['lock_errors']} lock errors, {result['writes_per_second']} writes/s, "
+                f"p95 write {result['write_latency']['p95_ms']}ms, "
+                f"{result['reminders_queued']}/{USERS} reminders queued in {result['tick_seconds']}s{tick_failure}"
+            )
+    return {
+        "benchmark": "contention",
+        "users": USERS,
+        "writers": WRITERS,
+        "write_rate": WRITE_RATE,
+        "profiles": results,
+    }
+
+
+def _contend(user_ids: list[int]) -> dict:
+    """Run the startreminder tick while the webhook writers are writing and return the measurements."""
+    tick_done = threading.Event()
+    durations: list[float] = []
+    lock_errors: list[str] = []
+    writers = [
+        threading.Thread(target=_write, args=(random.Random(index), user_ids, tick_done, durations, lock_errors))
+        for index in range(WRITERS)
+    ]
+    start = perf_counter()
+    for writer in writers:
+        writer.start()
+    tick_error = ""
+    try:
+        call_command("startreminder", stdout=StringIO())
+    except OperationalError as exc:
+        tick_error = str(exc)
+    tick_seconds = perf_counter() - start
+    tick_done.set()
+    for writer in writers:
+        writer.join()
+    elapsed = perf_counter() - start
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        (journal_mode,) = cursor.fetchone()
+    return {
+        "journal_mode": journal_mode,
+        "tick_seconds": round(tick_seconds, 3),
+        "tick_error": tick_error,
+        "reminders_queued": OutboxMessage.objects.count(),
+        "writes": len(durations),
+        "lock_errors": len(lock_errors),
+        "writes_per_second": round(len(durations) / elapsed, 1),
+        "write_latency": summarize(durations),
+    }
+
+
+def _write(
+    randomizer: random.Random,
+    user_ids: list[int],
+    tick_done: threading.Event,
+    durations: list[float],
+    lock_errors: list[str],
+):
+    """Log consumptions for random users like the webhook does, until the tick is done."""
+    interval = WRITERS / WRITE_RATE
+    next_write_at = perf_counter() + randomizer.random() * interval
+    try:
+        while not tick_done.wait(max(0.0, next_write_at - perf_counter())):
+            next_write_at += interval
+            start = perf_counter()
+            try:
+                telegram_settings = TelegramSettings.objects.get(pk=randomizer.choice(user_ids))
+                telegram_settings.log_consumption(250, ConsumptionEvent.Source.HYDRATE)
+            except OperationalError as exc:
+                if "locked" not in str(exc):
+                    raise
+                lock_errors.append(str(exc))
+            else:
+                durations.append((perf_counter() - start) * 1000)
+            finally:
+                # Like at the end of a request, the connection is only kept when CONN_MAX_AGE allows it
+                close_old_connections()
+    finally:
+        connection.close()
+
+
+@contextmanager
+def _use_database(path: Path, profile: dict):
+    """Point the default database to the given file with the given connection settings."""
+    settings_dict = connection.settings_dict
+    original = {key: settings_dict[key] for key in ("NAME", *profile)}
+    # The name is changed first: connections to an in-memory database are never closed by Django
+    settings_dict.update(NAME=str(path), **profile)
+    connections.close_all()
+    try:
+        yield
+    finally:
+        connections.close_all()
+        settings_dict.update(original)
+
+
+def _populate(size: int) -> list[int]:
+    """Replace all telegram settings by `size` users that are all due for a reminder, return their ids."""
+    TelegramSettings.objects.all().delete()
+    TelegramSettings.objects.bulk_create(
+        (
+            TelegramSettings(
+                chat_id=index + 1,
+                timezone="UTC",
+                is_initialized=True,
+                reminder_window_start=time.min,
+                reminder_window_end=time.max,
+                next_reminder_at=time.min,
+            )
+            for index in range(size)
+        ),
+        batch_size=1_000,
+    )
+    return list(TelegramSettings.objects.values_list("pk", flat=True))
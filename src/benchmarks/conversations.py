@@ -0,0 +1,80 @@
+"""Benchmark the callbacks of a step of the /start command with the answers kept server-side.
+
+The step is the confirmation of the /start command, which has all answers of the user and a button per answer of a
+(hypothetical) edit menu. Inline, every callback carries a copy of all answers, like before the conversation store.
+Server-side, the answers are stored once and every callback refers to them with a short token. Both are measured
+creating the callbacks of the step and reading the callback of the pressed button, and by the bytes of json stored.
+"""
+
+import json
+from datetime import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django_telegram_app.bot.base import Step
+from django_telegram_app.models import CallbackData
+
+from apps.telegram.models import ConversationState, TelegramSettings
+from apps.telegram.telegrambot import conversations
+from apps.telegram.telegrambot.commands.start import AskConfirmation
+from apps.telegram.telegrambot.commands.start import Command as StartCommand
+from benchmarks._utils import measure
+
+BUTTONS = 8
+ANSWERS = {
+    "correlation_key": "6f1c7a52-0d0e-4a43-9a53-9a2f4c1d2b7e",
+    "timezone_region": "Europe",
+    "timezone": "Europe/Brussels",
+    "daily_goal_ml": "2500",
+    "reminder_window_start": time(9),
+    "reminder_window_end": time(21),
+    "consumption_size_ml": "300",
+    "minimum_interval_seconds": "3600",
+    "reminder_text": "Time to hydrate! Grab a glass of water 💧",
+    "_message_key": "reminder_text",
+}
+
+
+def run(stdout):
+    """Run the benchmark."""
+    telegram_settings = TelegramSettings.objects.create(chat_id=1)
+    step = AskConfirmation().bind(StartCommand(telegram_settings))
+    results = {}
+    for name, create_callback in (("inline", _create_inline_callback), ("server_side", _create_callback)):
+        tokens = []
+
+        def create_step_callbacks(create_callback=create_callback, tokens=tokens):
+            tokens[:] = [create_callback(step, index) for index in range(BUTTONS)]
+
+        create = measure(create_step_callbacks)
+        _clear()
+        create_step_callbacks()
+        stored = [
+            *CallbackData.objects.values_list("data", flat=True),
+            *ConversationState.objects.values_list("data", flat=True),
+        ]
+        stored_bytes = sum(len(json.dumps(data, cls=DjangoJSONEncoder).encode()) for data in stored)
+        read = measure(lambda tokens=tokens: step.command.get_callback_data(tokens[-1]))
+        results[name] = {"create": create, "read": read, "bytes_per_step": stored_bytes}
+        stdout.write(
+            f"{name}: callbacks of a step in {create['median_ms']}ms, read in {read['median_ms']}ms, "
+            f"{stored_bytes} bytes of json per step"
+        )
+        _clear()
+    return {"benchmark": "conversations", "buttons": BUTTONS, "runs": results}
+
+
+def _clear():
+    """Delete the callbacks and the conversation snapshots."""
+    CallbackData.objects.all().delete()
+    ConversationState.objects.all().delete()
+    conversations.store.clear_cache()
+
+
+def _create_inline_callback(step: AskConfirmation, index: int) -> str:
+    """Create a callback with a copy of all answers, like before the conversation store."""
+    return Step._create_callback(step, "next_step", ANSWERS, edit=index)  # pylint: disable=protected-access
+
+
+def _create_callback(step: AskConfirmation, index: int) -> str:
+    """Create a callback that refers to the stored answers."""
+    return step._create_callback("next_step", ANSWERS, edit=index)  # pylint: disable=protected-access
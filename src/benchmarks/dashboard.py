@@ -0,0 +1,50 @@
+"""Benchmark the fleet dashboard of the admin with 100k users.
+
+The statistics are computed by the database (uncached) and read from the cache (cached), the page must load in less
+than 200ms either way.
+"""
+
+import random
+from datetime import time
+
+from django.core.cache import cache
+
+from apps.telegram import dashboard
+from apps.telegram.models import TelegramSettings
+from benchmarks._utils import measure
+
+USERS = 100_000
+TIMEZONES = ("UTC", "Europe/Brussels", "America/New_York", "Asia/Tokyo", "Australia/Sydney")
+
+
+def run(stdout):
+    """Run the benchmark."""
+    _populate(USERS)
+
+    def compute():
+        cache.delete(dashboard.CACHE_KEY)
+        return dashboard.get_fleet_stats()
+
+    uncached = measure(compute)
+    cached = measure(dashboard.get_fleet_stats, repeat=50)
+    stdout.write(f"{USERS} users: uncached {uncached['median_ms']}ms, cached {cached['median_ms']}ms (median)")
+    return {"benchmark": "dashboard", "users": USERS, "uncached": uncached, "cached": cached}
+
+
+def _populate(size: int):
+    """Replace all telegram settings by `size` users, 90% of them initialized."""
+    rng = random.Random(0)
+    TelegramSettings.objects.all().delete()
+    TelegramSettings.objects.bulk_create(
+        (
+            TelegramSettings(
+                chat_id=index + 1,
+                timezone=rng.choice(TIMEZONES),
+                is_initialized=index % 10 != 0,
+                consumed_today_ml=rng.randrange(0, 3500, 250),
+                next_reminder_at=time(rng.randrange(24), rng.randrange(60)),
+            )
+            for index in range(size)
+        ),
+        batch_size=5_000,
+    )
@@ -0,0 +1,63 @@
+"""Benchmark the streaming export of the consumption history.
+
+The table is filled with 50k and 200k consumption events, which are exported as CSV and gzip-compressed NDJSON.
+The peak of the memory allocated while exporting (measured with tracemalloc) should not grow with the number of rows.
+"""
+
+import tracemalloc
+from datetime import date, timedelta
+from time import perf_counter
+
+from apps.telegram import export
+from apps.telegram.models import ConsumptionEvent, TelegramSettings
+
+SIZES = (50_000, 200_000)
+USERS = 100
+VARIANTS = {"csv": ("csv", False), "ndjson_gzip": ("ndjson", True)}
+
+
+def run(stdout):
+    """Run the benchmark."""
+    results = []
+    for size in SIZES:
+        _populate(size)
+        for name, (format_, gzip) in VARIANTS.items():
+            tracemalloc.start()
+            start = perf_counter()
+            exported_bytes = sum(len(chunk) for chunk in export.export("consumption", format_, gzip=gzip))
+            elapsed = perf_counter() - start
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result = {
+                "events": size,
+                "variant": name,
+                "seconds": round(elapsed, 3),
+                "rows_per_second": round(size / elapsed),
+                "megabytes": round(exported_bytes / 1024**2, 2),
+                "peak_memory_megabytes": round(peak / 1024**2, 2),
+            }
+            results.append(result)
+            stdout.write(
+                f"{size} events as {name}: {result['seconds']}s, {result['megabytes']}MB, "
+                f"peak memory {result['peak_memory_megabytes']}MB"
+            )
+    return {"benchmark": "export", "page_size": export.PAGE_SIZE, "runs": results}
+
+
+def _populate(size: int):
+    """Replace all telegram settings by `USERS` users with `size` consumption events in total."""
+    TelegramSettings.objects.all().delete()
+    users = TelegramSettings.objects.bulk_create(TelegramSettings(chat_id=index + 1) for index in range(USERS))
+    first_date = date(2025, 1, 1)
+    ConsumptionEvent.objects.bulk_create(
+        (
+            ConsumptionEvent(
+                telegram_settings=users[index % USERS],
+                amount_ml=250,
+                source=ConsumptionEvent.Source.HYDRATE,
+                local_date=first_date + timedelta(days=index // (USERS * 8)),
+            )
+            for index in range(size)
+        ),
+        batch_size=5_000,
+    )
@@ -0,0 +1,91 @@
+"""Fan-out time of the startreminder tick split over a growing number of worker processes.
+
+The table is filled with users that are all due for a reminder. For every number of workers, a copy of the database is
+made and the workers are started at once as separate processes, either each with a fixed shard (`--shard i/N`) or
+all claiming shards through leases (`--lease-shards`). The fan-out time is the time until the last worker exits,
+including the start of the processes.
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import time
+from pathlib import Path
+from time import perf_counter
+
+from django.conf import settings
+
+from apps.telegram.models import TelegramSettings
+from benchmarks._utils import copy_database
+
+USERS = 2_000
+WORKERS = (1, 2, 4)
+
+
+def run(stdout):
+    """Run the benchmark."""
+    _populate(USERS)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in WORKERS:
+            for mode in ("shard", "lease_shards"):
+                database = copy_database(Path(directory) / f"{mode}-{workers}.sqlite3")
+                seconds = _fan_out(database, workers, mode)
+                queued = _count_queued(database)
+                results.append({"workers": workers, "mode": mode, "seconds": round(seconds, 3), "queued": queued})
+                stdout.write(f"{workers} worker(s) with {mode}: {queued}/{USERS} reminders queued in {seconds:.2f}s")
+    return {
+        "benchmark": "sharding",
+        "users": USERS,
+        "shards": settings.SHARDING["SHARDS"],
+        # The workers can only run in parallel on as many cpus
+        "cpus": os.cpu_count(),
+        "runs": results,
+    }
+
+
+def _fan_out(database: Path, workers: int, mode: str) -> float:
+    """Run the tick with the given number of workers and return the number of seconds until all of them finished."""
+    env = {**os.environ, "DJANGO_DATABASE_NAME": str(database), "DJANGO_SETTINGS_MODULE": "h2oh.settings_cron"}
+    manage = settings.BASE_DIR / "manage.py"
+    start = perf_counter()
+    processes = []
+    for index in range(workers):
+        sharding = ["--shard", f"{index}/{workers}"] if mode == "shard" else ["--lease-shards"]
+        processes.append(
+            subprocess.Popen([sys.executable, manage, "startreminder", *sharding], env=env, stdout=subprocess.DEVNULL)
+        )
+    for process in processes:
+        if process.wait():
+            raise RuntimeError(f"A worker exited with {process.returncode}")
+    return perf_counter() - start
+
+
+def _count_queued(database: Path) -> int:
+    """Return the number of messages queued in the given database."""
+    connection = sqlite3.connect(database)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM telegram_outboxmessage").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def _populate(size: int):
+    """Replace all telegram settings by `size` users that are all due for a reminder."""
+    TelegramSettings.objects.all().delete()
+    TelegramSettings.objects.bulk_create(
+        (
+            TelegramSettings(
+                chat_id=index + 1,
+                timezone="UTC",
+                is_initialized=True,
+                reminder_window_start=time.min,
+                reminder_window_end=time.max,
+                next_reminder_at=time.min,
+            )
+            for index in range(size)
+        ),
+        batch_size=1_000,
+    )
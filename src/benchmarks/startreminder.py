@@ -0,0 +1,71 @@
+"""Benchmark the selection of the startreminder tick.
+
+The table is filled with 1k, 10k and 100k initialized users of which 1% is due for a reminder. The rest is split
+between users whose next reminder is later today and users who already received their reminder.
+The old selection (every initialized user) is compared with the indexed due selection.
+"""
+
+from datetime import time
+
+from apps.telegram.models import TelegramSettings
+from benchmarks._utils import measure
+
+SIZES = (1_000, 10_000, 100_000)
+DUE_RATIO = 0.01
+NOW = time(12, 0)
+
+
+def run(stdout):
+    """Run the benchmark."""
+    results = []
+    for size in SIZES:
+        due_count = _populate(size)
+        full_scan = measure(lambda: list(TelegramSettings.objects.filter(is_initialized=True)))
+        due_selection = measure(lambda: list(_due_queryset()))
+        results.append(
+            {
+                "users": size,
+                "due": due_count,
+                "full_scan": full_scan,
+                "due_selection": due_selection,
+                "due_selection_us_per_due_user": round(due_selection["median_ms"] * 1000 / due_count, 3),
+            }
+        )
+        stdout.write(
+            f"{size} users: full scan {full_scan['median_ms']}ms, due selection {due_selection['median_ms']}ms"
+        )
+    return {
+        "benchmark": "startreminder",
+        "now": NOW.isoformat(),
+        "query_plan": _due_queryset().explain(),
+        "runs": results,
+    }
+
+
+def _due_queryset():
+    due = TelegramSettings.objects.due_for_reminder(NOW)
+    return due.union(TelegramSettings.objects.awaiting_first_reminder(), all=True)
+
+
+def _populate(size: int) -> int:
+    """Replace all telegram settings by `size` initialized users and return the number of due users."""
+    TelegramSettings.objects.all().delete()
+    due_every = round(1 / DUE_RATIO)
+    batch = []
+    for index in range(size):
+        if not index % due_every:
+            next_reminder_at, last_reminder_sent_at = time(11, 30), None
+        elif index % 2:
+            next_reminder_at, last_reminder_sent_at = time(13 + index % 8, index % 60), None
+        else:
+            next_reminder_at, last_reminder_sent_at = time(8 + index % 4, index % 60), time(11, 59)
+        batch.append(
+            TelegramSettings(
+                chat_id=index + 1,
+                is_initialized=True,
+                next_reminder_at=next_reminder_at,
+                last_reminder_sent_at=last_reminder_sent_at,
+            )
+        )
+    TelegramSettings.objects.bulk_create(batch, batch_size=1_000)
+    return len(range(0, size, due_every))
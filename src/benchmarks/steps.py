@@ -0,0 +1,62 @@
+"""Microbenchmark of the construction of the steps of the /start command per update.
+
+Before the step graph was cached, every access to `Command.steps` built all 19 steps, looked up their model fields
+and formatted the translated prompts, and moving to the next step accessed `steps` three times. This is compared with
+the cached step graph, which only binds the step that runs.
+"""
+
+from django.utils.translation import override
+
+from apps.telegram.models import TelegramSettings
+from apps.telegram.telegrambot.commands.start import AskTelegramSettingsField
+from apps.telegram.telegrambot.commands.start import Command as StartCommand
+from benchmarks._utils import measure
+
+UPDATES = 1_000
+# The step that handles the update, e.g. after the daily goal was validated
+STEP_NAME = "ask_reminder_window_start"
+
+
+def run(stdout):
+    """Run the benchmark."""
+    telegram_settings = TelegramSettings(chat_id=1)
+    with override("nl"):
+        rebuilt = measure(lambda: [_rebuilt_step(telegram_settings) for _ in range(UPDATES)])
+        cached = measure(lambda: [_cached_step(telegram_settings) for _ in range(UPDATES)])
+    stdout.write(f"{UPDATES} updates: rebuilt {rebuilt['median_ms']}ms, cached {cached['median_ms']}ms")
+    return {
+        "benchmark": "steps",
+        "updates": UPDATES,
+        "rebuilt": rebuilt,
+        "cached": cached,
+        "rebuilt_us_per_update": round(rebuilt["median_ms"] * 1000 / UPDATES, 3),
+        "cached_us_per_update": round(cached["median_ms"] * 1000 / UPDATES, 3),
+    }
+
+
+def _rebuilt_step(telegram_settings: TelegramSettings):
+    """Find the step like before the step graph was cached."""
+    command = StartCommand(telegram_settings)
+    names = [step.name for step in _build_steps(command)]
+    index = names.index(STEP_NAME)
+    len(_build_steps(command))
+    return _build_steps(command)[index]
+
+
+def _build_steps(command: StartCommand):
+    """Build and bind all steps and format their prompts, like the former `steps` property did."""
+    steps = [step.bind(command) for step in StartCommand.build_steps()]
+    for step in steps:
+        if isinstance(step, AskTelegramSettingsField):
+            step.get_prompt()
+    return steps
+
+
+def _cached_step(telegram_settings: TelegramSettings):
+    """Find the step like `next_step` does with the cached step graph."""
+    command = StartCommand(telegram_settings)
+    index = command._steps_to_str().index(STEP_NAME)  # pylint: disable=protected-access
+    len(command.steps)
+    step = command.steps[index]
+    assert isinstance(step, AskTelegramSettingsField)
+    return step.get_prompt()
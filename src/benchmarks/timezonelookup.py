@@ -0,0 +1,41 @@
+"""Microbenchmark of the timezone index used to validate the timezone input of the /start command.
+
+Measures building the index, exact lookups of (differently spelled) timezone and city names, and suggestions for
+misspelled input.
+"""
+
+import random
+
+from apps.telegram.telegrambot.timezoneinfo import ALL_TIMEZONES, TIMEZONE_INDEX, TimezoneIndex
+from benchmarks._utils import measure
+
+LOOKUPS = 10_000
+TYPOS = ["europe/brussel", "brusels", "new yrok", "tokio", "amsterdm", "los angles", "sao paolo", "jakarat"]
+
+
+def run(stdout):
+    """Run the benchmark."""
+    randomizer = random.Random(42)
+    names = sorted(ALL_TIMEZONES)
+    spelled = [randomizer.choice(names).lower().replace("_", " ") for _ in range(LOOKUPS)]
+    cities = [randomizer.choice(names).rsplit("/", 1)[-1] for _ in range(LOOKUPS)]
+    typos = [TYPOS[index % len(TYPOS)] for index in range(LOOKUPS)]
+
+    results = {
+        "build": measure(lambda: TimezoneIndex(ALL_TIMEZONES)),
+        "lookup_name": measure(lambda: [TIMEZONE_INDEX.lookup(text) for text in spelled]),
+        "lookup_city": measure(lambda: [TIMEZONE_INDEX.lookup(text) for text in cities]),
+        "suggest": measure(lambda: [TIMEZONE_INDEX.suggest(text) for text in typos]),
+    }
+    per_call = {name: round(results[name]["median_ms"] * 1000 / LOOKUPS, 3) for name in results if name != "build"}
+    stdout.write(f"index built in {results['build']['median_ms']}ms for {len(names)} timezones")
+    for name, microseconds in per_call.items():
+        stdout.write(f"{name}: {microseconds}us per call")
+    return {
+        "benchmark": "timezonelookup",
+        "timezones": len(names),
+        "lookups": LOOKUPS,
+        "runs": results,
+        "us_per_call": per_call,
+        "suggestions": {text: TIMEZONE_INDEX.suggest(text) for text in TYPOS},
+    }
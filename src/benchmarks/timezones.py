@@ -0,0 +1,47 @@
+"""Microbenchmark of the conversion of reminder times from UTC to the users' timezones.
+
+Compares the original conversion (two ZoneInfo lookups and a `timezone.now()` call per conversion) with the cached
+conversion service, one call at a time and in bulk.
+"""
+
+import random
+import zoneinfo
+from datetime import time
+
+from django.utils import timezone
+
+from apps.telegram.telegrambot.timezoneinfo import COMMON_TIMEZONES
+from benchmarks._utils import measure
+from reminders import timezones
+
+CONVERSIONS = 10_000
+
+
+def run(stdout):
+    """Run the benchmark."""
+    zone_names = [zone_name for region in COMMON_TIMEZONES.values() for zone_name in region]
+    randomizer = random.Random(42)
+    items = [
+        (time(randomizer.randrange(24), randomizer.randrange(60)), randomizer.choice(zone_names))
+        for _ in range(CONVERSIONS)
+    ]
+
+    results = {
+        "original": measure(lambda: [_original_convert(time_obj, "UTC", zone) for time_obj, zone in items]),
+        "cached": measure(lambda: [timezones.from_utc(time_obj, zone) for time_obj, zone in items]),
+        "cached_bulk": measure(lambda: timezones.from_utc_many(items)),
+    }
+    for name, result in results.items():
+        stdout.write(f"{name}: {result['median_ms'] * 1000 / CONVERSIONS:.2f}us per conversion")
+    return {"benchmark": "timezones", "conversions": CONVERSIONS, "zones": len(zone_names), "runs": results}
+
+
+def _original_convert(time_obj: time, from_: str, to: str) -> time:
+    """Convert the time like TelegramSettings did before the conversions were cached."""
+    from_tz = zoneinfo.ZoneInfo(from_)
+    to_tz = zoneinfo.ZoneInfo(to)
+    now_utc = timezone.now()
+    now_in_timezone = now_utc.astimezone(to_tz)
+    dt = timezone.datetime.combine(now_in_timezone.date(), time_obj, tzinfo=from_tz)
+    dt_in_tz = dt.astimezone(to_tz)
+    return dt_in_tz.time()
@@ -0,0 +1,196 @@
+"""Load test of the webhook with synthetic telegram updates.
+
+Every synthetic chat goes through the /start flow and then through a number of rounds. In every round a chat either
+logs a consumption with /hydrate, clicks "Done" on a reminder queued by the startreminder tick or asks for its
+/overview. The updates are posted one at a time to the webhook url (as wired by `h2oh/urls.py`) with the django test
+client, while the bot api is a local stub. Buttons are clicked by reading the keyboards of the queued messages.
+
+Throughput, latency percentiles and database queries are reported per update type. Save the results with
+`manage benchmark webhook --output <file>` to compare runs. With `TELEGRAM_ASYNC_WEBHOOK` enabled only the
+acknowledgement of the updates is measured.
+"""
+
+import itertools
+import random
+from collections import defaultdict
+from datetime import time
+from io import StringIO
+from time import perf_counter
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django_telegram_app.conf import settings as app_settings
+
+from apps.telegram import outbox
+from apps.telegram.models import OutboxMessage, TelegramSettings
+from benchmarks._utils import StubTelegramServer, summarize
+
+CHATS = 100
+ROUNDS = 5
+FIRST_CHAT_ID = 1_000_000
+# Relative weights of the actions of a chat in a round
+MIX = {"hydrate": 5, "reminder_done": 3, "overview": 2}
+START_FLOW = [
+    ("text", "/start"),
+    ("text", "utc"),  # timezone
+    ("text", "2500"),  # daily goal
+    ("text", "00:00"),  # first reminder
+    ("text", "23:59"),  # last reminder
+    ("text", "250"),  # consumption size
+    ("text", "900"),  # minimum interval
+    ("button", 0),  # default reminder text
+    ("button", "✅ Yes"),  # confirmation
+]
+
+
+def run(stdout):
+    """Run the benchmark."""
+    server = StubTelegramServer()
+    try:
+        with (
+            patch("django_telegram_app.bot.bot._construct_endpoint", lambda name: f"{server.url}/{name}"),
+            # The host of the test client, which is only allowed by the test runner
+            override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]),
+        ):
+            load = WebhookLoad(random.Random(42))
+            start = perf_counter()
+            load.run_start_flows()
+            stdout.write(f"{CHATS} chats started in {perf_counter() - start:.2f}s")
+            for round_ in range(ROUNDS):
+                load.run_round(round_)
+                stdout.write(f"Round {round_ + 1}/{ROUNDS} done in {perf_counter() - start:.2f}s")
+            report = outbox.deliver_pending(global_rate=10_000, per_chat_rate=10_000)
+    finally:
+        server.stop()
+
+    return {
+        "benchmark": "webhook",
+        "chats": CHATS,
+        "rounds": ROUNDS,
+        "mix": MIX,
+        "async_webhook": settings.WEBHOOK_INGESTION["ASYNC"],
+        "total": load.summarize(load.durations.keys()),
+        "update_types": {update_type: load.summarize([update_type]) for update_type in load.durations},
+        "outbox": {"sent": report.sent, "failed": report.failed, "messages_per_second": round(report.throughput, 1)},
+        "bot_api_requests": server.requests,
+    }
+
+
+class WebhookLoad:
+    """Driver that posts synthetic updates to the webhook and records the measurements per update type."""
+
+    def __init__(self, randomizer: random.Random):
+        """Initialize the driver for `CHATS` new chats."""
+        self.randomizer = randomizer
+        self.client = Client()
+        self.url = reverse("webhook")
+        self.chat_ids = [FIRST_CHAT_ID + index for index in range(CHATS)]
+        self.durations: dict[str, list[float]] = defaultdict(list)
+        self.queries: dict[str, list[int]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self._update_ids = itertools.count(1)
+
+    def run_start_flows(self):
+        """Complete the /start flow for every chat, one update of every chat at a time."""
+        for kind, value in START_FLOW:
+            for chat_id in self.chat_ids:
+                if kind == "text":
+                    self.send_text("start", chat_id, value)
+                else:
+                    self.click_on_button("start", chat_id, value)
+
+    def run_round(self, round_: int):
+        """Let every chat perform a random action from the mix."""
+        actions = {
+            chat_id: self.randomizer.choices(list(MIX), weights=list(MIX.values()))[0] for chat_id in self.chat_ids
+        }
+        reminded = [chat_id for chat_id, action in actions.items() if action == "reminder_done"]
+        # A different reminder slot every round, so the reminders are not deduplicated by the outbox
+        TelegramSettings.objects.filter(chat_id__in=reminded).update(
+            next_reminder_at=time(0, 0, round_), last_reminder_sent_at=None
+        )
+        call_command("startreminder", stdout=StringIO())
+
+        for chat_id, action in actions.items():
+            if action == "hydrate":
+                self.send_text(action, chat_id, "/hydrate")
+                self.send_text(action, chat_id, "250")
+            elif action == "reminder_done":
+                self.click_on_button(action, chat_id, "💧 Done")
+            else:
+                self.send_text(action, chat_id, "/overview")
+
+    def send_text(self, update_type: str, chat_id: int, text: str):
+        """Post a text message of the chat."""
+        update_id = next(self._update_ids)
+        message = {
+            "message_id": update_id,
+            "date": int(timezone.now().timestamp()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "load", "language_code": "en"},
+            "text": text,
+        }
+        self.post(update_type, {"update_id": update_id, "message": message})
+
+    def click_on_button(self, update_type: str, chat_id: int, button: str | int):
+        """Post a click on a button, by text or index, of the last keyboard sent to the chat."""
+        message = self._last_keyboard_message(chat_id)
+        buttons = [item for row in message.reply_markup["inline_keyboard"] for item in row]
+        if isinstance(button, int):
+            callback_data = buttons[button]["callback_data"]
+        else:
+            callback_data = next(item["callback_data"] for item in buttons if item["text"] == button)
+        update_id = next(self._update_ids)
+        callback_query = {
+            "id": str(update_id),
+            "message": {"message_id": message.pk, "chat": {"id": chat_id, "type": "private"}},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "load", "language_code": "en"},
+            "data": callback_data,
+        }
+        self.post(update_type, {"update_id": update_id, "callback_query": callback_query})
+
+    def post(self, update_type: str, update: dict):
+        """Post the update to the webhook and record the duration and the number of queries."""
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            start = perf_counter()
+            response = self.client.post(
+                self.url,
+                data=update,
+                content_type="application/json",
+                headers={"X-Telegram-Bot-Api-Secret-Token": app_settings.WEBHOOK_TOKEN},
+            )
+            self.durations[update_type].append((perf_counter() - start) * 1000)
+        self.queries[update_type].append(queries)
+        if response.status_code != 200 or response.json()["status"] != "ok":
+            self.errors[update_type] += 1
+
+    def summarize(self, update_types) -> dict:
+        """Return the measurements of the given update types."""
+        durations = [duration for update_type in update_types for duration in self.durations[update_type]]
+        queries = [count for update_type in update_types for count in self.queries[update_type]]
+        errors = sum(self.errors[update_type] for update_type in update_types)
+        return {
+            "updates": len(durations),
+            "errors": errors,
+            "updates_per_second": round(len(durations) * 1000 / sum(durations), 1) if durations else 0.0,
+            "latency": summarize(durations),
+            "queries_per_update": round(sum(queries) / len(queries), 2) if queries else 0.0,
+            "max_queries": max(queries, default=0),
+        }
+
+    @staticmethod
+    def _last_keyboard_message(chat_id: int) -> OutboxMessage:
+        """Return the last queued message with a keyboard for the chat."""
+        return OutboxMessage.objects.filter(chat_id=chat_id, reply_markup__isnull=False).latest("id")
@@ -0,0 +1,78 @@
+"""Benchmark the write-behind batching of the settings updates in the startreminder tick.
+
+2k users are due for a reminder. The tick is run with several chunk sizes, a chunk size of 1 writes every user in its
+own transaction with its own update, like the tick did before the updates were batched.
+The statements are counted per kind: the updates of the settings, the transactions (savepoints included) and all.
+"""
+
+from datetime import time
+from io import StringIO
+from time import perf_counter
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from apps.telegram.models import OutboxMessage, TelegramSettings
+
+USERS = 2_000
+CHUNK_SIZES = (1, 50, 200, 1_000)
+NOW = time(12, 0)
+
+
+def run(stdout):
+    """Run the benchmark."""
+    results = []
+    for chunk_size in CHUNK_SIZES:
+        _populate(USERS)
+        statements: list[str] = []
+
+        def record_statement(execute, sql, params, many, context, statements=statements):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        fake_datetime = timezone.now().replace(hour=NOW.hour, minute=NOW.minute, second=0, microsecond=0)
+        with (
+            patch("apps.telegram.management.commands.startreminder.timezone.now", return_value=fake_datetime),
+            patch("apps.telegram.telegrambot.commands.reminder.timezone.now", return_value=fake_datetime),
+            connection.execute_wrapper(record_statement),
+        ):
+            start = perf_counter()
+            call_command("startreminder", chunk_size=chunk_size, stdout=StringIO())
+            elapsed = perf_counter() - start
+
+        result = {
+            "chunk_size": chunk_size,
+            "tick_seconds": round(elapsed, 3),
+            "reminders_queued": OutboxMessage.objects.count(),
+            "settings_updates": sum(sql.startswith('UPDATE "telegram_telegramsettings"') for sql in statements),
+            "transactions": sum(sql.startswith("SAVEPOINT") for sql in statements),
+            "statements": len(statements),
+        }
+        results.append(result)
+        stdout.write(
+            f"chunk size {chunk_size}: {result['tick_seconds']}s, {result['settings_updates']} settings updates, "
+            f"{result['statements']} statements"
+        )
+    return {"benchmark": "writebehind", "users": USERS, "runs": results}
+
+
+def _populate(size: int):
+    """Replace all telegram settings by `size` users that are all due for a reminder, and clear the outbox."""
+    OutboxMessage.objects.all().delete()
+    TelegramSettings.objects.all().delete()
+    TelegramSettings.objects.bulk_create(
+        (
+            TelegramSettings(
+                chat_id=index + 1,
+                timezone="UTC",
+                is_initialized=True,
+                reminder_window_start=time.min,
+                reminder_window_end=time.max,
+                next_reminder_at=time.min,
+            )
+            for index in range(size)
+        ),
+        batch_size=1_000,
+    )
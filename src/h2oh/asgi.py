@@ -1,6 +1,7 @@
 """ASGI config for h2oh project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Served over ASGI, the Telegram webhook stores updates, acknowledges them and handles them in background consumers.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -11,5 +12,6 @@
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "h2oh.settings")
+os.environ.setdefault("TELEGRAM_ASYNC_WEBHOOK", "1")
 
 application = get_asgi_application()
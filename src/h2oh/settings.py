@@ -75,10 +75,29 @@
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# https://docs.djangoproject.com/en/5.1/ref/databases/#sqlite-notes
+# The web workers and the management commands share the database. The pragmas below are executed on every new
+# connection: WAL lets readers work while a writer commits, and immediate transactions take the write lock up front,
+# so a waiting writer is retried until the busy timeout instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    # Only takes effect on a new database (before the WAL mode), see the --full-vacuum option of compactmessages
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": env.read("DJANGO_SQLITE_BUSY_TIMEOUT_MS", 20_000, astype=int),
+    "mmap_size": env.read("DJANGO_SQLITE_MMAP_SIZE", 128 * 1024 * 1024, astype=int),
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": env.read("DJANGO_DATABASE_NAME", ROOT_DIR / "db.sqlite3", astype=env.to_filepath, convert_default=True),
+        "CONN_MAX_AGE": env.read("DJANGO_DATABASE_CONN_MAX_AGE", 600, astype=int),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "transaction_mode": "IMMEDIATE",
+            "init_command": ";".join(f"PRAGMA {pragma}={value}" for pragma, value in SQLITE_PRAGMAS.items()),
+        },
     }
 }
 
@@ -172,6 +191,8 @@
 ADMIN = {
     "SITE_HEADER": env.read("ADMIN_SITE_HEADER", "H2OH Administration"),
     "ROOT_URL": env.read("ADMIN_ROOT_URL", "admin/"),
+    # The fleet dashboard is computed at most once per this many seconds, see apps.telegram.dashboard
+    "DASHBOARD_CACHE_SECONDS": env.read("ADMIN_DASHBOARD_CACHE_SECONDS", 60, astype=int),
 }
 
 TELEGRAM = {
@@ -180,6 +201,37 @@
     "ROOT_URL": env.read("TELEGRAM_ROOT_URL", "telegram/"),
     "WEBHOOK_URL": env.read("TELEGRAM_WEBHOOK_URL", "webhook"),
     "ALLOW_SETTINGS_CREATION_FROM_UPDATES": True,
+    # The settings admin is registered by apps.telegram, with export actions
+    "REGISTER_DEFAULT_ADMIN": False,
 }
 
 TELEGRAM_SETTINGS_MODEL = "telegram.TelegramSettings"
+
+# Acknowledge webhook updates immediately and handle them in background consumers (requires the ASGI application)
+WEBHOOK_INGESTION = {
+    "ASYNC": env.read("TELEGRAM_ASYNC_WEBHOOK", False, astype=env.to_bool),
+    "CONSUMERS": env.read("TELEGRAM_WEBHOOK_CONSUMERS", 4, astype=int),
+    "MAX_PENDING": env.read("TELEGRAM_WEBHOOK_MAX_PENDING", 1000, astype=int),
+}
+
+# Record histograms of the hot paths and expose them on the metrics url, see apps.telegram.metrics
+METRICS = {
+    "ENABLED": env.read("METRICS_ENABLED", False, astype=env.to_bool),
+    "URL": env.read("METRICS_URL", "metrics"),
+    # The metrics are served to the clients with these addresses, and to the clients with the bearer token if set
+    "ALLOWED_IPS": env.read("METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"], astype=json.loads),
+    "TOKEN": env.read("METRICS_TOKEN", ""),
+}
+
+# Retention of the logged telegram updates, older updates are moved to the archive by compactmessages
+MESSAGE_ARCHIVE = {
+    "DIRECTORY": env.read("MESSAGE_ARCHIVE_DIRECTORY", ROOT_DIR / "archive" / "messages", astype=Path),
+    "RETENTION_DAYS": env.read("MESSAGE_ARCHIVE_RETENTION_DAYS", 30, astype=int),
+}
+
+# Shards of the chats for the workers of the reminder and overview ticks, see apps.telegram.sharding
+SHARDING = {
+    "SHARDS": env.read("SHARDING_SHARDS", 16, astype=int),
+    # Shorter than the interval between two ticks, so the shards are free again for the next tick
+    "LEASE_SECONDS": env.read("SHARDING_LEASE_SECONDS", 50, astype=int),
+}
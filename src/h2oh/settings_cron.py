@@ -0,0 +1,25 @@
+"""Django settings for the scheduling commands that are started by cron.
+
+Commands like `startreminder`, `startoverview` and `resetreminderstate` are started every few minutes (see the cron
+schedule in the README) and only need the models, so this profile loads the apps that define them and nothing for
+serving requests: no admin, sessions, messages, staticfiles or middleware. The log file is only opened when a record
+is written.
+
+`manage` selects this profile for the commands in `manage.CRON_COMMANDS` unless `DJANGO_SETTINGS_MODULE` is set.
+Track its cold start with `manage benchmark coldstart`.
+"""
+
+from h2oh.settings import *  # noqa: F403
+from h2oh.settings import LOGGING
+
+INSTALLED_APPS = [
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "apps.users",
+    "apps.telegram",
+    "django_telegram_app",
+]
+
+MIDDLEWARE = []
+
+LOGGING["handlers"]["file"]["delay"] = True
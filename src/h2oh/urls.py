@@ -23,6 +23,8 @@
 from django.utils.translation import gettext as _
 from django_telegram_app.conf import settings as app_settings
 
+from apps.telegram import views as telegram_views
+
 admin.site.site_header = _(settings.ADMIN["SITE_HEADER"])
 
 urlpatterns = [
@@ -30,3 +32,11 @@
     path(app_settings.ROOT_URL, include("django_telegram_app.urls")),
     path("favicon.ico", lambda _: redirect(f"{settings.STATIC_URL}icons/water_bottle.png", permanent=True)),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if settings.WEBHOOK_INGESTION["ASYNC"]:
+    # Takes precedence over the synchronous webhook of django_telegram_app, which has the same url
+    webhook_url = f"{app_settings.ROOT_URL}{app_settings.WEBHOOK_URL}"
+    urlpatterns.insert(0, path(webhook_url, telegram_views.webhook, name="async_webhook"))
+
+if settings.METRICS["ENABLED"]:
+    urlpatterns.append(path(settings.METRICS["URL"], telegram_views.metrics, name="metrics"))
@@ -4,10 +4,15 @@
 import os
 import sys
 
+# Commands started by cron, which boot with the lightweight settings profile (see h2oh/settings_cron.py)
+CRON_COMMANDS = {"startreminder", "startoverview", "resetreminderstate"}
+
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "h2oh.settings")
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    settings_module = "h2oh.settings_cron" if command in CRON_COMMANDS else "h2oh.settings"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
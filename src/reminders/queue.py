@@ -0,0 +1,77 @@
+"""Module with a priority queue of due instants."""
+
+import heapq
+import itertools
+from collections.abc import Hashable
+from datetime import datetime
+
+
+class DueQueue:
+    """Min-heap of due instants, keyed by an identifier.
+
+    Every key has at most one due instant. Rescheduling or discarding a key does not touch the heap, the outdated
+    entries are skipped (and dropped) when they reach the top.
+    """
+
+    def __init__(self):
+        """Initialize an empty queue."""
+        self._heap: list[tuple[datetime, int, Hashable]] = []
+        self._due: dict[Hashable, datetime] = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        """Return the number of scheduled keys."""
+        return len(self._due)
+
+    def __contains__(self, key: Hashable):
+        """Return whether the key is scheduled."""
+        return key in self._due
+
+    def get(self, key: Hashable) -> datetime | None:
+        """Return the due instant of the key, if it is scheduled."""
+        return self._due.get(key)
+
+    def schedule(self, key: Hashable, due: datetime):
+        """Schedule the key at the given instant, replacing any previous instant."""
+        if self._due.get(key) == due:
+            return
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._counter), key))
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._compact()
+
+    def discard(self, key: Hashable):
+        """Remove the key from the queue, if it is scheduled."""
+        self._due.pop(key, None)
+
+    def clear(self):
+        """Remove all keys from the queue."""
+        self._heap.clear()
+        self._due.clear()
+
+    def next_due(self) -> datetime | None:
+        """Return the earliest due instant, or None if the queue is empty."""
+        self._drop_outdated()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> list[Hashable]:
+        """Remove and return the keys that are due at the given instant, earliest first."""
+        keys = []
+        while self.next_due() is not None and self._heap[0][0] <= now:
+            _, _, key = heapq.heappop(self._heap)
+            del self._due[key]
+            keys.append(key)
+        return keys
+
+    def _drop_outdated(self):
+        """Drop heap entries of keys that were rescheduled or discarded."""
+        while self._heap:
+            due, _, key = self._heap[0]
+            if self._due.get(key) == due:
+                return
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        """Rebuild the heap from the scheduled keys only."""
+        self._heap = [(due, next(self._counter), key) for key, due in self._due.items()]
+        heapq.heapify(self._heap)
@@ -1,9 +1,24 @@
 """Module that is the brain for scheduling reminders."""
 
 import math
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import date, datetime, time, timedelta
 
+MICROSECONDS_PER_SECOND = 1_000_000
+
+
+def time_to_seconds(time_: time) -> float:
+    """Convert a time of day to seconds since midnight."""
+    return time_.hour * 3600 + time_.minute * 60 + time_.second + time_.microsecond / MICROSECONDS_PER_SECOND
+
+
+def seconds_to_time(seconds: float) -> time:
+    """Convert seconds since midnight to a time of day, rounded to the microsecond."""
+    total_seconds, microsecond = divmod(round(seconds * MICROSECONDS_PER_SECOND), MICROSECONDS_PER_SECOND)
+    minutes, second = divmod(total_seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return time(hour, minute, second, microsecond)
+
 
 @dataclass(kw_only=True)
 class HydrationSchedule:
@@ -73,6 +88,27 @@ def compute_next_reminder(self, from_time: time) -> time:
 
         return candidate_time
 
+    def plan_reminders(self, from_time: time) -> list[time]:
+        """Plan the reminders of the rest of the day, from the given time.
+
+        Every reminder is planned like `compute_next_reminder` plans it when the previous reminder is answered at its
+        planned time with one consumption of `consumption_size_ml`, so the first reminder is the next reminder.
+        The plan stops when the goal would be met or at the end of the window; an empty plan means the next reminder
+        is at the start of tomorrow's window.
+        """
+        plan: list[time] = []
+        schedule = self
+        at = from_time
+        while schedule.remaining_ml > 0 and self.consumption_size_ml > 0:
+            next_reminder = schedule.compute_next_reminder(at)
+            # An earlier time (or the same time after a consumption) belongs to the next day
+            if next_reminder < at or (next_reminder == at and schedule.consumed_ml):
+                break
+            plan.append(next_reminder)
+            schedule = replace(schedule, consumed_ml=schedule.consumed_ml + self.consumption_size_ml)
+            at = next_reminder
+        return plan
+
     def in_reminder_window(self, time_: time) -> bool:
         """Check if the given time is within the reminder window."""
         return self.window_start <= time_ <= self.window_end
@@ -0,0 +1,143 @@
+"""Module to convert times of day between UTC and other timezones.
+
+Converting a time of day requires a date, because the UTC offset of a timezone changes over the year.
+The conversions in this module use the same dates as a plain `zoneinfo` conversion would:
+    - from UTC: the time is placed on the current date in the target timezone.
+    - to UTC: the time is placed on the current UTC date.
+
+ZoneInfo objects and the UTC offsets of each (zone, day) are cached, so a conversion is a dictionary lookup and some
+integer arithmetic. Days on which a DST transition happens are detected and handled exactly.
+"""
+
+import functools
+import zoneinfo
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import UTC, date, datetime, time, timedelta
+
+SECONDS_PER_DAY = 24 * 3600
+MICROSECONDS_PER_DAY = SECONDS_PER_DAY * 1_000_000
+
+
+@functools.cache
+def get_zone(name: str) -> zoneinfo.ZoneInfo:
+    """Return the (cached) ZoneInfo for the given name."""
+    return zoneinfo.ZoneInfo(name)
+
+
+@dataclass(frozen=True)
+class DayOffsets:
+    """The UTC offsets of a timezone during a single day.
+
+    `transition` is the number of seconds since the start of the day at which the offset changes from `offset` to
+    `offset_after`, or None if the offset is the same during the whole day.
+    """
+
+    offset: int
+    offset_after: int
+    transition: int | None
+
+    def get_offset(self, second_of_day: int) -> int:
+        """Return the offset in seconds at the given second of the day."""
+        if self.transition is None or second_of_day < self.transition:
+            return self.offset
+        return self.offset_after
+
+
+@functools.lru_cache(maxsize=4096)
+def get_utc_day_offsets(zone_name: str, day: date) -> DayOffsets:
+    """Return the offsets of the zone during the given UTC day."""
+    zone = get_zone(zone_name)
+    midnight = datetime.combine(day, time(), tzinfo=UTC)
+
+    def offset_at(second: int) -> int:
+        instant = midnight + timedelta(seconds=second)
+        return int(instant.astimezone(zone).utcoffset().total_seconds())  # type: ignore[reportOptionalMemberAccess]
+
+    offset, offset_after = offset_at(0), offset_at(SECONDS_PER_DAY)
+    if offset == offset_after:
+        return DayOffsets(offset=offset, offset_after=offset, transition=None)
+
+    # Binary search the first second with the new offset
+    low, high = 0, SECONDS_PER_DAY
+    while low < high:
+        middle = (low + high) // 2
+        if offset_at(middle) == offset:
+            low = middle + 1
+        else:
+            high = middle
+    return DayOffsets(offset=offset, offset_after=offset_after, transition=low)
+
+
+@functools.lru_cache(maxsize=4096)
+def get_local_day_offset(zone_name: str, day: date) -> int | None:
+    """Return the offset of the zone during the given local day, or None if it changes during that day."""
+    zone = get_zone(zone_name)
+    start = datetime.combine(day, time(), tzinfo=zone).utcoffset()
+    end = datetime.combine(day + timedelta(days=1), time(), tzinfo=zone).utcoffset()
+    if start != end or start is None:
+        return None
+    return int(start.total_seconds())
+
+
+def from_utc(time_obj: time, zone_name: str, now: datetime | None = None) -> time:
+    """Convert a UTC time of day to the given timezone."""
+    return from_utc_many([(time_obj, zone_name)], now)[0]
+
+
+def to_utc(time_obj: time, zone_name: str, now: datetime | None = None) -> time:
+    """Convert a time of day in the given timezone to UTC."""
+    return to_utc_many([(time_obj, zone_name)], now)[0]
+
+
+def from_utc_many(items: Iterable[tuple[time, str]], now: datetime | None = None) -> list[time]:
+    """Convert many UTC times of day, each to its own timezone, in one call.
+
+    The current date of every distinct timezone is computed only once.
+    """
+    now = now or datetime.now(UTC)
+    local_dates: dict[str, date] = {}
+    results = []
+    for time_obj, zone_name in items:
+        if zone_name == "UTC":
+            results.append(time_obj)
+            continue
+        if zone_name not in local_dates:
+            local_dates[zone_name] = now.astimezone(get_zone(zone_name)).date()
+        offsets = get_utc_day_offsets(zone_name, local_dates[zone_name])
+        offset = offsets.get_offset(_to_microseconds(time_obj) // 1_000_000)
+        results.append(_shift(time_obj, offset))
+    return results
+
+
+def to_utc_many(items: Iterable[tuple[time, str]], now: datetime | None = None) -> list[time]:
+    """Convert many times of day, each in its own timezone, to UTC in one call."""
+    today = (now or datetime.now(UTC)).astimezone(UTC).date()
+    results = []
+    for time_obj, zone_name in items:
+        if zone_name == "UTC":
+            results.append(time_obj)
+            continue
+        offset = get_local_day_offset(zone_name, today)
+        if offset is None:
+            # A DST transition happens during this local day, let zoneinfo resolve the (possibly ambiguous) time.
+            local = datetime.combine(today, time_obj, tzinfo=get_zone(zone_name))
+            results.append(local.astimezone(UTC).time())
+            continue
+        results.append(_shift(time_obj, -offset))
+    return results
+
+
+def _to_microseconds(time_obj: time) -> int:
+    """Return the number of microseconds since midnight."""
+    seconds = time_obj.hour * 3600 + time_obj.minute * 60 + time_obj.second
+    return seconds * 1_000_000 + time_obj.microsecond
+
+
+def _shift(time_obj: time, offset_seconds: int) -> time:
+    """Shift a time of day by the given number of seconds, wrapping around midnight."""
+    microseconds = (_to_microseconds(time_obj) + offset_seconds * 1_000_000) % MICROSECONDS_PER_DAY
+    seconds, microsecond = divmod(microseconds, 1_000_000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return time(hour, minute, second, microsecond)